@@ -1 +1,52 @@
+import importlib
 
+__version__ = "0.1.0"
+# Version of the simulation model, part of the cache keys: bump it with every
+# change of the simulation outputs
+MODEL_VERSION = 3
+
+# Public names, imported from their submodule on first access so that
+# `import mechaqredo` stays cheap (e.g. for pool workers)
+_LAZY_EXPORTS = {
+    "Params": "params",
+    "default_params_dict": "params",
+    "update_params": "params",
+    "validate_params_dict": "params",
+    "EventSchedule": "events",
+    "ResultCache": "cache",
+    "forecast_supply_stats": "supply",
+    "forecast_supply_stats_batch": "supply",
+    "forecast_supply_stats_chunked": "supply",
+    "run_single_sim": "sim",
+    "run_param_sweep_sim": "sim",
+    "run_long_horizon_sim": "sim",
+    "memory_profile": "memory",
+    "project_sweep_memory": "memory",
+    "OutputSchema": "output_schema",
+    "SupplySimulator": "simulator",
+    "ExtendableSim": "horizons",
+    "run_horizons": "horizons",
+    "estimate_sensitivity": "sim",
+    "run_sensitivity_grid": "sensitivity",
+    "run_scenario_matrix": "scenario_matrix",
+    "estimate_mean": "montecarlo",
+    "StreamingBands": "bands",
+    "estimate_bands": "bands",
+    "SurrogateModel": "surrogate",
+    "fit_surrogate": "surrogate",
+}
+
+__all__ = ["__version__", "MODEL_VERSION"] + list(_LAZY_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from .spec import load_specs, build_spec_params, run_spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mechaqredo",
+        description="Runs the experiments described in YAML spec files.",
+    )
+    parser.add_argument("specs", nargs="+", help="YAML experiment spec files")
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=None,
+        help="number of worker processes (defaults to the number of cores)",
+    )
+    args = parser.parse_args(argv)
+    # Read every spec and build its parameters first, so that a typo does not
+    # stop a queue midway
+    spec_list = [spec for path in args.specs for spec in load_specs(path)]
+    params_dict_list = [build_spec_params(spec) for spec in spec_list]
+    for spec, params_dict in zip(spec_list, params_dict_list):
+        start = time.time()
+        df = run_spec(spec, args.processes, params_dict)
+        print(
+            f"{spec['name']}: {len(df)} rows written to {spec['output']['path']} "
+            f"in {time.time() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
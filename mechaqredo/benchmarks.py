@@ -0,0 +1,538 @@
+"""
+Performance benchmarks of the package, run with `python -m mechaqredo.benchmarks`
+(see `--help` for the options). The import benchmark checks that the engine
+stays cheap to import, and the runtime benchmarks time every engine at several
+horizons and sample counts, recording the results to a JSON history. The
+process exits with status 1 if a benchmark exceeds its budget or regresses
+past a threshold of its history.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import contextlib
+import platform
+import argparse
+import datetime as dt
+import subprocess
+import tracemalloc
+import numpy as np
+
+# Optional dependencies that the numeric engine must only import on first use
+HEAVY_MODULES = ["pandas", "tqdm", "matplotlib", "yfinance", "yaml", "scipy"]
+# Modules imported by simulation workers
+LIGHTWEIGHT_MODULES = [
+    "mechaqredo",
+    "mechaqredo.params",
+    "mechaqredo.supply",
+    "mechaqredo.data_models",
+    "mechaqredo.sim",
+    "mechaqredo.montecarlo",
+    "mechaqredo.sensitivity",
+    "mechaqredo.scenario_matrix",
+]
+# Maximum import time on top of numpy, in seconds
+IMPORT_TIME_BUDGET = 0.15
+
+_IMPORT_TIME_CODE = """
+import sys, time, json
+start = time.perf_counter()
+import numpy
+numpy_seconds = time.perf_counter() - start
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy_modules = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps([numpy_seconds, seconds, heavy_modules]))
+"""
+
+
+def measure_import_time(module: str, repeats: int = 5) -> dict:
+    """
+    Imports module in repeats fresh interpreters, after numpy, and returns
+    {"numpy_seconds", "seconds", "heavy_modules"}: the median import times of
+    numpy and of the module, and the HEAVY_MODULES the module loaded.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [package_dir] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    code = _IMPORT_TIME_CODE.format(module=module, heavy_modules=HEAVY_MODULES)
+    result_list = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result_list.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "numpy_seconds": float(np.median([r[0] for r in result_list])),
+        "seconds": float(np.median([r[1] for r in result_list])),
+        "heavy_modules": result_list[0][2],
+    }
+
+
+def run_import_benchmark(
+    modules: list = LIGHTWEIGHT_MODULES,
+    budget: float = IMPORT_TIME_BUDGET,
+    repeats: int = 5,
+) -> tuple:
+    """
+    Measures the import time of every module and returns ({module: result},
+    list of failures). A module fails if it loads one of HEAVY_MODULES or if
+    its import takes more than budget seconds on top of numpy.
+    """
+    result_dict = {}
+    failure_list = []
+    for module in modules:
+        result = measure_import_time(module, repeats)
+        result_dict[module] = result
+        if len(result["heavy_modules"]) > 0:
+            failure_list.append(f"{module} imports {result['heavy_modules']}")
+        if result["seconds"] > budget:
+            failure_list.append(
+                f"{module} takes {result['seconds']:.3f}s to import "
+                f"(budget {budget:.3f}s)"
+            )
+    return result_dict, failure_list
+
+
+# Horizons and sample counts of the runtime benchmarks
+BENCHMARK_HORIZONS = {"1y": 365, "3y": 3 * 365, "10y": 10 * 365}
+BENCHMARK_SAMPLES = [1, 100, 10_000]
+# Relative slowdown and peak memory growth over the history that fail a benchmark
+TIME_REGRESSION_THRESHOLD = 0.25
+MEMORY_REGRESSION_THRESHOLD = 0.10
+# Slowdowns below this many seconds are timer noise
+MIN_REGRESSION_SECONDS = 0.005
+# Number of past runs of a benchmark forming its baseline
+HISTORY_WINDOW = 5
+DEFAULT_HISTORY_PATH = "benchmark_history.json"
+
+
+def _setup_run_single_sim(forecast_length: int, n_samples: int, params_dict: dict):
+    from .sim import run_single_sim
+
+    def run():
+        for _ in range(n_samples):
+            run_single_sim(forecast_length, params_dict)
+
+    return run
+
+
+def _setup_process_model(forecast_function_name: str, model_updates: dict):
+    # Batch forecast of a data model, switched to a stochastic model (the
+    # default ones are mostly constant)
+    def setup(forecast_length: int, n_samples: int, params_dict: dict):
+        from . import data_models
+        from .params import update_params, validate_params_dict
+
+        params_dict = validate_params_dict(
+            forecast_length, update_params(params_dict, model_updates)
+        )
+        forecast_function = getattr(data_models, forecast_function_name)
+        return lambda: forecast_function(n_samples, forecast_length, params_dict)
+
+    return setup
+
+
+def _setup_forecast_staking_stats(
+    forecast_length: int, n_samples: int, params_dict: dict
+):
+    from .data_models import build_model_data_dict
+    from .locking import forecast_service_fee_locked_vec
+    from .vesting import forecast_vested_vec_from_staking
+    from .staking import forecast_staking_stats
+
+    data_dict = build_model_data_dict(forecast_length, params_dict)
+    service_fee_locked_vec = forecast_service_fee_locked_vec(
+        params_dict, data_dict["token_price"], data_dict["service_fees"]
+    )
+    released_protocol_burn_vec = (
+        params_dict["protocol_funded_rate"]
+        * params_dict["protocol_fee_rate"]
+        * data_dict["n_txs"]
+    )
+    vested_vec_from_staking = forecast_vested_vec_from_staking(
+        forecast_length, params_dict
+    )
+    return lambda: forecast_staking_stats(
+        forecast_length,
+        params_dict,
+        data_dict["n_validators"],
+        service_fee_locked_vec,
+        released_protocol_burn_vec,
+        vested_vec_from_staking,
+    )
+
+
+def _setup_vesting(forecast_length: int, n_samples: int, params_dict: dict):
+    from .vesting import (
+        forecast_vested_vec_from_previous_allocation,
+        forecast_vested_vec_from_new_allocation,
+        forecast_vested_vec_from_staking,
+    )
+
+    def run():
+        forecast_vested_vec_from_previous_allocation(forecast_length, params_dict)
+        forecast_vested_vec_from_new_allocation(forecast_length, params_dict)
+        forecast_vested_vec_from_staking(forecast_length, params_dict)
+
+    return run
+
+
+def _setup_supply_batch(forecast_length: int, n_samples: int, params_dict: dict):
+    from .data_models import build_model_data_dict_batch
+    from .supply import forecast_supply_stats_batch
+
+    batch_data_dict = build_model_data_dict_batch(
+        n_samples, forecast_length, params_dict
+    )
+    return lambda: forecast_supply_stats_batch(
+        forecast_length, params_dict, batch_data_dict
+    )
+
+
+def _setup_param_sweep(forecast_length: int, n_samples: int, params_dict: dict):
+    from .sim import run_param_sweep_sim
+
+    return lambda: run_param_sweep_sim(
+        forecast_length, params_dict, {"tipping_rate": [0.1, 0.2, 0.3, 0.4]}, n_samples
+    )
+
+
+def _setup_sensitivity(forecast_length: int, n_samples: int, params_dict: dict):
+    from .sim import estimate_sensitivity
+
+    return lambda: estimate_sensitivity(
+        forecast_length, "tipping_rate", params_dict, N=n_samples
+    )
+
+
+def _setup_bands(forecast_length: int, n_samples: int, params_dict: dict):
+    from .bands import estimate_bands
+
+    return lambda: estimate_bands(
+        forecast_length, params_dict, n_samples, batch_size=min(n_samples, 1000)
+    )
+
+
+# name: (setup(forecast_length, n_samples, params_dict) returning the timed
+# function, sample counts, maximum n_samples * forecast_length)
+RUNTIME_BENCHMARKS = {
+    "run_single_sim": (_setup_run_single_sim, [1], None),
+    "NumTransactions": (
+        _setup_process_model(
+            "forecast_daily_trx_counts_batch",
+            {"ntxs_model": {"model": "poisson", "rate": 1000.0}},
+        ),
+        BENCHMARK_SAMPLES,
+        None,
+    ),
+    "Price": (
+        _setup_process_model(
+            "forecast_token_price_batch",
+            {"token_price_model": {"model": "gbm", "drift": 0.1, "sigma": 0.8}},
+        ),
+        BENCHMARK_SAMPLES,
+        None,
+    ),
+    "ServiceFees": (
+        _setup_process_model(
+            "forecast_service_fees_batch",
+            {
+                "service_fees_model": {
+                    "model": "ou",
+                    "drift": 3000.0,
+                    "sigma": 500.0,
+                    "theta": 2.0,
+                }
+            },
+        ),
+        BENCHMARK_SAMPLES,
+        None,
+    ),
+    "Arrival": (
+        _setup_process_model("forecast_num_validators_batch", {}),
+        BENCHMARK_SAMPLES,
+        None,
+    ),
+    "forecast_staking_stats": (_setup_forecast_staking_stats, [1], None),
+    "vesting": (_setup_vesting, [1], None),
+    "forecast_supply_stats_batch": (_setup_supply_batch, BENCHMARK_SAMPLES, 4e6),
+    "run_param_sweep_sim": (_setup_param_sweep, [1, 100], 1e5),
+    "estimate_sensitivity": (_setup_sensitivity, [1, 100], 1e5),
+    "estimate_bands": (_setup_bands, BENCHMARK_SAMPLES, None),
+}
+
+
+def measure_runtime(
+    run, repeats: int = 3, min_seconds: float = 0.5, min_total_seconds: float = 0.2
+) -> dict:
+    """
+    Times a function and measures its peak memory, and returns {"seconds",
+    "peak_bytes"}. The time is the best of at least repeats runs, and of as
+    many as fit in min_total_seconds for fast functions (a single run if it
+    takes min_seconds or more). The peak memory is that of the Python and
+    numpy allocations of an extra run traced by tracemalloc. Every run starts
+    from the same np.random seed, and the printed output is discarded.
+    """
+    seconds_list = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        while len(seconds_list) < repeats or (
+            sum(seconds_list) < min_total_seconds and len(seconds_list) < 1000
+        ):
+            np.random.seed(0)
+            start = time.perf_counter()
+            run()
+            seconds_list.append(time.perf_counter() - start)
+            if seconds_list[-1] >= min_seconds:
+                break
+        np.random.seed(0)
+        tracemalloc.start()
+        try:
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            run()
+            peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+        finally:
+            tracemalloc.stop()
+    return {"seconds": min(seconds_list), "peak_bytes": int(peak_bytes)}
+
+
+def run_runtime_benchmark(
+    benchmarks: list = None,
+    horizons: list = None,
+    samples: list = None,
+    repeats: int = 3,
+) -> dict:
+    """
+    Runs the RUNTIME_BENCHMARKS (all by default) on the default parameters
+    at every horizon of BENCHMARK_HORIZONS and sample count of their own
+    (within samples if given), skipping the scales past their maximum size.
+    Returns {"name/horizon/n_samples": {"seconds", "peak_bytes",
+    "throughput"}}, the throughput being in simulated sample-days per second.
+    """
+    result_dict = {}
+    for name in benchmarks or list(RUNTIME_BENCHMARKS):
+        _, sample_list, max_size = RUNTIME_BENCHMARKS[name]
+        for horizon in horizons or list(BENCHMARK_HORIZONS):
+            forecast_length = BENCHMARK_HORIZONS[horizon]
+            for n_samples in sample_list:
+                if samples is not None and n_samples not in samples:
+                    continue
+                if max_size is not None and n_samples * forecast_length > max_size:
+                    continue
+                key = f"{name}/{horizon}/{n_samples}"
+                result_dict[key] = measure_benchmark(key, repeats)
+    return result_dict
+
+
+def measure_benchmark(key: str, repeats: int = 3) -> dict:
+    """
+    Runs the runtime benchmark "name/horizon/n_samples" and returns
+    {"seconds", "peak_bytes", "throughput"}.
+    """
+    from .params import default_params_dict, validate_params_dict
+
+    name, horizon, n_samples = key.split("/")
+    n_samples = int(n_samples)
+    forecast_length = BENCHMARK_HORIZONS[horizon]
+    params_dict = validate_params_dict(
+        forecast_length, default_params_dict(forecast_length)
+    )
+    np.random.seed(0)
+    setup = RUNTIME_BENCHMARKS[name][0]
+    result = measure_runtime(setup(forecast_length, n_samples, params_dict), repeats)
+    result["throughput"] = n_samples * forecast_length / result["seconds"]
+    return result
+
+
+def load_history(path: str) -> list:
+    """
+    Returns the runs recorded in a JSON history file (none if it is missing).
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def benchmark_environment() -> dict:
+    """
+    Returns the environment of the runs that can be compared with each other:
+    the host, the architecture, and the Python and numpy versions.
+    """
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def record_history(path: str, result_dict: dict, failed_list: list = None) -> dict:
+    """
+    Appends a run to a JSON history file, with the environment it ran in,
+    and returns the recorded run. The benchmarks of failed_list regressed,
+    so they are kept out of the later baselines.
+    """
+    from . import __version__
+
+    run_dict = {
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "version": __version__,
+        **benchmark_environment(),
+        "results": result_dict,
+        "failed": list(failed_list or []),
+    }
+    history_list = load_history(path) + [run_dict]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history_list, f, indent=1)
+    os.replace(tmp_path, path)
+    return run_dict
+
+
+def find_regressions(
+    result_dict: dict,
+    history_list: list,
+    time_threshold: float = TIME_REGRESSION_THRESHOLD,
+    memory_threshold: float = MEMORY_REGRESSION_THRESHOLD,
+    window: int = HISTORY_WINDOW,
+) -> dict:
+    """
+    Compares the results to their baseline, the median time and peak memory
+    of the last window runs of the history in the same environment (see
+    `benchmark_environment`) where they did not fail, and returns the list
+    of regressions: the benchmarks slower than the baseline by more than
+    time_threshold (relative) and MIN_REGRESSION_SECONDS, or using more
+    memory by more than memory_threshold. Returns {benchmark: list of
+    failures}, without the benchmarks that pass or have no history.
+    """
+    environment_dict = benchmark_environment()
+    history_list = [
+        run_dict
+        for run_dict in history_list
+        if all(run_dict.get(key) == value for key, value in environment_dict.items())
+    ]
+    failure_dict = {}
+    for key, result in result_dict.items():
+        past_list = [
+            run_dict["results"][key]
+            for run_dict in history_list
+            if key in run_dict["results"] and key not in run_dict.get("failed", [])
+        ][-window:]
+        if len(past_list) == 0:
+            continue
+        base_seconds = np.median([past["seconds"] for past in past_list])
+        if result["seconds"] > max(
+            base_seconds * (1 + time_threshold), base_seconds + MIN_REGRESSION_SECONDS
+        ):
+            failure_dict.setdefault(key, []).append(
+                f"{key} takes {result['seconds']:.3f}s "
+                f"(baseline {base_seconds:.3f}s)"
+            )
+        base_peak_bytes = np.median([past["peak_bytes"] for past in past_list])
+        if result["peak_bytes"] > base_peak_bytes * (1 + memory_threshold):
+            failure_dict.setdefault(key, []).append(
+                f"{key} peaks at {result['peak_bytes'] / 2**20:.1f}MB "
+                f"(baseline {base_peak_bytes / 2**20:.1f}MB)"
+            )
+    return failure_dict
+
+
+def _parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m mechaqredo.benchmarks",
+        description="Runs the import and runtime benchmarks of the package.",
+    )
+    parser.add_argument("--suite", choices=["import", "runtime", "all"], default="all")
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=list(RUNTIME_BENCHMARKS), default=None
+    )
+    parser.add_argument(
+        "--horizons", nargs="+", choices=list(BENCHMARK_HORIZONS), default=None
+    )
+    parser.add_argument("--samples", nargs="+", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH)
+    parser.add_argument(
+        "--no-record",
+        action="store_true",
+        help="Compare to the history without recording the run",
+    )
+    parser.add_argument(
+        "--accept",
+        action="store_true",
+        help="Record the regressed results as the new baseline (e.g. after an "
+        "intended slowdown)",
+    )
+    parser.add_argument(
+        "--time-threshold", type=float, default=TIME_REGRESSION_THRESHOLD
+    )
+    parser.add_argument(
+        "--memory-threshold", type=float, default=MEMORY_REGRESSION_THRESHOLD
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None):
+    args = _parse_args(argv)
+    failure_list = []
+    if args.suite in ["import", "all"]:
+        result_dict, import_failure_list = run_import_benchmark()
+        failure_list += import_failure_list
+        print(f"{'module':<30}{'import (s)':>12}{'numpy (s)':>12}")
+        for module, result in result_dict.items():
+            print(
+                f"{module:<30}{result['seconds']:>12.3f}"
+                f"{result['numpy_seconds']:>12.3f}"
+            )
+    if args.suite in ["runtime", "all"]:
+        from .cache import CACHE_DIR_ENV_VAR
+
+        # Time the computations, not the result cache or the progress bars
+        os.environ.pop(CACHE_DIR_ENV_VAR, None)
+        os.environ["TQDM_DISABLE"] = "1"
+        result_dict = run_runtime_benchmark(
+            args.benchmarks, args.horizons, args.samples, args.repeats
+        )
+        history_list = load_history(args.history)
+        regression_args = (history_list, args.time_threshold, args.memory_threshold)
+        failure_dict = find_regressions(result_dict, *regression_args)
+        # Measure the regressed benchmarks again, to rule out a transient load
+        for key in failure_dict:
+            result = measure_benchmark(key, args.repeats)
+            if result["seconds"] < result_dict[key]["seconds"]:
+                result_dict[key] = result
+        failure_dict = find_regressions(
+            {key: result_dict[key] for key in failure_dict}, *regression_args
+        )
+        failure_list += [
+            failure
+            for key_failure_list in failure_dict.values()
+            for failure in key_failure_list
+        ]
+        print(f"{'benchmark':<42}{'time (s)':>10}{'days/s':>12}{'peak (MB)':>11}")
+        for key, result in result_dict.items():
+            print(
+                f"{key:<42}{result['seconds']:>10.3g}"
+                f"{result['throughput']:>12.3g}{result['peak_bytes'] / 2**20:>11.1f}"
+            )
+        if not args.no_record:
+            failed_list = [] if args.accept else list(failure_dict)
+            record_history(args.history, result_dict, failed_list)
+    for failure in failure_list:
+        print(f"FAIL: {failure}")
+    if len(failure_list) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
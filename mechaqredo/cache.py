@@ -0,0 +1,169 @@
+import os
+import types
+import hashlib
+import pickle
+import datetime as dt
+import numpy as np
+from collections.abc import Mapping
+
+from . import __version__, MODEL_VERSION
+
+# Environment variable enabling the default on-disk cache
+CACHE_DIR_ENV_VAR = "MECHAQREDO_CACHE_DIR"
+CACHE_MAX_BYTES_ENV_VAR = "MECHAQREDO_CACHE_MAX_BYTES"
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of simulation results.
+
+    Every entry is a pickle file named after the hash of its key. Reads touch
+    the file modification time, and writes evict the least recently used
+    entries until the cache fits in max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3):
+        """
+        cache_dir: The directory holding the cache entries.
+        max_bytes: The maximum total size of the cache entries.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, **key_parts) -> str:
+        """
+        Returns the hash of the key parts, the package version and the model
+        version.
+        """
+        return hash_params(
+            dict(key_parts, version=__version__, model_version=MODEL_VERSION)
+        )
+
+    def get(self, key: str):
+        """
+        Returns the cached value for key, or None on a cache miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value):
+        """
+        Stores value under key and evicts the least recently used entries.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        entry_list = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entry_list.append((stat.st_mtime, stat.st_size, file_name))
+        total_bytes = sum(size for _, size, _ in entry_list)
+        for _, size, file_name in sorted(entry_list):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, file_name))
+            total_bytes -= size
+
+    def clear(self):
+        """
+        Removes every cache entry.
+        """
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".pkl"):
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+
+def default_cache() -> ResultCache:
+    """
+    Returns the cache configured by the MECHAQREDO_CACHE_DIR (and optionally
+    MECHAQREDO_CACHE_MAX_BYTES) environment variables, or None if unset.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if not cache_dir:
+        return None
+    max_bytes = os.environ.get(CACHE_MAX_BYTES_ENV_VAR)
+    if max_bytes is None:
+        return ResultCache(cache_dir)
+    return ResultCache(cache_dir, int(max_bytes))
+
+
+def hash_params(obj) -> str:
+    """
+    Returns a stable hex digest of a (nested) parameters object. Dicts are
+    hashed independently of their insertion order and arrays by dtype, shape
+    and content. Python functions are hashed by their qualified name, bytecode,
+    constants, defaults and closure values, so two lambdas or two closures of
+    a factory with different parameters differ (the module globals they read
+    are not hashed). Other callables are hashed by their qualified name.
+    """
+    h = hashlib.sha256()
+    _update_hash(h, obj)
+    return h.hexdigest()
+
+
+def _update_hash(h, obj, _seen: frozenset = frozenset()):
+    if hasattr(obj, "stable_hash"):
+        # Immutable parameters memoize their own hash
+        h.update(f"params:{obj.stable_hash()}".encode())
+    elif isinstance(obj, Mapping):
+        h.update(b"{")
+        for key in sorted(obj, key=str):
+            _update_hash(h, key, _seen)
+            _update_hash(h, obj[key], _seen)
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for item in obj:
+            _update_hash(h, item, _seen)
+        h.update(b"]")
+    elif isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        h.update(f"ndarray:{arr.dtype.str}:{arr.shape}:".encode())
+        if arr.dtype.hasobject:
+            _update_hash(h, arr.tolist(), _seen)
+        else:
+            h.update(arr.tobytes())
+    elif isinstance(obj, np.generic):
+        _update_hash(h, obj.item(), _seen)
+    elif isinstance(obj, (dt.datetime, dt.date)):
+        h.update(f"datetime:{obj.isoformat()}".encode())
+    elif isinstance(obj, float):
+        h.update(f"float:{obj!r}".encode())
+    elif obj is None or isinstance(obj, (bool, int, str)):
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+    elif isinstance(obj, types.CodeType):
+        h.update(b"code:" + obj.co_code)
+        _update_hash(h, obj.co_names, _seen)
+        _update_hash(h, obj.co_consts, _seen)
+    elif callable(obj):
+        name = getattr(obj, "__qualname__", type(obj).__qualname__)
+        h.update(f"callable:{getattr(obj, '__module__', '')}.{name}".encode())
+        if isinstance(obj, types.FunctionType) and id(obj) not in _seen:
+            # Recursive closures are only followed once
+            _seen = _seen | {id(obj)}
+            _update_hash(h, obj.__code__, _seen)
+            _update_hash(h, obj.__defaults__, _seen)
+            _update_hash(h, obj.__kwdefaults__, _seen)
+            cell_list = [cell.cell_contents for cell in obj.__closure__ or ()]
+            _update_hash(h, cell_list, _seen)
+    else:
+        h.update(f"{type(obj).__qualname__}:{obj!r}".encode())
@@ -0,0 +1,141 @@
+import numpy as np
+
+from .market_data import MarketDataStore
+
+CALIBRATION_MODELS = ["gbm", "ou"]
+
+
+def calibrate_gbm(prices: np.array, dt: float = 1 / 365, window: int = None) -> dict:
+    """
+    Fits Geometric Brownian Motion parameters, as used by `paths.gbm_paths`,
+    to many series and rolling windows at once (maximum likelihood on the log
+    returns, ignoring the returns next to missing values).
+
+    prices: An (n_days,) or (n_series, n_days) array, with NaN on missing days.
+    dt: The time step between two observations, in years.
+    window: The number of returns per rolling window. If None, every series
+        is fitted as a whole; otherwise the results get a last axis of length
+        n_days - window, entry j being fitted on the prices of days j to
+        j + window.
+
+    Returns {"drift", "sigma", "n_obs"} arrays (NaN with fewer than 2 returns).
+    """
+    log_prices = np.log(np.asarray(prices, dtype=float))
+    returns = np.diff(log_prices, axis=-1)
+    (s_r, s_rr), n = _window_sums([returns], window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s_r / n
+        var = (s_rr - s_r * mean) / (n - 1)
+        sigma = np.sqrt(np.maximum(var, 0) / dt)
+        drift = mean / dt + 0.5 * sigma**2
+    undefined = n < 2
+    return {
+        "drift": np.where(undefined, np.nan, drift),
+        "sigma": np.where(undefined, np.nan, sigma),
+        "n_obs": n,
+    }
+
+
+def calibrate_ou(values: np.array, dt: float = 1 / 365, window: int = None) -> dict:
+    """
+    Fits Ornstein-Uhlenbeck parameters, as used by `paths.ou_paths`, to many
+    series and rolling windows at once, by least squares regression of every
+    value on the previous one:
+    x[t + 1] - x[t] = dt * theta * (mean - x[t]) + sigma * dt**0.5 * z.
+
+    values: An (n_days,) or (n_series, n_days) array, with NaN on missing days.
+    dt: The time step between two observations, in years.
+    window: The number of transitions per rolling window (see calibrate_gbm).
+
+    Returns {"theta", "mean", "sigma", "n_obs"} arrays (NaN with fewer than 3
+    transitions). The mean is the `drift` field of the 'ou' fees model.
+    """
+    values = np.asarray(values, dtype=float)
+    x, y = values[..., :-1], values[..., 1:]
+    # Centre the series for the numerical stability of the sums
+    finite = np.isfinite(values)
+    shift = np.where(finite, values, 0.0).sum(axis=-1, keepdims=True) / np.maximum(
+        finite.sum(axis=-1, keepdims=True), 1
+    )
+    (s_x, s_xx, s_y, s_yy, s_xy), n = _window_sums(
+        [x - shift, y - shift], window, cross=True
+    )
+    shift = shift[..., 0] if window is None else shift
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c_xx = s_xx - s_x**2 / n
+        c_yy = s_yy - s_y**2 / n
+        c_xy = s_xy - s_x * s_y / n
+        b = c_xy / c_xx
+        a = (s_y - b * s_x) / n
+        resid_var = np.maximum(c_yy - b * c_xy, 0) / (n - 2)
+        theta = (1 - b) / dt
+        mean = a / (1 - b) + shift
+        sigma = np.sqrt(resid_var / dt)
+    undefined = n < 3
+    return {
+        "theta": np.where(undefined, np.nan, theta),
+        "mean": np.where(undefined, np.nan, mean),
+        "sigma": np.where(undefined, np.nan, sigma),
+        "n_obs": n,
+    }
+
+
+def calibrate_model_params(
+    store: MarketDataStore,
+    name: str,
+    model: str = "gbm",
+    start=None,
+    end=None,
+    dt: float = 1 / 365,
+) -> dict:
+    """
+    Fits a stored series between start and end and returns the model fields
+    to update a token price or service fees model with, e.g.
+    update_params(params_dict, {"token_price_model": updates}).
+    """
+    _, values = store.get(name, start, end)
+    if model == "gbm":
+        fit_dict = calibrate_gbm(values, dt)
+        return {
+            "model": "gbm",
+            "drift": float(fit_dict["drift"]),
+            "sigma": float(fit_dict["sigma"]),
+            "dt": dt,
+        }
+    elif model == "ou":
+        fit_dict = calibrate_ou(values, dt)
+        return {
+            "model": "ou",
+            "drift": float(fit_dict["mean"]),
+            "theta": float(fit_dict["theta"]),
+            "sigma": float(fit_dict["sigma"]),
+            "dt": dt,
+        }
+    else:
+        raise ValueError(f"Invalid model. Expected one of: {CALIBRATION_MODELS}")
+
+
+def _window_sums(series_list: list, window: int, cross: bool = False) -> tuple:
+    # Sums (and products) of the jointly observed values over all the
+    # windows, from cumulative sums. Returns ([sums], observation counts).
+    mask = np.all([np.isfinite(s) for s in series_list], axis=0)
+    filled_list = [np.where(mask, s, 0.0) for s in series_list]
+    term_list = []
+    for s in filled_list:
+        term_list.append(s)
+        term_list.append(s * s)
+    if cross:
+        term_list.append(filled_list[0] * filled_list[1])
+    term_list.append(mask.astype(float))
+    if window is None:
+        sum_list = [t.sum(axis=-1) for t in term_list]
+    else:
+        if window < 1 or window > mask.shape[-1]:
+            raise ValueError(f"The window must be between 1 and {mask.shape[-1]}")
+        sum_list = []
+        for t in term_list:
+            cum_t = np.zeros(t.shape[:-1] + (t.shape[-1] + 1,))
+            np.cumsum(t, axis=-1, out=cum_t[..., 1:])
+            sum_list.append(cum_t[..., window:] - cum_t[..., :-window])
+    n = np.rint(sum_list.pop()).astype(int)
+    return sum_list, n
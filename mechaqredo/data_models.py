@@ -4,6 +4,7 @@ from typing import List
 from .transactions import NumTransactions, ServiceFees
 from .price import Price
 from .arrival import Arrival
+from .paths import standard_normal_shocks, gbm_paths, ou_paths
 
 
 def build_model_data_dict(forecast_length: int, params_dict: dict) -> dict:
@@ -21,8 +22,16 @@ def build_model_data_dict(forecast_length: int, params_dict: dict) -> dict:
 
 
 def build_model_data_dict_samples(
-    n_samples: int, forecast_length: int, params_dict: dict
+    n_samples: int,
+    forecast_length: int,
+    params_dict: dict,
+    shock_method: str = None,
 ) -> List[dict]:
+    if shock_method is not None:
+        batch_data_dict = build_model_data_dict_batch(
+            n_samples, forecast_length, params_dict, shock_method
+        )
+        return split_model_data_dict_batch(batch_data_dict)
     data_dict_list = []
     for _ in range(n_samples):
         data_dict = build_model_data_dict(forecast_length, params_dict)
@@ -30,9 +39,134 @@ def build_model_data_dict_samples(
     return data_dict_list
 
 
+def build_model_data_dict_batch(
+    n_samples: int,
+    forecast_length: int,
+    params_dict: dict,
+    shock_method: str = "iid",
+) -> dict:
+    """
+    Builds n_samples data paths at once. Every entry of the returned dict is an
+    (n_samples, forecast_length) array. The shock_method option sets how the
+    normal shocks of the price and service fee paths are drawn (see
+    paths.standard_normal_shocks).
+    """
+    n_txs_mat = forecast_daily_trx_counts_batch(n_samples, forecast_length, params_dict)
+    token_price_mat = forecast_token_price_batch(
+        n_samples, forecast_length, params_dict, shock_method
+    )
+    service_fees_mat = forecast_service_fees_batch(
+        n_samples, forecast_length, params_dict, shock_method
+    )
+    n_val_mat = forecast_num_validators_batch(n_samples, forecast_length, params_dict)
+    batch_data_dict = {
+        "n_txs": n_txs_mat,
+        "token_price": token_price_mat,
+        "service_fees": service_fees_mat,
+        "n_validators": n_val_mat,
+    }
+    return batch_data_dict
+
+
+def split_model_data_dict_batch(batch_data_dict: dict) -> List[dict]:
+    n_samples = len(batch_data_dict["token_price"])
+    return [
+        {key: mat[i] for key, mat in batch_data_dict.items()} for i in range(n_samples)
+    ]
+
+
 def forecast_daily_trx_counts(forecast_length: int, params_dict: dict) -> np.array:
+    n_txs_model = build_ntxs_model(params_dict)
+    for i in range(forecast_length):
+        n_txs_model.update()
+    n_txs_vec = np.array(n_txs_model.N_trx_list)
+    return n_txs_vec
+
+
+def forecast_daily_trx_counts_batch(
+    n_samples: int, forecast_length: int, params_dict: dict
+) -> np.array:
+    model_params_dict = params_dict["ntxs_model"]
+    if model_params_dict["model"] == "poisson":
+        return np.random.poisson(
+            lam=model_params_dict["rate"], size=(n_samples, forecast_length)
+        )
+    # The remaining models are drawn path by path
+    return np.array(
+        [
+            forecast_daily_trx_counts(forecast_length, params_dict)
+            for _ in range(n_samples)
+        ]
+    )
+
+
+def forecast_token_price(forecast_length: int, params_dict: dict) -> np.array:
+    price_model = build_price_model(params_dict)
+    for i in range(forecast_length - 1):
+        price_model.update()
+    price_vec = np.array(price_model.price_list)
+    return price_vec
+
+
+def forecast_token_price_batch(
+    n_samples: int,
+    forecast_length: int,
+    params_dict: dict,
+    shock_method: str = "iid",
+) -> np.array:
+    price_model = build_price_model(params_dict)
+    return price_model.simulate_paths(forecast_length, n_samples, shock_method)
+
+
+def forecast_service_fees(forecast_length: int, params_dict: dict) -> np.array:
+    fees_model = build_service_fees_model(params_dict)
+    for i in range(forecast_length):
+        fees_model.update()
+    fees_vec = np.array(fees_model.fees_list)
+    return fees_vec
+
+
+def forecast_service_fees_batch(
+    n_samples: int,
+    forecast_length: int,
+    params_dict: dict,
+    shock_method: str = "iid",
+) -> np.array:
+    fees_model = build_service_fees_model(params_dict)
+    return fees_model.simulate_paths(forecast_length, n_samples, shock_method)
+
+
+def forecast_num_validators(forecast_length: int, params_dict: dict) -> np.array:
+    n_val_model = build_n_validators_model(params_dict)
+    for i in range(forecast_length):
+        n_val_model.update()
+    n_val_vec = np.array(n_val_model.arrival_list)
+    return n_val_vec
+
+
+def forecast_num_validators_batch(
+    n_samples: int, forecast_length: int, params_dict: dict
+) -> np.array:
+    n_val_params_dict = params_dict["n_validators_model"]
+    if (
+        n_val_params_dict["list_of_precomputed_arrivals"] is not None
+        or n_val_params_dict["constant_rate"] is not None
+    ):
+        # Deterministic arrivals
+        n_val_vec = forecast_num_validators(forecast_length, params_dict)
+        return np.tile(n_val_vec, (n_samples, 1))
+    arrivals_mat = np.random.poisson(
+        n_val_params_dict["rate"], size=(n_samples, forecast_length - 1)
+    )
+    n_val_mat = np.zeros((n_samples, forecast_length))
+    n_val_mat[:, 0] = n_val_params_dict["initial_number"]
+    n_val_mat[:, 1:] = n_val_params_dict["initial_number"] + arrivals_mat.cumsum(1)
+    return np.floor(n_val_mat)
+
+
+def build_ntxs_model(params_dict: dict) -> NumTransactions:
     model_params_dict = params_dict["ntxs_model"]
-    n_txs_model = NumTransactions(
+    return NumTransactions(
         model_params_dict["model"],
         model_params_dict["schedule"],
         model_params_dict["distr"],
@@ -40,30 +174,22 @@ def forecast_daily_trx_counts(forecast_length: int, params_dict: dict) -> np.arr
         model_params_dict["rate"],
         model_params_dict["N_trx_constant"],
     )
-    for i in range(forecast_length):
-        n_txs_model.update()
-    n_txs_vec = np.array(n_txs_model.N_trx_list)
-    return n_txs_vec
 
 
-def forecast_token_price(forecast_length: int, params_dict: dict) -> np.array:
+def build_price_model(params_dict: dict) -> Price:
     token_params_dict = params_dict["token_price_model"]
-    price_model = Price(
+    return Price(
         token_params_dict["model"],
         token_params_dict["P0"],
         token_params_dict["drift"],
         token_params_dict["sigma"],
         token_params_dict["dt"],
     )
-    for i in range(forecast_length - 1):
-        price_model.update()
-    price_vec = np.array(price_model.price_list)
-    return price_vec
 
 
-def forecast_service_fees(forecast_length: int, params_dict: dict) -> np.array:
+def build_service_fees_model(params_dict: dict) -> ServiceFees:
     fees_params_dict = params_dict["service_fees_model"]
-    fees_model = ServiceFees(
+    return ServiceFees(
         fees_params_dict["model"],
         fees_params_dict["A0"],
         fees_params_dict["a"],
@@ -73,21 +199,262 @@ def forecast_service_fees(forecast_length: int, params_dict: dict) -> np.array:
         fees_params_dict["theta"],
         fees_params_dict["defined_path"],
     )
-    for i in range(forecast_length):
-        fees_model.update()
-    fees_vec = np.array(fees_model.fees_list)
-    return fees_vec
 
 
-def forecast_num_validators(forecast_length: int, params_dict: dict) -> np.array:
+def build_n_validators_model(params_dict: dict) -> Arrival:
     n_val_params_dict = params_dict["n_validators_model"]
-    n_val_model = Arrival(
+    return Arrival(
         n_val_params_dict["rate"],
         n_val_params_dict["constant_rate"],
         n_val_params_dict["list_of_precomputed_arrivals"],
         n_val_params_dict["initial_number"],
     )
-    for i in range(forecast_length):
-        n_val_model.update()
-    n_val_vec = np.array(n_val_model.arrival_list)
-    return n_val_vec
+
+
+# Stateful model behind every data path, and the attribute holding its values
+DATA_MODEL_BUILDERS = {
+    "n_txs": (build_ntxs_model, "N_trx_list"),
+    "token_price": (build_price_model, "price_list"),
+    "service_fees": (build_service_fees_model, "fees_list"),
+    "n_validators": (build_n_validators_model, "arrival_list"),
+}
+
+
+def build_data_model_dict(params_dict: dict) -> dict:
+    """
+    Returns the stateful models behind the data paths, keyed like the data
+    dict. Unlike the data dict, they can be extended to longer horizons with
+    `extend_model_data_dict`.
+    """
+    return {
+        key: builder(params_dict) for key, (builder, _) in DATA_MODEL_BUILDERS.items()
+    }
+
+
+def extend_model_data_dict(
+    data_model_dict: dict, start: int, forecast_length: int
+) -> dict:
+    """
+    Updates the data models until their paths hold forecast_length values
+    and returns the data dict of the days [start, forecast_length). The paths
+    continue from their current state, and extending fresh models from day 0
+    in one go draws the same values as `build_model_data_dict`.
+    """
+    data_dict = {}
+    for key, model in data_model_dict.items():
+        value_list = getattr(model, DATA_MODEL_BUILDERS[key][1])
+        while len(value_list) < forecast_length:
+            model.update()
+        data_dict[key] = np.array(value_list[start:forecast_length])
+    return data_dict
+
+
+def init_data_state_batch(params_dict: dict, n_samples: int) -> dict:
+    """
+    Returns the state carried between the chunks of the data paths on day 0:
+    the last token price, service fees and validators count of every sample,
+    and the counter of the deterministic validator arrivals at rates below 1.
+    """
+    data_state_dict = {
+        "n_samples": n_samples,
+        "n_validators_counter": 0,
+        "token_price": np.full(n_samples, params_dict["token_price_model"]["P0"]),
+        "service_fees": np.full(n_samples, params_dict["service_fees_model"]["A0"]),
+        "n_validators": np.full(
+            n_samples, params_dict["n_validators_model"]["initial_number"]
+        ),
+    }
+    return data_state_dict
+
+
+def build_model_data_dict_chunk(
+    start: int,
+    chunk_length: int,
+    params_dict: dict,
+    data_state_dict: dict,
+    shock_method: str = "iid",
+) -> dict:
+    """
+    Builds the days [start, start + chunk_length) of the data paths of
+    `build_model_data_dict_batch`, continuing from data_state_dict (see
+    `init_data_state_batch`), which is updated in place. The chunks must be
+    built in order from day 0. The paths have the same distribution as the
+    batch ones, but are drawn chunk by chunk (the 'sobol' shocks from one
+    Sobol sequence per chunk), so the memory scales with the chunk length.
+    """
+    n_samples = data_state_dict["n_samples"]
+    stop = start + chunk_length
+    # The random paths step from the last value of the previous chunk, or
+    # from their initial value on day 0
+    n_steps = chunk_length - 1 if start == 0 else chunk_length
+    # Transaction counts
+    ntxs_params_dict = params_dict["ntxs_model"]
+    if ntxs_params_dict["model"] == "poisson":
+        n_txs_mat = np.random.poisson(
+            lam=ntxs_params_dict["rate"], size=(n_samples, chunk_length)
+        )
+    elif ntxs_params_dict["model"] == "distr":
+        n_txs_mat = np.array(
+            [
+                [ntxs_params_dict["distr"]() for _ in range(chunk_length)]
+                for _ in range(n_samples)
+            ]
+        )
+    else:
+        n_txs_vec = _deterministic_ntxs_chunk(params_dict, start, stop)
+        n_txs_mat = np.tile(n_txs_vec, (n_samples, 1))
+    # Token price
+    token_params_dict = params_dict["token_price_model"]
+    if token_params_dict["model"] == "gbm":
+        shocks = standard_normal_shocks(n_samples, n_steps, shock_method)
+        token_price_mat = gbm_paths(
+            data_state_dict["token_price"][:, None],
+            token_params_dict["drift"],
+            token_params_dict["sigma"],
+            token_params_dict["dt"],
+            shocks,
+        )
+        token_price_mat = _continue_paths(
+            token_price_mat, start, data_state_dict, "token_price"
+        )
+    else:
+        token_price_mat = np.full((n_samples, chunk_length), token_params_dict["P0"])
+    # Service fees
+    fees_params_dict = params_dict["service_fees_model"]
+    if fees_params_dict["model"] == "gbm":
+        shocks = standard_normal_shocks(n_samples, n_steps, shock_method)
+        service_fees_mat = gbm_paths(
+            data_state_dict["service_fees"][:, None],
+            fees_params_dict["drift"],
+            fees_params_dict["sigma"],
+            fees_params_dict["dt"],
+            shocks,
+        )
+        service_fees_mat = _continue_paths(
+            service_fees_mat, start, data_state_dict, "service_fees"
+        )
+    elif fees_params_dict["model"] == "ou":
+        shocks = standard_normal_shocks(n_samples, n_steps, shock_method)
+        service_fees_mat = ou_paths(
+            data_state_dict["service_fees"],
+            fees_params_dict["drift"],
+            fees_params_dict["theta"],
+            fees_params_dict["sigma"],
+            fees_params_dict["dt"],
+            shocks,
+        )
+        service_fees_mat = _continue_paths(
+            service_fees_mat, start, data_state_dict, "service_fees"
+        )
+    elif fees_params_dict["model"] == "defined_path":
+        defined_path = fees_params_dict["defined_path"]
+        if len(defined_path) < stop:
+            raise ValueError("defined_path is shorter than the forecast length")
+        shocks = standard_normal_shocks(n_samples, chunk_length, shock_method)
+        service_fees_mat = defined_path[start:stop] + fees_params_dict["sigma"] * shocks
+    elif fees_params_dict["model"] == "linear":
+        service_fees_vec = fees_params_dict["A0"] + fees_params_dict["a"] * np.arange(
+            start, stop
+        )
+        service_fees_mat = np.tile(service_fees_vec, (n_samples, 1))
+    else:
+        service_fees_mat = np.full((n_samples, chunk_length), fees_params_dict["A0"])
+    # Number of validators
+    n_val_params_dict = params_dict["n_validators_model"]
+    if (
+        n_val_params_dict["list_of_precomputed_arrivals"] is not None
+        or n_val_params_dict["constant_rate"] is not None
+    ):
+        # Deterministic arrivals
+        n_val_vec = _deterministic_n_validators_chunk(
+            params_dict, data_state_dict, start, stop
+        )
+        n_val_mat = np.tile(n_val_vec, (n_samples, 1))
+    else:
+        arrivals_mat = np.random.poisson(
+            n_val_params_dict["rate"], size=(n_samples, n_steps)
+        )
+        n_val_mat = np.empty((n_samples, n_steps + 1))
+        n_val_mat[:, 0] = data_state_dict["n_validators"]
+        np.cumsum(arrivals_mat, axis=1, out=n_val_mat[:, 1:])
+        n_val_mat[:, 1:] += n_val_mat[:, :1]
+        n_val_mat = np.floor(
+            _continue_paths(n_val_mat, start, data_state_dict, "n_validators")
+        )
+    batch_data_dict = {
+        "n_txs": n_txs_mat,
+        "token_price": token_price_mat,
+        "service_fees": service_fees_mat,
+        "n_validators": n_val_mat,
+    }
+    return batch_data_dict
+
+
+def _continue_paths(
+    paths: np.array, start: int, data_state_dict: dict, key: str
+) -> np.array:
+    # Paths built from the previous chunk's last values, which are only
+    # part of the outputs on day 0
+    data_state_dict[key] = paths[:, -1]
+    return paths if start == 0 else paths[:, 1:]
+
+
+def _deterministic_ntxs_chunk(params_dict: dict, start: int, stop: int) -> np.array:
+    # Values of the deterministic NumTransactions models on the days [start,
+    # stop), which only depend on the day
+    ntxs_params_dict = params_dict["ntxs_model"]
+    model = ntxs_params_dict["model"]
+    days = range(start, stop)
+    if model == "constant":
+        n_txs_list = [ntxs_params_dict["N_trx_constant"] for _ in days]
+    elif model == "linear":
+        n_txs_list = [
+            max(
+                int(ntxs_params_dict["rate"] * t + ntxs_params_dict["N_trx_constant"]),
+                0,
+            )
+            for t in days
+        ]
+    elif model == "scheduled":
+        n_txs_list = [ntxs_params_dict["schedule"][t] for t in days]
+    elif model == "function":
+        n_txs_list = [ntxs_params_dict["fun"](t) for t in days]
+    else:
+        raise ValueError("Model provided is not valid")
+    return np.array(n_txs_list)
+
+
+def _deterministic_n_validators_chunk(
+    params_dict: dict, data_state_dict: dict, start: int, stop: int
+) -> np.array:
+    # Counts of the deterministic Arrival models on the days [start, stop),
+    # continuing from the last count and the counter of the rates below 1
+    n_val_params_dict = params_dict["n_validators_model"]
+    precomputed_arrivals = n_val_params_dict["list_of_precomputed_arrivals"]
+    constant_rate = n_val_params_dict["constant_rate"]
+    if precomputed_arrivals is not None and len(precomputed_arrivals) < stop:
+        raise ValueError(
+            "list_of_precomputed_arrivals is shorter than the forecast length"
+        )
+    n_val = data_state_dict["n_validators"][0]
+    counter = data_state_dict["n_validators_counter"]
+    n_val_list = []
+    for t in range(start, stop):
+        if t > 0:
+            if precomputed_arrivals is not None:
+                num_arrivals = precomputed_arrivals[t]
+            elif constant_rate < 1:
+                # One arrival every int(1 / constant_rate) + 1 days
+                if counter < int(1 / constant_rate):
+                    num_arrivals = 0
+                    counter += 1
+                else:
+                    num_arrivals = 1
+                    counter = 0
+            else:
+                num_arrivals = constant_rate
+            n_val = np.floor(n_val + num_arrivals)
+        n_val_list.append(n_val)
+    data_state_dict["n_validators"] = np.full(data_state_dict["n_samples"], n_val)
+    data_state_dict["n_validators_counter"] = counter
+    return np.array(n_val_list)
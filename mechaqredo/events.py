@@ -0,0 +1,128 @@
+import hashlib
+import numpy as np
+
+
+class EventSchedule:
+    """
+    Immutable sparse schedule of token amounts on given days (day 0 being the
+    simulation start), used for extra burns, vesting tranches and fund
+    refreshes. Events on the same day are summed and the schedule is not tied
+    to a forecast length: events past the horizon are simply ignored.
+    """
+
+    __slots__ = ("days", "amounts", "_hash")
+
+    def __init__(self, days=(), amounts=()):
+        """
+        days: The (non-negative) event days.
+        amounts: The token amount of every event.
+        """
+        days = np.asarray(days, dtype=np.int64).ravel()
+        amounts = np.asarray(amounts, dtype=float).ravel()
+        if days.shape != amounts.shape:
+            raise ValueError("An event schedule needs one amount per day")
+        if len(days) > 0 and days.min() < 0:
+            raise ValueError("Event days must be non-negative")
+        # Sort (stably) and merge the events falling on the same day
+        order = np.argsort(days, kind="stable")
+        days, amounts = days[order], amounts[order]
+        if len(days) > 1 and np.any(days[1:] == days[:-1]):
+            starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+            days, amounts = days[starts], np.add.reduceat(amounts, starts)
+        days.flags.writeable = False
+        amounts.flags.writeable = False
+        object.__setattr__(self, "days", days)
+        object.__setattr__(self, "amounts", amounts)
+        object.__setattr__(self, "_hash", None)
+
+    @classmethod
+    def from_dense(cls, vec: np.array) -> "EventSchedule":
+        """
+        Builds the schedule of the non-zero values of a daily vector.
+        """
+        vec = np.asarray(vec, dtype=float)
+        days = np.flatnonzero(vec)
+        return cls(days, vec[days])
+
+    def __setattr__(self, name, value):
+        raise TypeError("EventSchedule is immutable")
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __add__(self, other: "EventSchedule") -> "EventSchedule":
+        if not isinstance(other, EventSchedule):
+            return NotImplemented
+        return EventSchedule(
+            np.concatenate([self.days, other.days]),
+            np.concatenate([self.amounts, other.amounts]),
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, EventSchedule):
+            return NotImplemented
+        return np.array_equal(self.days, other.days) and np.array_equal(
+            self.amounts, other.amounts
+        )
+
+    def __hash__(self) -> int:
+        return int(self.stable_hash()[:16], 16)
+
+    def __reduce__(self):
+        return (EventSchedule, (self.days, self.amounts))
+
+    def __repr__(self) -> str:
+        return (
+            f"EventSchedule(days={self.days.tolist()}, amounts={self.amounts.tolist()})"
+        )
+
+    def stable_hash(self) -> str:
+        """
+        Returns a hex digest of the events that is stable across processes.
+        """
+        if self._hash is None:
+            h = hashlib.sha256(b"EventSchedule:")
+            h.update(self.days.tobytes())
+            h.update(self.amounts.tobytes())
+            object.__setattr__(self, "_hash", h.hexdigest())
+        return self._hash
+
+    def window(self, start: int, stop: int) -> tuple:
+        """
+        Returns the (days - start, amounts) of the events in [start, stop).
+        """
+        lo, hi = np.searchsorted(self.days, [start, stop])
+        return self.days[lo:hi] - start, self.amounts[lo:hi]
+
+    def total(self, stop: int = None) -> float:
+        """
+        Returns the sum of the event amounts before day stop (all by default).
+        """
+        if stop is None:
+            return float(self.amounts.sum())
+        return float(self.amounts[: np.searchsorted(self.days, stop)].sum())
+
+    def scatter_into(self, vec: np.array, start: int = 0) -> np.array:
+        """
+        Adds the events falling inside vec, whose first entry is day start,
+        to its last axis in place, and returns vec.
+        """
+        days, amounts = self.window(start, start + vec.shape[-1])
+        vec[..., days] += amounts
+        return vec
+
+    def to_dense(self, forecast_length: int, start: int = 0) -> np.array:
+        """
+        Returns the daily vector of the events over forecast_length days,
+        starting at day start.
+        """
+        return self.scatter_into(np.zeros(forecast_length, dtype=float), start)
+
+
+def as_event_schedule(value) -> EventSchedule:
+    """
+    Returns value as an EventSchedule, converting dense daily vectors.
+    """
+    if isinstance(value, EventSchedule):
+        return value
+    return EventSchedule.from_dense(value)
@@ -7,7 +7,7 @@ Created on Sun Jun 18 17:11:14 2023
 """
 from typing import Dict, Any
 import numpy as np
-import copy
+from .params import update_params
 
 # Constants
 SCENARIOS = [
@@ -19,6 +19,14 @@ SCENARIOS = [
     "pessimistic",
     "optimistic",
 ]
+# Daily validator joining rates of the validators arrival scenarios
+VALIDATOR_JOINING_RATES = {
+    "very bad": 1 / 365,
+    "bad": 1 / 180,
+    "base": 1 / 90,
+    "good": 1 / 30,
+    "very good": 1 / 30,
+}
 # Define type hints for the params_dict
 ParamsDict = Dict[str, Any]
 
@@ -30,11 +38,10 @@ def generate_params_dict_for_scenario(
     staking_scenario: str,
     forecast_length: int = 365 * 2,
 ) -> ParamsDict:
-    # Copy params_dict
-    new_params_dict = copy.deepcopy(params_dict)
+    # The scenario helpers never modify their input, so no copy is needed
     # Update token scenario
     new_params_dict = generate_price_scenario(
-        params_dict=new_params_dict,
+        params_dict=params_dict,
         scenario=token_scenario,
     )
     # Update usage scenario
@@ -55,39 +62,39 @@ def generate_staking_scenario(
     scenario: str,
 ) -> ParamsDict:
     assert scenario in SCENARIOS, f"Invalid scenario. Expected one of: {SCENARIOS}"
-    new_params_dict = params_dict.copy()
+    updates = {}
     if scenario == "very bad":
-        new_params_dict["initial_stake_convertion_rate"] = 0.1
-        new_params_dict["rewards_reinvest_rate"] = 0.0
-        new_params_dict["staking_renewal_rate"] = 0.3
+        updates["initial_stake_convertion_rate"] = 0.1
+        updates["rewards_reinvest_rate"] = 0.0
+        updates["staking_renewal_rate"] = 0.3
     elif scenario == "bad":
-        new_params_dict["initial_stake_convertion_rate"] = 0.3
-        new_params_dict["rewards_reinvest_rate"] = 0.3
-        new_params_dict["staking_renewal_rate"] = 0.6
+        updates["initial_stake_convertion_rate"] = 0.3
+        updates["rewards_reinvest_rate"] = 0.3
+        updates["staking_renewal_rate"] = 0.6
     elif scenario == "base":
-        new_params_dict["initial_stake_convertion_rate"] = 0.6
-        new_params_dict["rewards_reinvest_rate"] = 0.5
-        new_params_dict["staking_renewal_rate"] = 1.0
-        new_params_dict["new_staker_inflow_model"]["init_stake_amt"] = 0.0
+        updates["initial_stake_convertion_rate"] = 0.6
+        updates["rewards_reinvest_rate"] = 0.5
+        updates["staking_renewal_rate"] = 1.0
+        updates["new_staker_inflow_model"] = {"init_stake_amt": 0.0}
     elif scenario == "good":
-        new_params_dict["initial_stake_convertion_rate"] = 0.7
-        new_params_dict["rewards_reinvest_rate"] = 0.7
-        new_params_dict["staking_renewal_rate"] = 0.8
+        updates["initial_stake_convertion_rate"] = 0.7
+        updates["rewards_reinvest_rate"] = 0.7
+        updates["staking_renewal_rate"] = 0.8
     elif scenario == "really good":
-        new_params_dict["initial_stake_convertion_rate"] = 0.9
-        new_params_dict["rewards_reinvest_rate"] = 1.0
-        new_params_dict["staking_renewal_rate"] = 0.9
+        updates["initial_stake_convertion_rate"] = 0.9
+        updates["rewards_reinvest_rate"] = 1.0
+        updates["staking_renewal_rate"] = 0.9
     elif scenario == "pessimistic":
-        new_params_dict["initial_stake_convertion_rate"] = 0.4
-        new_params_dict["rewards_reinvest_rate"] = 0.0
-        new_params_dict["staking_renewal_rate"] = 0.998
-        new_params_dict["new_staker_inflow_model"]["init_stake_amt"] = 0.0
+        updates["initial_stake_convertion_rate"] = 0.4
+        updates["rewards_reinvest_rate"] = 0.0
+        updates["staking_renewal_rate"] = 0.998
+        updates["new_staker_inflow_model"] = {"init_stake_amt": 0.0}
     elif scenario == "optimistic":
-        new_params_dict["initial_stake_convertion_rate"] = 0.8
-        new_params_dict["rewards_reinvest_rate"] = 1.0
-        new_params_dict["staking_renewal_rate"] = 1.0
-        new_params_dict["new_staker_inflow_model"]["init_stake_amt"] = 205_500.0
-    return new_params_dict
+        updates["initial_stake_convertion_rate"] = 0.8
+        updates["rewards_reinvest_rate"] = 1.0
+        updates["staking_renewal_rate"] = 1.0
+        updates["new_staker_inflow_model"] = {"init_stake_amt": 205_500.0}
+    return update_params(params_dict, updates)
 
 
 def generate_service_fees_scenario(
@@ -96,7 +103,6 @@ def generate_service_fees_scenario(
     forecast_length: int,
 ) -> ParamsDict:
     assert scenario in SCENARIOS, f"Invalid scenario. Expected one of: {SCENARIOS}"
-    new_params_dict = params_dict.copy()
     if scenario in ["very bad", "bad", "good", "very good"]:
         drifts = {
             "very bad": -0.8,
@@ -104,22 +110,24 @@ def generate_service_fees_scenario(
             "good": 0.8 / 2,
             "very good": 0.8,
         }
-        new_params_dict["service_fees_model"]["sigma"] = 0.4
-        new_params_dict["service_fees_model"]["model"] = "gbm"
-        new_params_dict["service_fees_model"]["drift"] = drifts[scenario]
+        fees_updates = {
+            "sigma": 0.4,
+            "model": "gbm",
+            "drift": drifts[scenario],
+        }
     else:
-        new_params_dict["service_fees_model"]["model"] = "defined_path"
         base_path = ulla_defined_path(forecast_length)
         scenario_dict = {
             "pessimistic": 0.5,
             "base": 1.0,
             "optimistic": 2.0,
         }
-        new_params_dict["service_fees_model"]["sigma"] = 2000 * scenario_dict[scenario]
-        new_params_dict["service_fees_model"]["defined_path"] = (
-            base_path * scenario_dict[scenario]
-        )
-    return new_params_dict
+        fees_updates = {
+            "model": "defined_path",
+            "sigma": 2000 * scenario_dict[scenario],
+            "defined_path": base_path * scenario_dict[scenario],
+        }
+    return update_params(params_dict, {"service_fees_model": fees_updates})
 
 
 def ulla_defined_path(forecast_length: int) -> np.array:
@@ -159,14 +167,16 @@ def generate_protocol_scenario(
     params_dict: dict,
     scenario: str,
 ) -> ParamsDict:
-    new_params_dict = params_dict.copy()
-    if scenario == "base":
-        new_params_dict["protocol_funded_rate"] = 0.4
-    elif scenario == "pessimistic":
-        new_params_dict["protocol_funded_rate"] = 0.6
-    elif scenario == "optimistic":
-        new_params_dict["protocol_funded_rate"] = 0.2
-    return new_params_dict
+    protocol_funded_rates = {
+        "base": 0.4,
+        "pessimistic": 0.6,
+        "optimistic": 0.2,
+    }
+    if scenario not in protocol_funded_rates:
+        return params_dict
+    return update_params(
+        params_dict, {"protocol_funded_rate": protocol_funded_rates[scenario]}
+    )
 
 
 def generate_n_trx_scenario(
@@ -186,7 +196,6 @@ def generate_n_trx_scenario(
     """
     assert scenario in SCENARIOS, f"Invalid scenario. Expected one of: {SCENARIOS}"
     N_trx_constant = params_dict["ntxs_model"]["N_trx_constant"]
-    params_dict["ntxs_model"]["model"] = "linear"
     rates = {
         "very bad": -0.75 * N_trx_constant / 365,
         "bad": -0.25 * N_trx_constant / 365,
@@ -196,22 +205,16 @@ def generate_n_trx_scenario(
         "pessimistic": -0.75 * N_trx_constant / 365,
         "optimistic": 2 * N_trx_constant / 365,
     }
-    params_dict["ntxs_model"]["rate"] = rates[scenario]
-    if scenario == "base":
-        params_dict["ntxs_model"]["model"] = "poisson"
-    return params_dict
+    model = "poisson" if scenario == "base" else "linear"
+    return update_params(
+        params_dict, {"ntxs_model": {"model": model, "rate": rates[scenario]}}
+    )
 
 
 def generate_arrival_rate_scenario(
     params_dict: dict,
     scenario: str,
-    VALIDATOR_JOINING_RATES: dict = {
-        "very bad": 1 / 365,
-        "bad": 1 / 180,
-        "base": 1 / 90,
-        "good": 1 / 30,
-        "very good": 1 / 30,
-    },
+    joining_rates: dict = VALIDATOR_JOINING_RATES,
 ) -> ParamsDict:
     """
     Generate validators arrival rate scenario based on the given scenario.
@@ -219,13 +222,16 @@ def generate_arrival_rate_scenario(
     Args:
         params_dict (dict): The dictionary containing the parameters.
         scenario (str): The scenario for generating the arrival rate.
+        joining_rates (dict): The daily joining rate of every scenario.
 
     Returns:
         ParamsDict: Updated params_dict with the generated arrival rate scenario.
     """
-    assert scenario in SCENARIOS, f"Invalid scenario. Expected one of: {SCENARIOS}"
-    params_dict["n_validators_model"]["rate"] = VALIDATOR_JOINING_RATES[scenario]
-    return params_dict
+    assert (
+        scenario in joining_rates
+    ), f"Invalid scenario. Expected one of: {list(joining_rates)}"
+    rate = joining_rates[scenario]
+    return update_params(params_dict, {"n_validators_model": {"rate": rate}})
 
 
 def generate_price_scenario(
@@ -256,10 +262,12 @@ def generate_price_scenario(
         "pessimistic": -0.5,
         "optimistic": 0.5,
     }
-    params_dict["token_price_model"]["sigma"] = volatility
-    params_dict["token_price_model"]["model"] = "gbm"
-    params_dict["token_price_model"]["drift"] = drifts[scenario]
-    return params_dict
+    price_updates = {
+        "sigma": volatility,
+        "model": "gbm",
+        "drift": drifts[scenario],
+    }
+    return update_params(params_dict, {"token_price_model": price_updates})
 
 
 def generate_full_scenario(
@@ -292,7 +300,6 @@ def generate_full_scenario(
     params_dict = generate_n_trx_scenario(
         params_dict=params_dict,
         scenario=scenarios_dict["n_trx"],
-        sim_length=forecast_length,
     )
     return params_dict
 
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import pickle
+from typing import List, TYPE_CHECKING
+import numpy as np
+
+from .params import validate_params_dict
+from .data_models import (
+    DATA_MODEL_BUILDERS,
+    build_data_model_dict,
+    extend_model_data_dict,
+)
+from .events import as_event_schedule
+from .simulator import SupplySimulator
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ExtendableSim:
+    """
+    Single simulation run that can be extended to longer horizons and serves
+    any shorter one.
+
+    The model is causal, so the first T days of a run are a run over T days:
+    the run is computed once up to the longest horizon needed, `view` returns
+    the first T days of every output as array views, and `extend` continues
+    from the saved end state (the data models and a `SupplySimulator`)
+    without recomputing the prefix. The output arrays grow geometrically, so
+    extending costs amortised O(1) per day.
+
+    The only non-causal part of the model is the vesting on day 0 of the
+    extra burns (burn_extra_vec) of the whole horizon. Views of horizons that
+    end before some extra burn correct day_vested, circ_supply and market_cap
+    for it (these three columns are then copies).
+    """
+
+    def __init__(self, input_params_dict: dict, forecast_length: int = 0):
+        """
+        input_params_dict: The simulation parameters.
+        forecast_length: The number of days to simulate right away.
+        """
+        self.params_dict = input_params_dict
+        self.data_model_dict = build_data_model_dict(input_params_dict)
+        self.simulator = SupplySimulator(input_params_dict)
+        self.burn_extra_schedule = as_event_schedule(
+            input_params_dict["burn_extra_vec"]
+        )
+        self.forecast_length = 0
+        self.output_dict = {}
+        self.extend_to(forecast_length)
+
+    def extend(self, n_days: int) -> "ExtendableSim":
+        """
+        Simulates n_days more days and returns the run.
+        """
+        return self.extend_to(self.forecast_length + n_days)
+
+    def extend_to(self, forecast_length: int) -> "ExtendableSim":
+        """
+        Extends the run up to forecast_length days (if it is shorter) and
+        returns it.
+        """
+        start = self.forecast_length
+        if forecast_length <= start:
+            return self
+        validate_params_dict(forecast_length, self.params_dict)
+        data_dict = extend_model_data_dict(self.data_model_dict, start, forecast_length)
+        output_dict = self.simulator.advance(data_dict)
+        output_dict.update(data_dict)
+        for key, values in output_dict.items():
+            stored = self.output_dict.get(key)
+            if stored is None or len(stored) < forecast_length:
+                capacity = forecast_length
+                if stored is not None:
+                    capacity = max(capacity, 2 * len(stored))
+                grown = np.empty(capacity, dtype=values.dtype)
+                if stored is not None:
+                    grown[:start] = stored[:start]
+                self.output_dict[key] = stored = grown
+            stored[start:forecast_length] = values
+        self.forecast_length = forecast_length
+        return self
+
+    def view(self, forecast_length: int = None) -> dict:
+        """
+        Returns {column: first forecast_length days} of the supply outputs
+        and data paths (the whole run by default), which must not be longer
+        than the run.
+        """
+        if forecast_length is None:
+            forecast_length = self.forecast_length
+        if forecast_length > self.forecast_length:
+            raise ValueError(
+                f"The run only covers {self.forecast_length} days, "
+                f"extend it to view {forecast_length} days"
+            )
+        view_dict = {
+            key: values[:forecast_length] for key, values in self.output_dict.items()
+        }
+        # Only vest the extra burns of the viewed horizon on day 0
+        burn_extra_after = self.burn_extra_schedule.total() - (
+            self.burn_extra_schedule.total(forecast_length)
+        )
+        if burn_extra_after != 0 and forecast_length > 0:
+            view_dict["day_vested"] = view_dict["day_vested"].copy()
+            view_dict["day_vested"][0] -= burn_extra_after
+            view_dict["circ_supply"] = view_dict["circ_supply"] - burn_extra_after
+            view_dict["market_cap"] = (
+                view_dict["circ_supply"] * view_dict["token_price"]
+            )
+        return view_dict
+
+    def to_dataframe(self, forecast_length: int = None) -> pd.DataFrame:
+        """
+        Returns the first forecast_length days of the run as the output
+        dataframe of `run_single_sim`.
+        """
+        from .sim import build_output_dataframe
+
+        view_dict = self.view(forecast_length)
+        data_dict = {key: view_dict[key] for key in DATA_MODEL_BUILDERS}
+        supply_data_dict = {
+            key: values
+            for key, values in view_dict.items()
+            if key not in DATA_MODEL_BUILDERS
+        }
+        return build_output_dataframe(data_dict, supply_data_dict)
+
+    def save(self, path: str):
+        """
+        Saves the run, with its end state, to a pickle file.
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> "ExtendableSim":
+        """
+        Loads a run saved with `save`, ready to be viewed or extended.
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def run_horizons(forecast_lengths: List[int], input_params_dict: dict) -> dict:
+    """
+    Runs a single simulation up to the longest of forecast_lengths and
+    returns {forecast_length: output dataframe} for all of them, as if
+    `run_single_sim` had been called for each horizon on the same paths.
+    """
+    sim = ExtendableSim(input_params_dict, max(forecast_lengths))
+    return {
+        forecast_length: sim.to_dataframe(forecast_length)
+        for forecast_length in forecast_lengths
+    }
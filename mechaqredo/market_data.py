@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import numpy as np
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class MarketDataStore:
+    """
+    Local store of daily market data series (token prices, service fees, ...).
+
+    Every series is kept as a .npz file of sorted datetime64[D] dates and
+    float values, so date-range slices are two binary searches and reading a
+    series needs neither pandas nor network access. Loaded series are cached
+    in memory.
+    """
+
+    def __init__(self, root_dir: str):
+        """
+        root_dir: The directory holding the series files.
+        """
+        self.root_dir = root_dir
+        self._series_dict = {}
+        os.makedirs(root_dir, exist_ok=True)
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of the stored series.
+        """
+        return sorted(
+            file_name[: -len(".npz")]
+            for file_name in os.listdir(self.root_dir)
+            if file_name.endswith(".npz")
+        )
+
+    def append(self, name: str, dates, values) -> int:
+        """
+        Adds observations to a series (creating it if needed). New values
+        replace the stored ones on the same dates. Returns the series length.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]").ravel()
+        values = np.asarray(values, dtype=float).ravel()
+        if dates.shape != values.shape:
+            raise ValueError("Market data needs one value per date")
+        if os.path.exists(self._path(name)):
+            stored_dates, stored_values = self._load(name)
+            dates = np.concatenate([stored_dates, dates])
+            values = np.concatenate([stored_values, values])
+        # Keep the last value of every date, sorted by date
+        order = np.argsort(dates, kind="stable")
+        dates, values = dates[order], values[order]
+        is_last = np.r_[dates[1:] != dates[:-1], True]
+        dates, values = dates[is_last], values[is_last]
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, dates=dates.astype(np.int64), values=values)
+        os.replace(tmp_path, path)
+        self._series_dict[name] = (dates, values)
+        return len(dates)
+
+    def append_series(self, name: str, series: pd.Series) -> int:
+        """
+        Adds the observations of a date-indexed pandas Series, e.g. the output
+        of `price.download_data`.
+        """
+        series = series.dropna()
+        return self.append(
+            name, series.index.values.astype("datetime64[D]"), series.values
+        )
+
+    def ingest_file(
+        self,
+        name: str,
+        file_path: str,
+        date_column: str = "Date",
+        value_column: str = "Close",
+    ) -> int:
+        """
+        Appends the date and value columns of a CSV or Parquet file to a
+        series. Returns the series length.
+        """
+        import pandas as pd
+
+        if file_path.endswith(".parquet"):
+            df = pd.read_parquet(file_path, columns=[date_column, value_column])
+        else:
+            df = pd.read_csv(file_path, usecols=[date_column, value_column])
+        df = df.dropna()
+        dates = pd.to_datetime(df[date_column]).values.astype("datetime64[D]")
+        return self.append(name, dates, df[value_column].values)
+
+    def get(self, name: str, start=None, end=None) -> tuple:
+        """
+        Returns the (dates, values) of a series between start and end (both
+        included, open-ended if None).
+        """
+        dates, values = self._load(name)
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "D"))
+        hi = (
+            len(dates)
+            if end is None
+            else np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+        )
+        return dates[lo:hi], values[lo:hi]
+
+    def get_series(self, name: str, start=None, end=None) -> pd.Series:
+        """
+        Returns a slice of a series as a date-indexed pandas Series.
+        """
+        import pandas as pd
+
+        dates, values = self.get(name, start, end)
+        return pd.Series(values, index=pd.DatetimeIndex(dates), name=name)
+
+    def get_matrix(self, names: List[str], start=None, end=None) -> tuple:
+        """
+        Aligns several series on a daily calendar between start and end and
+        returns (dates, array of shape (len(names), n_days)), holding NaN on
+        the missing days.
+        """
+        slice_list = [self.get(name, start, end) for name in names]
+        non_empty_list = [dates for dates, _ in slice_list if len(dates) > 0]
+        if len(non_empty_list) == 0:
+            return np.array([], dtype="datetime64[D]"), np.zeros((len(names), 0))
+        first = np.datetime64(start, "D") if start is not None else None
+        last = np.datetime64(end, "D") if end is not None else None
+        if first is None:
+            first = min(dates[0] for dates in non_empty_list)
+        if last is None:
+            last = max(dates[-1] for dates in non_empty_list)
+        calendar = np.arange(first, last + 1, dtype="datetime64[D]")
+        value_mat = np.full((len(names), len(calendar)), np.nan)
+        for i, (dates, values) in enumerate(slice_list):
+            value_mat[i, (dates - first).astype(int)] = values
+        return calendar, value_mat
+
+    def _load(self, name: str) -> tuple:
+        if name not in self._series_dict:
+            path = self._path(name)
+            if not os.path.exists(path):
+                raise ValueError(f"Unknown market data series '{name}'")
+            with np.load(path) as data:
+                dates = data["dates"].astype("datetime64[D]")
+                values = data["values"]
+            self._series_dict[name] = (dates, values)
+        return self._series_dict[name]
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root_dir, f"{name}.npz")
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import math
+import threading
+import contextlib
+import contextvars
+import tracemalloc
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Profiler of the current context, None when memory profiling is off
+_MEMORY_PROFILER = contextvars.ContextVar("memory_profiler", default=None)
+
+
+class _StageFrame:
+    # A stage being run: its path, traced memory at entry and peak so far
+    __slots__ = ("path", "start_bytes", "peak_bytes")
+
+    def __init__(self, path: str, start_bytes: int):
+        self.path = path
+        self.start_bytes = start_bytes
+        self.peak_bytes = start_bytes
+
+
+class MemoryProfiler:
+    """
+    Memory accounting of the `memory_stage`s run inside a `memory_profile`.
+
+    Every stage is identified by its path, the names of the enclosing stages
+    joined by "/" (e.g. "simulate/staking"), and gets:
+    calls: The number of times it ran.
+    peak_bytes: The largest peak of the traced (Python and numpy) allocations
+        made during a call, above the memory in use when it started.
+    retained_bytes: The traced allocations made by the calls and still held
+        when they ended, net of what they freed, summed over the calls (e.g.
+        the outputs they return).
+    rss_peak_bytes: The largest resident set size of the process sampled
+        while it ran (None without RSS sampling).
+    """
+
+    def __init__(self, rss_interval: float = 0.01):
+        """
+        rss_interval: The seconds between two RSS samples, or None to only
+            trace the allocations. The RSS sampling needs psutil.
+        """
+        self.rss_interval = rss_interval
+        self.stage_dict = {}
+        self.stack = [_StageFrame("", tracemalloc.get_traced_memory()[0])]
+        self.rss_peak_bytes = None
+        self._total_stats = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._process = None
+        if rss_interval is not None:
+            try:
+                import psutil
+            except ImportError as e:
+                raise ImportError(
+                    "RSS sampling requires psutil (or use rss_interval=None)"
+                ) from e
+            self._process = psutil.Process()
+            self._sample_rss()
+            self._sampler = threading.Thread(target=self._sample_rss_loop, daemon=True)
+
+    @property
+    def peak_bytes(self) -> int:
+        """
+        The peak of the traced allocations since the profile started, above
+        the memory in use then.
+        """
+        root = self.stack[0]
+        return max(root.peak_bytes, tracemalloc.get_traced_memory()[1]) - (
+            root.start_bytes
+        )
+
+    def enter(self, name: str):
+        # Close the peak of the enclosing stage and start the one of the stage
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        parent = self.stack[-1]
+        parent.peak_bytes = max(parent.peak_bytes, peak_bytes)
+        tracemalloc.reset_peak()
+        path = f"{parent.path}/{name}" if parent.path else name
+        # Registered on entry, so the report lists the stages in call order
+        self._stage_stats(path)
+        self.stack.append(_StageFrame(path, current_bytes))
+
+    def exit(self):
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        frame = self.stack.pop()
+        frame.peak_bytes = max(frame.peak_bytes, peak_bytes)
+        stats = self._stage_stats(frame.path)
+        stats["calls"] += 1
+        stats["peak_bytes"] = max(
+            stats["peak_bytes"], frame.peak_bytes - frame.start_bytes
+        )
+        stats["retained_bytes"] += current_bytes - frame.start_bytes
+        # The enclosing stage peaked at least as high
+        parent = self.stack[-1]
+        parent.peak_bytes = max(parent.peak_bytes, frame.peak_bytes)
+        tracemalloc.reset_peak()
+
+    def report(self) -> dict:
+        """
+        Returns {stage path: stats} (see the class documentation), plus the
+        whole profile under "total".
+        """
+        report_dict = {path: dict(stats) for path, stats in self.stage_dict.items()}
+        if self._total_stats is not None:
+            report_dict["total"] = dict(self._total_stats)
+            return report_dict
+        self._sample_rss()
+        report_dict["total"] = {
+            "calls": 1,
+            "peak_bytes": self.peak_bytes,
+            "retained_bytes": tracemalloc.get_traced_memory()[0]
+            - self.stack[0].start_bytes,
+            "rss_peak_bytes": self.rss_peak_bytes,
+        }
+        return report_dict
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the report as a dataframe, one row per stage, in MB.
+        """
+        import pandas as pd
+
+        df = pd.DataFrame.from_dict(self.report(), orient="index")
+        df.index.name = "stage"
+        for col in ["peak_bytes", "retained_bytes", "rss_peak_bytes"]:
+            df[col.replace("_bytes", "_MB")] = df[col].astype(float) / 2**20
+        return df.drop(columns=["peak_bytes", "retained_bytes", "rss_peak_bytes"])
+
+    def _start(self):
+        if self._sampler is not None:
+            self._sampler.start()
+
+    def _stop(self):
+        # Stops the sampling and freezes the totals, before tracing stops
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self._total_stats = self.report()["total"]
+
+    def _stage_stats(self, path: str) -> dict:
+        return self.stage_dict.setdefault(
+            path,
+            {
+                "calls": 0,
+                "peak_bytes": 0,
+                "retained_bytes": 0,
+                "rss_peak_bytes": None,
+            },
+        )
+
+    def _sample_rss_loop(self):
+        while not self._stop_event.wait(self.rss_interval):
+            self._sample_rss()
+
+    def _sample_rss(self):
+        # Attributes an RSS sample to the profile and to the running stages
+        if self._process is None:
+            return
+        rss_bytes = self._process.memory_info().rss
+        self.rss_peak_bytes = max(self.rss_peak_bytes or 0, rss_bytes)
+        for frame in list(self.stack[1:]):
+            stats = self._stage_stats(frame.path)
+            stats["rss_peak_bytes"] = max(stats["rss_peak_bytes"] or 0, rss_bytes)
+
+
+@contextlib.contextmanager
+def memory_profile(rss_interval: float = 0.01):
+    """
+    Profiles the memory of the code run inside the context, and yields the
+    MemoryProfiler whose `report` attributes it to the `memory_stage`s. The
+    allocations are traced with tracemalloc (which slows allocation-heavy
+    Python code down), and the RSS is sampled every rss_interval seconds by
+    a background thread. Only the current process is followed, so the stages
+    run by pool workers are not reported.
+    """
+    if _MEMORY_PROFILER.get() is not None:
+        raise ValueError("A memory profile is already running")
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = MemoryProfiler(rss_interval)
+    token = _MEMORY_PROFILER.set(profiler)
+    profiler._start()
+    try:
+        yield profiler
+    finally:
+        profiler._stop()
+        _MEMORY_PROFILER.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def memory_stage(name: str):
+    """
+    Marks the code run inside the context as a stage of the memory profile.
+    Does nothing unless a `memory_profile` is running.
+    """
+    profiler = _MEMORY_PROFILER.get()
+    if profiler is None:
+        yield
+        return
+    profiler.enter(name)
+    try:
+        yield
+    finally:
+        profiler.exit()
+
+
+def project_sweep_memory(
+    forecast_length: int,
+    input_params_dict: dict,
+    param_ranges_dict: dict,
+    data_dict_n_samples: int = 1,
+    **sweep_kwargs,
+) -> dict:
+    """
+    Projects the memory of a `run_param_sweep_sim` before running it, from a
+    profiled pilot sweep of a single run with the same options
+    (sweep_kwargs, e.g. resolution or output_schema). The pilot draws its own
+    data paths and bypasses the cache.
+
+    The sweep holds the data paths and, until the final concat, the
+    dataframes of all the runs. The concat then copies them into the sweep
+    dataframe. Returns:
+    n_runs: The number of runs (sweep iterations times data samples).
+    data_bytes: The data paths.
+    run_df_bytes: The dataframe of a run, kept until the concat (with the
+        outputs of the simulation it wraps).
+    run_peak_bytes: The peak of a run (simulation and dataframe).
+    loop_peak_bytes: The projected peak during the runs.
+    concat_peak_bytes: The projected peak during the concat.
+    projected_peak_bytes: The projected peak of the sweep.
+    available_bytes: The memory available now (None without psutil).
+    """
+    from .sim import run_param_sweep_sim
+
+    sweep_kwargs = dict(sweep_kwargs)
+    data_dict_list = sweep_kwargs.pop("data_dict_list", None)
+    if data_dict_list is not None:
+        data_dict_n_samples = len(data_dict_list)
+    # Without a seed nor data paths, the sweep is not cached
+    sweep_kwargs.pop("seed", None)
+    sweep_kwargs["save"] = False
+    n_runs = data_dict_n_samples * math.prod(
+        len(values) for values in param_ranges_dict.values()
+    )
+    # The pilot runs the first value of every swept parameter
+    pilot_ranges_dict = {
+        key: list(values)[:1] for key, values in param_ranges_dict.items()
+    }
+    with memory_profile(rss_interval=None) as profiler:
+        run_param_sweep_sim(
+            forecast_length, input_params_dict, pilot_ranges_dict, 1, **sweep_kwargs
+        )
+    report_dict = profiler.report()
+    data_bytes = report_dict["data_paths"]["retained_bytes"]
+    run_df_bytes = (
+        report_dict["simulate"]["retained_bytes"]
+        + report_dict["dataframe"]["retained_bytes"]
+    )
+    run_peak_bytes = max(
+        report_dict["simulate"]["peak_bytes"], report_dict["dataframe"]["peak_bytes"]
+    )
+    loop_peak_bytes = (
+        data_dict_n_samples * data_bytes + (n_runs - 1) * run_df_bytes + run_peak_bytes
+    )
+    concat_peak_bytes = data_dict_n_samples * data_bytes + 2 * n_runs * run_df_bytes
+    available_bytes = None
+    try:
+        import psutil
+
+        available_bytes = psutil.virtual_memory().available
+    except ImportError:
+        pass
+    return {
+        "n_runs": n_runs,
+        "data_bytes": data_dict_n_samples * data_bytes,
+        "run_df_bytes": run_df_bytes,
+        "run_peak_bytes": run_peak_bytes,
+        "loop_peak_bytes": loop_peak_bytes,
+        "concat_peak_bytes": concat_peak_bytes,
+        "projected_peak_bytes": max(loop_peak_bytes, concat_peak_bytes),
+        "available_bytes": available_bytes,
+    }
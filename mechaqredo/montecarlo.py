@@ -0,0 +1,119 @@
+import numpy as np
+
+from .params import validate_params_dict
+from .data_models import build_model_data_dict_batch, split_model_data_dict_batch
+from .supply import forecast_supply_stats
+from .paths import gbm_mean, pair_average
+
+
+def estimate_mean(
+    forecast_length: int,
+    input_params_dict: dict,
+    metric: str = "circ_supply",
+    day: int = -1,
+    shock_method: str = "iid",
+    control_variate: bool = False,
+    tol: float = None,
+    batch_size: int = 64,
+    max_samples: int = 10_000,
+) -> dict:
+    """
+    Estimates the expected value of an output metric on a given day.
+
+    forecast_length: The number of simulated days.
+    input_params_dict: The simulation parameters.
+    metric: The output column of `forecast_supply_stats` to estimate.
+    day: The day at which the metric is read (defaults to the last day).
+    shock_method: 'iid', 'antithetic' or 'sobol' normal shocks for the price and
+        fee paths. With 'sobol', every batch is an independently scrambled
+        point set and the standard error is measured across batch means, so at
+        least two batches are run.
+    control_variate: If True, the token price and service fees on the same day
+        are used as control variates whenever they follow a GBM, whose mean is
+        known in closed form.
+    tol: If given, batches of `batch_size` samples are added until the
+        standard error falls below tol (or `max_samples` is reached).
+        Otherwise a single batch of `batch_size` samples is used.
+    batch_size: The number of samples per batch.
+    max_samples: The maximum number of samples in adaptive mode.
+
+    Returns {"mean", "std_error", "n_samples"}.
+    """
+    params_dict = validate_params_dict(forecast_length, input_params_dict)
+    control_mean_list = _control_variate_means(forecast_length, params_dict, day)
+    if control_variate and len(control_mean_list) == 0:
+        raise ValueError(
+            "Control variates need a GBM token price or service fees model"
+        )
+    if shock_method == "antithetic" and batch_size % 2 == 1:
+        batch_size += 1
+    min_batches = 2 if shock_method == "sobol" else 1
+    metric_list = []
+    control_list = []
+    while True:
+        batch_data_dict = build_model_data_dict_batch(
+            batch_size, forecast_length, params_dict, shock_method
+        )
+        for data_dict in split_model_data_dict_batch(batch_data_dict):
+            supply_data_dict = forecast_supply_stats(
+                forecast_length, params_dict, data_dict
+            )
+            metric_list.append(supply_data_dict[metric][day])
+            control_list.append([data_dict[key][day] for key, _ in control_mean_list])
+        estimate_dict = _mean_and_std_error(
+            np.array(metric_list),
+            np.array(control_list),
+            [mean for _, mean in control_mean_list] if control_variate else [],
+            shock_method,
+            batch_size,
+        )
+        estimate_dict["n_samples"] = len(metric_list)
+        if len(metric_list) < min_batches * batch_size:
+            continue
+        if tol is None or estimate_dict["std_error"] < tol:
+            break
+        if len(metric_list) + batch_size > max_samples:
+            break
+    return estimate_dict
+
+
+def _control_variate_means(forecast_length: int, params_dict: dict, day: int) -> list:
+    # Known means of the GBM driven data paths on the given day
+    control_mean_list = []
+    for key, model_key, x0_key in [
+        ("token_price", "token_price_model", "P0"),
+        ("service_fees", "service_fees_model", "A0"),
+    ]:
+        model_params_dict = params_dict[model_key]
+        if model_params_dict["model"] == "gbm":
+            mean_vec = gbm_mean(
+                model_params_dict[x0_key],
+                model_params_dict["drift"],
+                forecast_length - 1,
+                model_params_dict["dt"],
+            )
+            control_mean_list.append((key, mean_vec[day]))
+    return control_mean_list
+
+
+def _mean_and_std_error(
+    metric_vec: np.array,
+    control_mat: np.array,
+    control_mean_list: list,
+    shock_method: str,
+    batch_size: int,
+) -> dict:
+    # Antithetic pairs are averaged into independent replicates first
+    y = pair_average(metric_vec, shock_method)
+    if len(control_mean_list) > 0:
+        c = pair_average(control_mat[:, : len(control_mean_list)], shock_method)
+        c_centred = c - np.array(control_mean_list)
+        c_dev = c - c.mean(axis=0)
+        beta = np.linalg.lstsq(c_dev, y - y.mean(), rcond=None)[0]
+        y = y - c_centred @ beta
+    # Randomised QMC batches are the independent replicates
+    if shock_method == "sobol":
+        y = y.reshape(-1, batch_size).mean(axis=1)
+    n = len(y)
+    std_error = y.std(ddof=1) / np.sqrt(n) if n > 1 else np.inf
+    return {"mean": float(y.mean()), "std_error": float(std_error)}
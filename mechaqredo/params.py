@@ -1,8 +1,143 @@
 import numpy as np
 import datetime as dt
+from collections import OrderedDict
+from collections.abc import Mapping
+from numbers import Integral, Real
 
+from .cache import hash_params
+from .events import EventSchedule
+from .release_rate import DEFAULT_RELEASE_RATE_MODEL
+from .agents import DEFAULT_STAKING_ENGINE_MODEL
+from .vesting import VESTING_TRANCHE_TYPES, VESTING_TRANCHE_FIELDS
 
-def default_params_dict(forecast_length: int) -> dict:
+
+class Params(Mapping):
+    """
+    Immutable, hashable parameters mapping.
+
+    Nested dicts are wrapped as Params, lists become tuples and arrays are
+    stored as read-only views (their data is never copied). Overrides return a
+    new Params that shares every untouched value and sub-mapping with the
+    original one, so overriding a scalar does not copy arrays such as
+    wallet_balances_vec. Like a mappingproxy, copy() returns a shallow dict.
+    """
+
+    __slots__ = ("_data", "_hash")
+
+    def __init__(self, params_dict: Mapping = (), **kwargs):
+        data = {
+            key: _freeze(value) for key, value in dict(params_dict, **kwargs).items()
+        }
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_hash", None)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __setattr__(self, name, value):
+        raise TypeError("Params is immutable, use override() instead")
+
+    def __setitem__(self, key, value):
+        raise TypeError("Params is immutable, use override() instead")
+
+    def __delitem__(self, key):
+        raise TypeError("Params is immutable, use override() instead")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.stable_hash() == Params(other).stable_hash()
+
+    def __hash__(self) -> int:
+        return int(self.stable_hash()[:16], 16)
+
+    def __reduce__(self):
+        return (Params, (self._data,))
+
+    def __repr__(self) -> str:
+        return f"Params({self._data!r})"
+
+    def override(self, changes: Mapping = None, **kwargs) -> "Params":
+        """
+        Returns a new Params with the given values replaced. Plain dict values
+        are merged into the nested Params they target, e.g.
+        params.override(service_fees_model={"sigma": 0.4}).
+        """
+        changes = dict(changes or {}, **kwargs)
+        data = dict(self._data)
+        for key, value in changes.items():
+            current = data.get(key)
+            if isinstance(current, Params) and isinstance(value, dict):
+                data[key] = current.override(value)
+            else:
+                data[key] = _freeze(value)
+        new_params = Params.__new__(Params)
+        object.__setattr__(new_params, "_data", data)
+        object.__setattr__(new_params, "_hash", None)
+        return new_params
+
+    def stable_hash(self) -> str:
+        """
+        Returns a hex digest of the parameters that is stable across processes
+        and sessions, computed once and memoized.
+        """
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash_params(self._data))
+        return self._hash
+
+    def copy(self) -> dict:
+        return dict(self._data)
+
+    def to_dict(self) -> dict:
+        """
+        Returns a mutable nested dict (arrays stay shared read-only views).
+        """
+        return {
+            key: value.to_dict() if isinstance(value, Params) else value
+            for key, value in self._data.items()
+        }
+
+
+def _freeze(value):
+    if isinstance(value, Params):
+        return value
+    if isinstance(value, Mapping):
+        return Params(value)
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, np.ndarray) and value.flags.writeable:
+        value = value.view()
+        value.flags.writeable = False
+    return value
+
+
+def update_params(params_dict: Mapping, updates: Mapping) -> Mapping:
+    """
+    Returns params_dict with the (nested) updates applied, leaving params_dict
+    untouched. Only the sub-dicts on an updated path are copied; arrays and
+    untouched sub-dicts are shared. Params inputs return Params.
+    """
+    if isinstance(params_dict, Params):
+        return params_dict.override(updates)
+    new_params_dict = dict(params_dict)
+    for key, value in updates.items():
+        current = new_params_dict.get(key)
+        if isinstance(current, Mapping) and isinstance(value, dict):
+            new_params_dict[key] = update_params(current, value)
+        else:
+            new_params_dict[key] = value
+    return new_params_dict
+
+
+def default_params_dict(forecast_length: int = None) -> dict:
+    # The defaults do not depend on forecast_length, which is kept for
+    # backwards compatibility
     # TODO: confirm default values
     ntxs_model_params_dict = {
         "model": "constant",
@@ -40,6 +175,18 @@ def default_params_dict(forecast_length: int) -> dict:
         "init_stake_amt": 100_000.0,
         "rate": None,
     }
+    release_rate_params_dict = {
+        "model": "power",  # see release_rate.release_rate_curve
+        "fun": None,
+        "tvl_grid": None,
+        "n_val_grid": None,
+        "rate_grid": None,
+    }
+    staking_engine_params_dict = {
+        "model": "aggregate",  # or "agents" for per-wallet behaviour
+        "concentration": None,  # Beta concentration of the wallet propensities
+        "seed": None,
+    }
     previous_funds_params_dict = {
         "seed": {
             "vest_period_days": 7,
@@ -88,6 +235,7 @@ def default_params_dict(forecast_length: int) -> dict:
         "service_fees_model": service_model_params_dict,
         "n_validators_model": n_val_model_params_dict,
         "new_staker_inflow_model": new_staker_inflow_params_dict,
+        "staking_engine_model": staking_engine_params_dict,
         # Data params
         "previous_funds_vesting_spec": previous_funds_params_dict,
         "wallet_balances_vec": np.array([95_000_000.0]),
@@ -112,15 +260,490 @@ def default_params_dict(forecast_length: int) -> dict:
         "max_validators": 50,
         "max_TVL": (2000 - 140 - 160) * 0.7,
         "release_rate_max": 0.0008,  # (1-max_rate)**(2*365)>0.5, i.e. two max to half the fund value
+        "release_rate_model": release_rate_params_dict,
         # Allocation params
         "new_funds_vesting_spec": new_funds_params_dict,
         "staking_rewards_fund_size": 250_000_000,
         "ecosystem_refresh_size": 290_000_000,
-        "burn_extra_vec": np.array([160_000_000] + [0] * (forecast_length - 1)),
+        "burn_extra_vec": EventSchedule([0], [160_000_000]),
+        # Extra vesting tranches (see vesting.compile_vesting_schedule)
+        "vesting_tranches": [],
     }
     return params_dict
 
 
-def validate_params_dict(forecast_length: int, params_dict: dict) -> dict:
-    # TODO: implement parameters validation function
+# Declarative schema of the params dict. Each entry sets the field type
+# ("number", "integer", "datetime", "day", "array", "events", "callable",
+# "any", "model", "funds" or "tranches"), whether it may be None, and its
+# range, length or number of dimensions (arrays default to 1-D) constraints.
+# The "model" entries list, per model name, the fields that model requires.
+# Top-level entries with a "default" may be left out of the params dict, and
+# the simulation then uses the default.
+NTXS_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "schedule": {
+            "type": "array",
+            "nullable": True,
+            "min_length": "forecast_length",
+        },
+        "distr": {"type": "callable", "nullable": True},
+        "fun": {"type": "callable", "nullable": True},
+        "rate": {"type": "number", "nullable": True},
+        "N_trx_constant": {"type": "number", "nullable": True},
+    },
+    "models": {
+        "constant": ["N_trx_constant"],
+        "linear": ["rate", "N_trx_constant"],
+        "scheduled": ["schedule"],
+        "poisson": ["rate"],
+        "distr": ["distr"],
+        "function": ["fun"],
+    },
+}
+TOKEN_PRICE_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "P0": {"type": "number", "min": 0, "min_exclusive": True},
+        "drift": {"type": "number", "nullable": True},
+        "sigma": {"type": "number", "nullable": True, "min": 0},
+        "dt": {"type": "number", "min": 0, "min_exclusive": True},
+    },
+    "models": {
+        "constant": [],
+        "gbm": ["drift", "sigma"],
+    },
+}
+SERVICE_FEES_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "A0": {"type": "number"},
+        "a": {"type": "number", "nullable": True},
+        "drift": {"type": "number", "nullable": True},
+        "sigma": {"type": "number", "nullable": True, "min": 0},
+        "dt": {"type": "number", "min": 0, "min_exclusive": True},
+        "theta": {"type": "number", "nullable": True, "min": 0},
+        "defined_path": {
+            "type": "array",
+            "nullable": True,
+            "min_length": "forecast_length",
+        },
+    },
+    "models": {
+        "constant": [],
+        "linear": ["a"],
+        "gbm": ["drift", "sigma"],
+        "ou": ["drift", "sigma", "theta"],
+        "defined_path": ["defined_path", "sigma"],
+    },
+}
+N_VALIDATORS_MODEL_SCHEMA = {
+    "fields": {
+        "rate": {"type": "number", "nullable": True, "min": 0},
+        "constant_rate": {
+            "type": "number",
+            "nullable": True,
+            "min": 0,
+            "min_exclusive": True,
+        },
+        "list_of_precomputed_arrivals": {"type": "array", "nullable": True},
+        "initial_number": {"type": "integer", "min": 0},
+    },
+    "any_of": ["rate", "constant_rate", "list_of_precomputed_arrivals"],
+}
+NEW_STAKER_INFLOW_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "init_stake_amt": {"type": "number"},
+        "rate": {"type": "number", "nullable": True},
+    },
+    "models": {
+        "constant": [],
+        "linear": ["rate"],
+    },
+}
+RELEASE_RATE_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "fun": {"type": "callable", "nullable": True},
+        "tvl_grid": {"type": "array", "nullable": True, "min": 0},
+        "n_val_grid": {"type": "array", "nullable": True, "min": 0},
+        "rate_grid": {"type": "array", "nullable": True, "ndim": 2, "min": 0},
+    },
+    "models": {
+        "power": [],
+        "grid": ["tvl_grid", "n_val_grid", "rate_grid"],
+        "function": ["fun"],
+    },
+}
+STAKING_ENGINE_MODEL_SCHEMA = {
+    "fields": {
+        "model": {"type": "any"},
+        "concentration": {
+            "type": "number",
+            "nullable": True,
+            "min": 0,
+            "min_exclusive": True,
+        },
+        "seed": {"type": "integer", "nullable": True, "min": 0},
+    },
+    "models": {
+        "aggregate": [],
+        "agents": [],
+    },
+}
+FUND_SPEC_SCHEMA = {
+    "fields": {
+        "vest_period_days": {
+            "type": "integer",
+            "nullable": True,
+            "min": 0,
+            "min_exclusive": True,
+        },
+        "vest_end_date": {"type": "datetime", "nullable": True},
+        "vest_amount": {"type": "number", "nullable": True, "min": 0},
+        "vest_zero": {"type": "number", "min": 0},
+    },
+    "requires": {"vest_amount": ["vest_period_days", "vest_end_date"]},
+}
+# Fields of the vesting tranches, whose type sets the required ones
+# (vesting.VESTING_TRANCHE_FIELDS)
+VESTING_TRANCHE_SCHEMA = {
+    "day": {"type": "day"},
+    "start": {"type": "day"},
+    "end": {"type": "day"},
+    "amount": {"type": "number", "min": 0},
+    "period_days": {"type": "integer", "min": 0, "min_exclusive": True},
+    "decay_rate": {"type": "number", "min": 0},
+}
+RATE = {"type": "number", "min": 0, "max": 1}
+NON_NEGATIVE = {"type": "number", "min": 0}
+POSITIVE = {"type": "number", "min": 0, "min_exclusive": True}
+PARAMS_SCHEMA = {
+    "sim_start_datetime": {"type": "datetime"},
+    # User model params
+    "ntxs_model": {"type": "model", "schema": NTXS_MODEL_SCHEMA},
+    "token_price_model": {"type": "model", "schema": TOKEN_PRICE_MODEL_SCHEMA},
+    "service_fees_model": {"type": "model", "schema": SERVICE_FEES_MODEL_SCHEMA},
+    "n_validators_model": {"type": "model", "schema": N_VALIDATORS_MODEL_SCHEMA},
+    "new_staker_inflow_model": {
+        "type": "model",
+        "schema": NEW_STAKER_INFLOW_MODEL_SCHEMA,
+    },
+    "staking_engine_model": {
+        "type": "model",
+        "schema": STAKING_ENGINE_MODEL_SCHEMA,
+        "default": DEFAULT_STAKING_ENGINE_MODEL,
+    },
+    # Data params
+    "previous_funds_vesting_spec": {"type": "funds"},
+    "wallet_balances_vec": {"type": "array", "min": 0},
+    "circ_supply_zero": NON_NEGATIVE,
+    "ecosystem_fund_zero": NON_NEGATIVE,
+    # User behavior params
+    "protocol_funded_rate": RATE,
+    "initial_stake_convertion_rate": RATE,
+    "rewards_reinvest_rate": RATE,
+    "staking_renewal_rate": RATE,
+    "slippage": RATE,
+    # Tokenomic params
+    "tipping_rate": RATE,
+    "protocol_fee_rate": NON_NEGATIVE,
+    "min_stake_amount": NON_NEGATIVE,
+    "min_stake_duration": {"type": "integer", "min": 1},
+    "validator_reward_share": RATE,
+    "staking_rewards_vesting_decay_rate": NON_NEGATIVE,
+    # Tokenomic params for the release rate function
+    "release_rate_a": NON_NEGATIVE,
+    "release_rate_b": RATE,
+    "max_validators": POSITIVE,
+    "max_TVL": POSITIVE,
+    "release_rate_max": RATE,
+    "release_rate_model": {
+        "type": "model",
+        "schema": RELEASE_RATE_MODEL_SCHEMA,
+        "default": DEFAULT_RELEASE_RATE_MODEL,
+    },
+    # Allocation params
+    "new_funds_vesting_spec": {"type": "funds"},
+    "staking_rewards_fund_size": NON_NEGATIVE,
+    "ecosystem_refresh_size": NON_NEGATIVE,
+    "burn_extra_vec": {"type": "events", "length": "forecast_length"},
+    "vesting_tranches": {"type": "tranches", "default": []},
+}
+
+# Memo of the (forecast_length, stable hash) of the Params validated in full
+_VALIDATED_PARAMS = OrderedDict()
+_VALIDATED_PARAMS_MAX_SIZE = 4096
+
+
+def validate_params_dict(
+    forecast_length: int, params_dict: dict, changed_keys=None
+) -> dict:
+    """
+    Checks the parameter types, ranges and array lengths against PARAMS_SCHEMA
+    and raises a ValueError naming the first invalid parameter.
+
+    Params inputs that passed a full check are memoized by their stable hash,
+    so validating them again is a dictionary lookup. If changed_keys is given,
+    params_dict is assumed to differ from already validated parameters only
+    in those top-level keys, and only those are checked (e.g. the swept keys
+    of a parameter sweep).
+    """
+    if changed_keys is not None:
+        for key in changed_keys:
+            _check_param(forecast_length, params_dict, key)
+        return params_dict
+    memo_key = None
+    if isinstance(params_dict, Params):
+        memo_key = (forecast_length, params_dict.stable_hash())
+        if memo_key in _VALIDATED_PARAMS:
+            _VALIDATED_PARAMS.move_to_end(memo_key)
+            return params_dict
+    for key in _COMPILED_PARAMS_SCHEMA:
+        _check_param(forecast_length, params_dict, key)
+    if memo_key is not None:
+        _VALIDATED_PARAMS[memo_key] = True
+        if len(_VALIDATED_PARAMS) > _VALIDATED_PARAMS_MAX_SIZE:
+            _VALIDATED_PARAMS.popitem(last=False)
     return params_dict
+
+
+def param_bounds(key: str) -> tuple:
+    """
+    Returns the (min, max) range of a numeric parameter (None if unbounded).
+    """
+    spec = PARAMS_SCHEMA.get(key, {})
+    return spec.get("min"), spec.get("max")
+
+
+def _check_param(forecast_length: int, params_dict: dict, key: str):
+    if key not in params_dict:
+        if "default" in PARAMS_SCHEMA.get(key, {}):
+            return
+        raise ValueError(f"Missing parameter '{key}'")
+    checker = _COMPILED_PARAMS_SCHEMA.get(key)
+    if checker is not None:
+        checker(params_dict[key], forecast_length)
+
+
+def _compile_field(spec: dict, path: str):
+    # Returns a checker(value, forecast_length) for a field spec
+    field_type = spec["type"]
+    nullable = spec.get("nullable", False)
+    if field_type in ("number", "integer"):
+        type_check = _compile_number(spec, path)
+    elif field_type == "datetime":
+        type_check = _compile_isinstance((dt.datetime,), "a datetime", path)
+    elif field_type == "day":
+        type_check = _compile_isinstance(
+            (Integral, dt.datetime), "a day number or a datetime", path
+        )
+    elif field_type == "callable":
+        type_check = _compile_callable(path)
+    elif field_type == "array":
+        type_check = _compile_array(spec, path)
+    elif field_type == "events":
+        type_check = _compile_events(spec, path)
+    elif field_type == "model":
+        type_check = _compile_model(spec["schema"], path)
+    elif field_type == "funds":
+        type_check = _compile_funds(path)
+    elif field_type == "tranches":
+        type_check = _compile_tranches(path)
+    elif field_type == "any":
+        return lambda value, forecast_length: None
+    else:
+        raise ValueError(f"Unknown schema type '{field_type}' for '{path}'")
+
+    def check(value, forecast_length):
+        if value is None:
+            if nullable:
+                return
+            raise ValueError(f"Parameter '{path}' must not be None")
+        type_check(value, forecast_length)
+
+    return check
+
+
+def _compile_number(spec: dict, path: str):
+    number_type = Integral if spec["type"] == "integer" else Real
+    type_name = "an integer" if spec["type"] == "integer" else "a number"
+    min_value = spec.get("min")
+    max_value = spec.get("max")
+    min_exclusive = spec.get("min_exclusive", False)
+
+    def check(value, forecast_length):
+        if not isinstance(value, number_type) or isinstance(value, bool):
+            raise ValueError(f"Parameter '{path}' must be {type_name}, got {value!r}")
+        if not np.isfinite(value):
+            raise ValueError(f"Parameter '{path}' must be finite, got {value!r}")
+        if min_value is not None and (
+            value < min_value or (min_exclusive and value == min_value)
+        ):
+            relation = ">" if min_exclusive else ">="
+            raise ValueError(
+                f"Parameter '{path}' must be {relation} {min_value}, got {value!r}"
+            )
+        if max_value is not None and value > max_value:
+            raise ValueError(
+                f"Parameter '{path}' must be <= {max_value}, got {value!r}"
+            )
+
+    return check
+
+
+def _compile_isinstance(types: tuple, type_name: str, path: str):
+    def check(value, forecast_length):
+        if not isinstance(value, types):
+            raise ValueError(f"Parameter '{path}' must be {type_name}, got {value!r}")
+
+    return check
+
+
+def _compile_callable(path: str):
+    def check(value, forecast_length):
+        if not callable(value):
+            raise ValueError(f"Parameter '{path}' must be callable, got {value!r}")
+
+    return check
+
+
+def _compile_array(spec: dict, path: str):
+    length = spec.get("length")
+    min_length = spec.get("min_length")
+    min_value = spec.get("min")
+    ndim = spec.get("ndim", 1)
+
+    def check(value, forecast_length):
+        arr = np.asarray(value)
+        if arr.ndim != ndim or not np.issubdtype(arr.dtype, np.number):
+            raise ValueError(f"Parameter '{path}' must be a {ndim}-D numeric array")
+        if length == "forecast_length" and len(arr) != forecast_length:
+            raise ValueError(
+                f"Parameter '{path}' must have length {forecast_length}, "
+                f"got {len(arr)}"
+            )
+        if min_length == "forecast_length" and len(arr) < forecast_length:
+            raise ValueError(
+                f"Parameter '{path}' must have at least {forecast_length} values, "
+                f"got {len(arr)}"
+            )
+        if min_value is not None and len(arr) > 0 and arr.min() < min_value:
+            raise ValueError(f"Parameter '{path}' must be >= {min_value}")
+
+    return check
+
+
+def _compile_events(spec: dict, path: str):
+    # Event schedules, or dense daily arrays checked as such
+    array_check = _compile_array(spec, path)
+
+    def check(value, forecast_length):
+        if not isinstance(value, EventSchedule):
+            array_check(value, forecast_length)
+        elif not np.all(np.isfinite(value.amounts)):
+            raise ValueError(f"Parameter '{path}' must have finite amounts")
+
+    return check
+
+
+def _compile_model(schema: dict, path: str):
+    field_checkers = {
+        key: _compile_field(spec, f"{path}.{key}")
+        for key, spec in schema["fields"].items()
+    }
+    models = schema.get("models")
+    any_of = schema.get("any_of")
+    requires = schema.get("requires", {})
+
+    def check(value, forecast_length):
+        if not isinstance(value, Mapping):
+            raise ValueError(f"Parameter '{path}' must be a dict, got {value!r}")
+        for key, checker in field_checkers.items():
+            if key not in value:
+                raise ValueError(f"Missing parameter '{path}.{key}'")
+            checker(value[key], forecast_length)
+        if models is not None:
+            model = value["model"]
+            if model not in models:
+                raise ValueError(
+                    f"Parameter '{path}.model' must be one of {list(models)}, "
+                    f"got {model!r}"
+                )
+            for key in models[model]:
+                if value[key] is None:
+                    raise ValueError(
+                        f"Parameter '{path}.{key}' is required for the "
+                        f"'{model}' model"
+                    )
+        if any_of is not None and all(value[key] is None for key in any_of):
+            raise ValueError(f"Parameter '{path}' needs one of {any_of}")
+        for key, required_keys in requires.items():
+            if value[key] is not None:
+                for required_key in required_keys:
+                    if value[required_key] is None:
+                        raise ValueError(
+                            f"Parameter '{path}.{required_key}' is required "
+                            f"when '{key}' is set"
+                        )
+
+    return check
+
+
+def _compile_funds(path: str):
+    def check(value, forecast_length):
+        if not isinstance(value, Mapping):
+            raise ValueError(f"Parameter '{path}' must be a dict, got {value!r}")
+        for fund_name, fund_spec in value.items():
+            fund_path = f"{path}.{fund_name}"
+            fund_checker = _COMPILED_FUND_SPEC_SCHEMA.get(fund_path)
+            if fund_checker is None:
+                fund_checker = _compile_model(FUND_SPEC_SCHEMA, fund_path)
+                _COMPILED_FUND_SPEC_SCHEMA[fund_path] = fund_checker
+            fund_checker(fund_spec, forecast_length)
+
+    return check
+
+
+def _compile_tranches(path: str):
+    def check(value, forecast_length):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(
+                f"Parameter '{path}' must be a list of tranches, got {value!r}"
+            )
+        for i, tranche in enumerate(value):
+            tranche_path = f"{path}[{i}]"
+            if not isinstance(tranche, Mapping):
+                raise ValueError(
+                    f"Parameter '{tranche_path}' must be a dict, got {tranche!r}"
+                )
+            tranche_type = tranche.get("type")
+            if tranche_type not in VESTING_TRANCHE_FIELDS:
+                raise ValueError(
+                    f"Parameter '{tranche_path}.type' must be one of "
+                    f"{VESTING_TRANCHE_TYPES}, got {tranche_type!r}"
+                )
+            for key in VESTING_TRANCHE_FIELDS[tranche_type]:
+                if tranche.get(key) is None:
+                    raise ValueError(
+                        f"Parameter '{tranche_path}.{key}' is required for "
+                        f"'{tranche_type}' tranches"
+                    )
+            for key, field_value in tranche.items():
+                if key == "type":
+                    continue
+                if key not in VESTING_TRANCHE_SCHEMA:
+                    raise ValueError(f"Unknown parameter '{tranche_path}.{key}'")
+                field_checker = _compile_field(
+                    VESTING_TRANCHE_SCHEMA[key], f"{tranche_path}.{key}"
+                )
+                field_checker(field_value, forecast_length)
+
+    return check
+
+
+_COMPILED_FUND_SPEC_SCHEMA = {}
+_COMPILED_PARAMS_SCHEMA = {
+    key: _compile_field(spec, key) for key, spec in PARAMS_SCHEMA.items()
+}
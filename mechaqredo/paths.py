@@ -0,0 +1,124 @@
+import numpy as np
+from functools import lru_cache
+
+SHOCK_METHODS = ["iid", "antithetic", "sobol"]
+
+
+def standard_normal_shocks(n_paths: int, n_steps: int, method: str = "iid") -> np.array:
+    """
+    Draws an (n_paths, n_steps) array of standard normal shocks.
+
+    method: 'iid' for plain pseudo-random draws, 'antithetic' for pairs of
+        mirrored paths, where row 2k + 1 is the negative of row 2k, or 'sobol'
+        for scrambled Sobol points mapped to increments by a Brownian bridge
+        (requires scipy). Sobol batches are best drawn in powers of 2.
+    """
+    if method == "iid":
+        return np.random.standard_normal((n_paths, n_steps))
+    elif method == "antithetic":
+        half = np.random.standard_normal(((n_paths + 1) // 2, n_steps))
+        shocks = np.stack([half, -half], axis=1).reshape(-1, n_steps)
+        return shocks[:n_paths]
+    elif method == "sobol":
+        return sobol_bridge_shocks(n_paths, n_steps)
+    else:
+        raise ValueError(f"Invalid shock method. Expected one of: {SHOCK_METHODS}")
+
+
+def sobol_bridge_shocks(n_paths: int, n_steps: int) -> np.array:
+    """
+    Draws standard normal increments from scrambled Sobol points, using a
+    Brownian bridge so that the first (best distributed) Sobol coordinates set
+    the coarse shape of each path. The scrambling seed is drawn from
+    np.random, so np.random.seed keeps the shocks reproducible.
+    """
+    try:
+        from scipy.stats import qmc
+        from scipy.special import ndtri
+    except ImportError as e:
+        raise ImportError("The 'sobol' shock method requires scipy") from e
+    sampler = qmc.Sobol(d=n_steps, scramble=True, seed=np.random.randint(2**32))
+    u = sampler.random(n_paths)
+    return brownian_bridge_increments(ndtri(u))
+
+
+def brownian_bridge_increments(z: np.array) -> np.array:
+    """
+    Maps an (n_paths, n_steps) array of independent standard normals to the unit
+    step increments of Brownian paths built by recursive bisection: column 0
+    sets the terminal value, the next columns the successive midpoints.
+    """
+    n_paths, n_steps = z.shape
+    W = np.zeros((n_paths, n_steps + 1))
+    W[:, n_steps] = np.sqrt(n_steps) * z[:, 0]
+    for k, (mid, left, right, w_left, w_right, sd) in enumerate(
+        _brownian_bridge_schedule(n_steps), start=1
+    ):
+        W[:, mid] = w_left * W[:, left] + w_right * W[:, right] + sd * z[:, k]
+    return np.diff(W, axis=1)
+
+
+@lru_cache(maxsize=None)
+def _brownian_bridge_schedule(n_steps: int) -> list:
+    # Breadth-first bisection of [0, n_steps]: (point, left, right, weights, sd)
+    schedule = []
+    interval_list = [(0, n_steps)]
+    while interval_list:
+        left, right = interval_list.pop(0)
+        if right - left > 1:
+            mid = (left + right) // 2
+            w_left = (right - mid) / (right - left)
+            w_right = (mid - left) / (right - left)
+            sd = np.sqrt((mid - left) * (right - mid) / (right - left))
+            schedule.append((mid, left, right, w_left, w_right, sd))
+            interval_list += [(left, mid), (mid, right)]
+    return schedule
+
+
+def pair_average(values: np.array, method: str = "iid") -> np.array:
+    """
+    Averages the antithetic pairs of per-path values along the first axis, so
+    that the returned values are independent Monte Carlo replicates.
+    """
+    if method == "antithetic":
+        n_pairs = len(values) // 2
+        return values[: 2 * n_pairs].reshape((n_pairs, 2) + values.shape[1:]).mean(1)
+    return values
+
+
+def gbm_paths(
+    S0: float, drift: float, sigma: float, dt: float, shocks: np.array
+) -> np.array:
+    """
+    Builds Geometric Brownian Motion paths from an (n_paths, n_steps) array of
+    standard normal shocks. Returns an (n_paths, n_steps + 1) array starting at S0.
+    """
+    log_increments = (drift - 0.5 * sigma**2.0) * dt + dt**0.5 * sigma * shocks
+    log_paths = np.zeros((shocks.shape[0], shocks.shape[1] + 1))
+    np.cumsum(log_increments, axis=1, out=log_paths[:, 1:])
+    return S0 * np.exp(log_paths)
+
+
+def gbm_mean(S0: float, drift: float, n_steps: int, dt: float) -> np.array:
+    """
+    Returns the known expected value of a GBM path at steps 0, ..., n_steps.
+    """
+    return S0 * np.exp(drift * dt * np.arange(n_steps + 1))
+
+
+def ou_paths(
+    x0: float, mean: float, theta: float, sigma: float, dt: float, shocks: np.array
+) -> np.array:
+    """
+    Builds Ornstein-Uhlenbeck paths (Euler scheme) from an (n_paths, n_steps)
+    array of standard normal shocks. Returns an (n_paths, n_steps + 1) array
+    starting at x0.
+    """
+    n_paths, n_steps = shocks.shape
+    paths = np.empty((n_paths, n_steps + 1))
+    paths[:, 0] = x0
+    vol = sigma * dt**0.5
+    for i in range(n_steps):
+        x = paths[:, i]
+        paths[:, i + 1] = x + dt * (theta * (mean - x)) + vol * shocks[:, i]
+    return paths
@@ -10,7 +10,8 @@ Created on Wed Jun  7 21:35:56 2023
 """
 
 import numpy as np
-import yfinance as yf
+from datetime import datetime, timedelta
+from .paths import standard_normal_shocks, gbm_paths
 
 class Price:
     def __init__(self, model: str, P0: float, drift: float = None, sigma: float = None, dt: float = 1/365):
@@ -55,6 +56,22 @@ class Price:
         """
         return self.price_list[-1]
 
+    def simulate_paths(self, forecast_length: int, n_paths: int, shock_method: str = 'iid'):
+        """
+        Simulate a batch of price paths of forecast_length values starting at
+        the current price, without updating the price list.
+
+        forecast_length: The number of values per path (including the current price).
+        n_paths: The number of paths.
+        shock_method: How the normal shocks are drawn (see paths.standard_normal_shocks).
+        """
+        p0 = self.price_list[-1]
+        if self.model == 'constant':
+            return np.full((n_paths, forecast_length), p0, dtype=float)
+        elif self.model == 'gbm':
+            shocks = standard_normal_shocks(n_paths, forecast_length - 1, shock_method)
+            return gbm_paths(p0, self.drift, self.sigma, self.dt, shocks)
+
     
 
 def download_data(ticker, period):
@@ -64,6 +81,8 @@ def download_data(ticker, period):
     :param period: The number of days in the past to download data for
     :return: Returns a Pandas Series of the 'Close' price data
     '''
+    # yfinance is only needed (and slow to import) when downloading data
+    import yfinance as yf
     end = datetime.today().strftime('%Y-%m-%d')
     start = (datetime.today() - timedelta(days=period)).strftime('%Y-%m-%d')
     data = yf.download(ticker, start, end)
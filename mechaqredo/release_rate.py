@@ -0,0 +1,115 @@
+import numpy as np
+
+RELEASE_RATE_MODELS = ["power", "grid", "function"]
+# Release rate model of the params dicts without one
+DEFAULT_RELEASE_RATE_MODEL = {
+    "model": "power",
+    "fun": None,
+    "tvl_grid": None,
+    "n_val_grid": None,
+    "rate_grid": None,
+}
+
+
+def release_rate_curve(params_dict: dict):
+    """
+    Returns the daily release rate curve of the ecosystem fund set by the
+    release_rate_model params (DEFAULT_RELEASE_RATE_MODEL if there are none),
+    as a function rate(tvl, n_val) of the staking TVL (in tokens) and of the
+    number of validators. The parameters are read once, and the curve works
+    on scalars as well as on whole batch arrays.
+
+    'power': The default curve `power_release_rate`, set by the release_rate_a,
+        release_rate_b, release_rate_max, max_TVL and max_validators params.
+    'grid': A bilinear interpolation of the rates tabulated on a (TVL,
+        validators) grid (see `grid_release_rate` and `tabulate_release_rate`).
+    'function': Any vectorized function fun(tvl, n_val).
+    """
+    model_dict = params_dict.get("release_rate_model", DEFAULT_RELEASE_RATE_MODEL)
+    model = model_dict["model"]
+    if model == "power":
+        return power_release_rate(
+            params_dict["release_rate_a"],
+            params_dict["release_rate_b"],
+            params_dict["release_rate_max"],
+            params_dict["max_TVL"],
+            params_dict["max_validators"],
+        )
+    elif model == "grid":
+        return grid_release_rate(
+            model_dict["tvl_grid"], model_dict["n_val_grid"], model_dict["rate_grid"]
+        )
+    elif model == "function":
+        return model_dict["fun"]
+    else:
+        raise ValueError(f"Invalid model. Expected one of: {RELEASE_RATE_MODELS}")
+
+
+def power_release_rate(
+    a: float, b: float, max_rate: float, max_TVL: float, max_validators: float
+):
+    """
+    Returns the curve max_rate * (b * min(1, TVL / max_TVL)**a + (1 - b) *
+    min(1, n_val / max_validators)**a), where the TVL is counted in units of
+    2 million tokens.
+    """
+
+    def release_rate(tvl, n_val):
+        tvl_millions = tvl / 2e6
+        T_factor = np.minimum(1, tvl_millions / max_TVL) ** a
+        V_factor = np.minimum(1, n_val / max_validators) ** a
+        return max_rate * (b * T_factor + (1 - b) * V_factor)
+
+    return release_rate
+
+
+def grid_release_rate(tvl_grid: np.array, n_val_grid: np.array, rate_grid: np.array):
+    """
+    Returns the curve interpolating bilinearly the rates rate_grid[i, j]
+    tabulated at (tvl_grid[i], n_val_grid[j]). The grids must be increasing,
+    and the inputs outside of them are clipped to their edges.
+    """
+    tvl_grid = np.asarray(tvl_grid, dtype=float)
+    n_val_grid = np.asarray(n_val_grid, dtype=float)
+    rate_grid = np.asarray(rate_grid, dtype=float)
+    for name, grid in [("tvl_grid", tvl_grid), ("n_val_grid", n_val_grid)]:
+        if grid.ndim != 1 or len(grid) < 2 or np.any(np.diff(grid) <= 0):
+            raise ValueError(f"The {name} must be increasing, with 2 values or more")
+    if rate_grid.shape != (len(tvl_grid), len(n_val_grid)):
+        raise ValueError(
+            f"The rate_grid must have shape {(len(tvl_grid), len(n_val_grid))}, "
+            f"got {rate_grid.shape}"
+        )
+
+    def release_rate(tvl, n_val):
+        i, s = _grid_position(tvl_grid, tvl)
+        j, t = _grid_position(n_val_grid, n_val)
+        return (1 - s) * ((1 - t) * rate_grid[i, j] + t * rate_grid[i, j + 1]) + s * (
+            (1 - t) * rate_grid[i + 1, j] + t * rate_grid[i + 1, j + 1]
+        )
+
+    return release_rate
+
+
+def tabulate_release_rate(curve, tvl_grid: np.array, n_val_grid: np.array) -> np.array:
+    """
+    Evaluates a curve rate(tvl, n_val) on a grid at once and returns the
+    (len(tvl_grid), len(n_val_grid)) rate_grid of the 'grid' model.
+    """
+    tvl_grid = np.asarray(tvl_grid, dtype=float)
+    n_val_grid = np.asarray(n_val_grid, dtype=float)
+    return np.broadcast_to(
+        curve(tvl_grid[:, None], n_val_grid[None, :]),
+        (len(tvl_grid), len(n_val_grid)),
+    ).copy()
+
+
+def release_rate_function(tvl: float, n_val: int, params_dict: dict) -> float:
+    return release_rate_curve(params_dict)(tvl, n_val)
+
+
+def _grid_position(grid: np.array, x) -> tuple:
+    # Returns the grid cell of x and its relative position inside the cell
+    x = np.clip(x, grid[0], grid[-1])
+    i = np.clip(np.searchsorted(grid, x, side="right") - 1, 0, len(grid) - 2)
+    return i, (x - grid[i]) / (grid[i + 1] - grid[i])
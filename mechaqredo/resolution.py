@@ -0,0 +1,76 @@
+import datetime as dt
+import numpy as np
+
+RESOLUTIONS = ["daily", "weekly", "monthly", "quarterly"]
+# Number of periods per year, for the year on year inflation
+PERIODS_PER_YEAR = {"daily": 365, "weekly": 52, "monthly": 12, "quarterly": 4}
+# Daily flows, summed over every period (the other columns are stocks, read on
+# the last day of every period)
+FLOW_COLUMNS = [
+    "day_burned",
+    "day_vested",
+    "day_locked",
+    "day_released",
+    "staking_rewards_vested",
+    "staking_rewards_ecosystem",
+    "total_staking_rewards",
+    "validators_rewards",
+    "day_burn_fees",
+    "day_service_fee_locked",
+    "n_txs",
+    "service_fees",
+]
+
+
+def period_starts(
+    forecast_length: int, resolution: str, sim_start: dt.datetime = None
+) -> np.array:
+    """
+    Returns the first day of every period of the horizon at the given
+    resolution. Weeks count from the simulation start, while months and
+    quarters follow the calendar from sim_start, so the first and last ones
+    can be partial.
+    """
+    days = np.arange(forecast_length)
+    if resolution == "daily":
+        return days
+    elif resolution == "weekly":
+        period_vec = days // 7
+    elif resolution in ["monthly", "quarterly"]:
+        if sim_start is None:
+            raise ValueError(f"The {resolution} resolution needs the start date")
+        dates = np.datetime64(sim_start.date()) + days
+        period_vec = dates.astype("datetime64[M]").astype(int)
+        if resolution == "quarterly":
+            period_vec = period_vec // 3
+    else:
+        raise ValueError(f"Invalid resolution. Expected one of: {RESOLUTIONS}")
+    return np.flatnonzero(np.r_[True, period_vec[1:] != period_vec[:-1]])
+
+
+def aggregate_outputs(
+    output_dict: dict, resolution: str, sim_start: dt.datetime = None
+) -> dict:
+    """
+    Aggregates daily outputs, vectors or (n_samples, forecast_length) arrays,
+    to the given resolution: the FLOW_COLUMNS are summed over every period and
+    the other columns (circ_supply, staking_tvl, ecosystem_fund, market_cap,
+    token_price, n_validators and the iteration) are read on its last day.
+    The column names are kept, so the day_ columns hold period totals.
+    """
+    if resolution == "daily" or len(output_dict) == 0:
+        return output_dict
+    forecast_length = np.shape(next(iter(output_dict.values())))[-1]
+    starts = period_starts(forecast_length, resolution, sim_start)
+    ends = np.r_[starts[1:], forecast_length] - 1
+    aggregated_dict = {}
+    for key, values in output_dict.items():
+        values = np.asarray(values)
+        if key in FLOW_COLUMNS:
+            # Summed in float64 whatever the storage type
+            aggregated_dict[key] = np.add.reduceat(
+                values, starts, axis=-1, dtype=np.float64
+            ).astype(values.dtype)
+        else:
+            aggregated_dict[key] = values[..., ends]
+    return aggregated_dict
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import math
+import numpy as np
+from multiprocessing import Pool, cpu_count
+from typing import List, TYPE_CHECKING
+
+from .params import validate_params_dict
+from .data_models import (
+    forecast_daily_trx_counts_batch,
+    forecast_num_validators_batch,
+    forecast_service_fees_batch,
+    forecast_token_price_batch,
+)
+from .generate_scenarios import (
+    SCENARIOS,
+    VALIDATOR_JOINING_RATES,
+    generate_arrival_rate_scenario,
+    generate_n_trx_scenario,
+    generate_price_scenario,
+    generate_service_fees_scenario,
+)
+from .supply import forecast_supply_stats_batch
+from .sim import build_output_arrays_batch
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _service_fees_scenario(params_dict, scenario, forecast_length):
+    return generate_service_fees_scenario(params_dict, scenario, forecast_length)
+
+
+def _price_scenario(params_dict, scenario, forecast_length):
+    return generate_price_scenario(params_dict, scenario)
+
+
+def _arrival_rate_scenario(params_dict, scenario, forecast_length):
+    return generate_arrival_rate_scenario(params_dict, scenario)
+
+
+def _n_trx_scenario(params_dict, scenario, forecast_length):
+    return generate_n_trx_scenario(params_dict, scenario)
+
+
+def _num_validators_batch(n_samples, forecast_length, params_dict, shock_method):
+    return forecast_num_validators_batch(n_samples, forecast_length, params_dict)
+
+
+def _daily_trx_counts_batch(n_samples, forecast_length, params_dict, shock_method):
+    return forecast_daily_trx_counts_batch(n_samples, forecast_length, params_dict)
+
+
+# Scenario components of `generate_full_scenario`:
+# {component: (data key, scenario function, batched path generator)}
+SCENARIO_COMPONENTS = {
+    "service_fee_model": (
+        "service_fees",
+        _service_fees_scenario,
+        forecast_service_fees_batch,
+    ),
+    "price_model": ("token_price", _price_scenario, forecast_token_price_batch),
+    "n_validators": ("n_validators", _arrival_rate_scenario, _num_validators_batch),
+    "n_trx": ("n_txs", _n_trx_scenario, _daily_trx_counts_batch),
+}
+
+# Per-worker copy of the shared component paths, set once by the pool initializer
+_WORKER_STATE = {}
+
+
+def default_scenario_lists() -> dict:
+    """
+    Returns every scenario of every component: all of SCENARIOS, except for the
+    validators arrivals, which only define the VALIDATOR_JOINING_RATES scenarios.
+    """
+    return {
+        "service_fee_model": list(SCENARIOS),
+        "price_model": list(SCENARIOS),
+        "n_validators": list(VALIDATOR_JOINING_RATES),
+        "n_trx": list(SCENARIOS),
+    }
+
+
+def generate_component_paths(
+    forecast_length: int,
+    params_dict: dict,
+    scenario_lists_dict: dict,
+    n_samples: int = 1,
+    shock_method: str = "iid",
+) -> dict:
+    """
+    Generates the data paths of every component scenario once.
+
+    Returns {component: array of shape (n_scenarios, n_samples, forecast_length)},
+    following the order of the scenario lists.
+    """
+    component_paths_dict = {}
+    for component, scenario_list in scenario_lists_dict.items():
+        _, scenario_function, path_function = SCENARIO_COMPONENTS[component]
+        component_paths_dict[component] = np.stack(
+            [
+                path_function(
+                    n_samples,
+                    forecast_length,
+                    scenario_function(params_dict, scenario, forecast_length),
+                    shock_method,
+                ).astype(float)
+                for scenario in scenario_list
+            ]
+        )
+    return component_paths_dict
+
+
+def run_scenario_matrix(
+    forecast_length: int,
+    input_params_dict: dict,
+    scenario_lists_dict: dict = None,
+    n_samples: int = 1,
+    seed: int = None,
+    shock_method: str = "iid",
+    columns: List[str] = None,
+    batch_size: int = 256,
+    processes: int = None,
+) -> pd.DataFrame:
+    """
+    Runs every combination of component scenarios of `generate_full_scenario`.
+
+    The paths of each component (service fees, token price, validators and
+    transactions) are generated once per component scenario and sample, and
+    then combined over the Cartesian product of the scenario lists, so
+    combination sample k always uses the k-th path of each of its components.
+    The combinations are run in batches of `batch_size` samples through the
+    batched supply engine, spread over a pool of workers.
+
+    forecast_length: The number of simulated days.
+    input_params_dict: The parameters shared by all the combinations.
+    scenario_lists_dict: {component: list of scenarios} (defaults to
+        `default_scenario_lists`).
+    n_samples: The number of data paths per component scenario.
+    seed: The seed of the component paths (the results do not depend on the
+        number of workers).
+    shock_method: How the price and service fee shocks are drawn (see
+        paths.standard_normal_shocks).
+    columns: The output columns to keep (defaults to all of them).
+    batch_size: The number of combination samples per engine batch.
+    processes: The number of workers (1 runs everything in-process).
+
+    Returns a dataframe with one row per combination, sample and day, holding
+    the "<component>_scenario" columns, "sample" and the output columns.
+    """
+    import pandas as pd
+
+    params_dict = validate_params_dict(forecast_length, input_params_dict)
+    if scenario_lists_dict is None:
+        scenario_lists_dict = default_scenario_lists()
+    unknown_list = [
+        key for key in scenario_lists_dict if key not in SCENARIO_COMPONENTS
+    ]
+    if len(unknown_list) > 0:
+        raise ValueError(
+            f"Invalid scenario components {unknown_list}. "
+            f"Expected any of: {list(SCENARIO_COMPONENTS)}"
+        )
+    # Components left out keep the paths of the input parameters
+    scenario_lists_dict = {
+        component: list(scenario_lists_dict.get(component, [None]))
+        for component in SCENARIO_COMPONENTS
+    }
+    if seed is not None:
+        np.random.seed(seed)
+    component_paths_dict = {}
+    for component, scenario_list in scenario_lists_dict.items():
+        if scenario_list == [None]:
+            _, _, path_function = SCENARIO_COMPONENTS[component]
+            paths = path_function(n_samples, forecast_length, params_dict, shock_method)
+            component_paths_dict[component] = paths.astype(float)[None]
+        else:
+            component_paths_dict.update(
+                generate_component_paths(
+                    forecast_length,
+                    params_dict,
+                    {component: scenario_list},
+                    n_samples,
+                    shock_method,
+                )
+            )
+    # Index every (combination, sample) run by its scenario indices
+    shape = tuple(len(scenario_list) for scenario_list in scenario_lists_dict.values())
+    n_combinations = math.prod(shape)
+    n_runs = n_combinations * n_samples
+    task_list = [
+        (start, min(start + batch_size, n_runs))
+        for start in range(0, n_runs, batch_size)
+    ]
+    init_args = (forecast_length, params_dict, component_paths_dict, n_samples, columns)
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(task_list))
+    if processes <= 1:
+        _init_worker(*init_args)
+        output_list = list(map(_run_task, task_list))
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            output_list = list(pool.imap(_run_task, task_list))
+    # Build the long output dataframe
+    run_vec = np.arange(n_runs)
+    scenario_index_tuple = np.unravel_index(run_vec // n_samples, shape)
+    df_dict = {}
+    for (component, scenario_list), scenario_vec in zip(
+        scenario_lists_dict.items(), scenario_index_tuple
+    ):
+        if scenario_list == [None]:
+            continue
+        df_dict[f"{component}_scenario"] = pd.Categorical.from_codes(
+            np.repeat(scenario_vec, forecast_length), scenario_list
+        )
+    df_dict["sample"] = np.repeat(run_vec % n_samples, forecast_length)
+    for col in output_list[0]:
+        df_dict[col] = np.concatenate(
+            [output_dict[col] for output_dict in output_list]
+        ).ravel()
+    return pd.DataFrame(df_dict)
+
+
+def _init_worker(
+    forecast_length: int,
+    params_dict: dict,
+    component_paths_dict: dict,
+    n_samples: int,
+    columns: List[str],
+):
+    _WORKER_STATE["forecast_length"] = forecast_length
+    _WORKER_STATE["params_dict"] = params_dict
+    _WORKER_STATE["component_paths_dict"] = component_paths_dict
+    _WORKER_STATE["n_samples"] = n_samples
+    _WORKER_STATE["columns"] = columns
+
+
+def _run_task(task: tuple) -> dict:
+    start, stop = task
+    forecast_length = _WORKER_STATE["forecast_length"]
+    component_paths_dict = _WORKER_STATE["component_paths_dict"]
+    n_samples = _WORKER_STATE["n_samples"]
+    # Gather the component paths of the runs of this batch
+    run_vec = np.arange(start, stop)
+    sample_vec = run_vec % n_samples
+    combination_vec = run_vec // n_samples
+    shape = [paths.shape[0] for paths in component_paths_dict.values()]
+    scenario_index_tuple = np.unravel_index(combination_vec, shape)
+    batch_data_dict = {}
+    for (component, paths), scenario_vec in zip(
+        component_paths_dict.items(), scenario_index_tuple
+    ):
+        data_key = SCENARIO_COMPONENTS[component][0]
+        batch_data_dict[data_key] = paths[scenario_vec, sample_vec]
+    supply_data_dict = forecast_supply_stats_batch(
+        forecast_length, _WORKER_STATE["params_dict"], batch_data_dict
+    )
+    output_dict = build_output_arrays_batch(batch_data_dict, supply_data_dict)
+    columns = _WORKER_STATE["columns"]
+    if columns is None:
+        columns = list(output_dict)
+    return {col: np.ascontiguousarray(output_dict[col]) for col in columns}
@@ -0,0 +1,134 @@
+import math
+import numpy as np
+from multiprocessing import Pool, cpu_count
+from typing import List
+
+from .sim import get_single_derivative, run_single_sim
+from .params import validate_params_dict, update_params
+from .cache import ResultCache, default_cache
+
+# Per-worker copy of the shared simulation inputs, set once by the pool initializer
+_WORKER_STATE = {}
+
+
+def run_sensitivity_grid(
+    forecast_length: int,
+    input_params_dict: dict,
+    param_grids_dict: dict,
+    N: int = 20,
+    h: float = None,
+    derivative: bool = True,
+    columns: List[str] = None,
+    processes: int = None,
+    chunksize: int = None,
+    cache: ResultCache = None,
+) -> dict:
+    """
+    Estimates the sensitivities (or the marginalised outputs) over a grid of
+    values for every parameter, using a single pool of workers.
+
+    Every (parameter, grid value, seed) triple is an independent task and all
+    of them are submitted to the same pool at once, so workers never idle
+    between parameters. The scenario parameters are built once by the caller
+    and sent to each worker only once, through the pool initializer.
+
+    forecast_length: The number of simulated days.
+    input_params_dict: The (scenario) parameters shared by all the tasks.
+    param_grids_dict: {parameter: list of grid values}.
+    N: The number of Monte Carlo seeds per grid value.
+    h: The finite difference step (defaults to 1% of the grid value).
+    derivative: If False, estimates the mean output instead of its derivative.
+    columns: The output columns to keep (defaults to all of them).
+    processes: The number of workers (1 runs everything in-process).
+    chunksize: The number of tasks per worker dispatch (defaults to a balanced
+        value giving each worker about four chunks).
+    cache: The cache of grid results (defaults to the configured default cache).
+
+    Returns {parameter: {column: array of shape (n_grid_values, forecast_length)}}.
+    """
+    if cache is None:
+        cache = default_cache()
+    if cache is not None:
+        cache_key = cache.make_key(
+            kind="sensitivity_grid",
+            forecast_length=forecast_length,
+            params=validate_params_dict(forecast_length, input_params_dict),
+            param_grids=param_grids_dict,
+            seeds=(0, N - 1),
+            h=h,
+            derivative=derivative,
+            columns=columns,
+        )
+        estimate_dict = cache.get(cache_key)
+        if estimate_dict is not None:
+            return estimate_dict
+    task_list = [
+        (param, i, value, seed)
+        for param, grid in param_grids_dict.items()
+        for i, value in enumerate(grid)
+        for seed in range(N)
+    ]
+    init_args = (forecast_length, input_params_dict, h, derivative, columns)
+    if processes is None:
+        processes = cpu_count()
+    if processes == 1:
+        _init_worker(*init_args)
+        result_iter = map(_run_task, task_list)
+        estimate_dict = _accumulate(result_iter, param_grids_dict, N, forecast_length)
+    else:
+        if chunksize is None:
+            chunksize = max(1, math.ceil(len(task_list) / (4 * processes)))
+        with Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            result_iter = pool.imap_unordered(_run_task, task_list, chunksize)
+            estimate_dict = _accumulate(
+                result_iter, param_grids_dict, N, forecast_length
+            )
+    if cache is not None:
+        cache.put(cache_key, estimate_dict)
+    return estimate_dict
+
+
+def _init_worker(
+    forecast_length: int,
+    params_dict: dict,
+    h: float,
+    derivative: bool,
+    columns: List[str],
+):
+    _WORKER_STATE["forecast_length"] = forecast_length
+    _WORKER_STATE["params_dict"] = params_dict
+    _WORKER_STATE["h"] = h
+    _WORKER_STATE["derivative"] = derivative
+    _WORKER_STATE["columns"] = columns
+
+
+def _run_task(task: tuple) -> tuple:
+    param, i, value, seed = task
+    forecast_length = _WORKER_STATE["forecast_length"]
+    params_dict = update_params(_WORKER_STATE["params_dict"], {param: value})
+    if _WORKER_STATE["derivative"]:
+        df = get_single_derivative(
+            forecast_length, param, params_dict, seed, _WORKER_STATE["h"]
+        )
+    else:
+        np.random.seed(seed)
+        df = run_single_sim(forecast_length, params_dict)
+    columns = _WORKER_STATE["columns"]
+    if columns is None:
+        columns = list(df.columns)
+    return param, i, {col: df[col].values for col in columns}
+
+
+def _accumulate(
+    result_iter, param_grids_dict: dict, N: int, forecast_length: int
+) -> dict:
+    # Sum the task results as they arrive, then average over the seeds
+    estimate_dict = {param: {} for param in param_grids_dict}
+    for param, i, output_dict in result_iter:
+        param_estimate_dict = estimate_dict[param]
+        for col, values in output_dict.items():
+            if col not in param_estimate_dict:
+                n_grid = len(param_grids_dict[param])
+                param_estimate_dict[col] = np.zeros((n_grid, forecast_length))
+            param_estimate_dict[col][i] += values / N
+    return estimate_dict
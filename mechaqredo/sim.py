@@ -1,12 +1,34 @@
+from __future__ import annotations
+
 import os
 import itertools
-import pandas as pd
-from typing import List
-from tqdm import tqdm
+from typing import List, TYPE_CHECKING
 import numpy as np
-from .params import validate_params_dict, default_params_dict
-from .data_models import build_model_data_dict, build_model_data_dict_samples
-from .supply import forecast_supply_stats
+from .params import (
+    validate_params_dict,
+    default_params_dict,
+    update_params,
+    param_bounds,
+)
+from .data_models import (
+    DATA_MODEL_BUILDERS,
+    build_model_data_dict,
+    build_model_data_dict_samples,
+    build_model_data_dict_chunk,
+    init_data_state_batch,
+)
+from .supply import (
+    SUPPLY_OUTPUT_COLUMNS,
+    forecast_supply_stats,
+    forecast_supply_stats_chunked,
+)
+from .cache import ResultCache, default_cache
+from .resolution import aggregate_outputs, PERIODS_PER_YEAR
+from .output_schema import OutputSchema, as_output_schema
+from .memory import memory_stage
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def run_param_sweep_sim(
@@ -18,36 +40,92 @@ def run_param_sweep_sim(
     output_dir: str = "data",
     save: bool = False,
     file_name: str = None,
+    shock_method: str = None,
+    seed: int = None,
+    cache: ResultCache = None,
+    resolution: str = "daily",
+    output_schema: OutputSchema = None,
 ) -> pd.DataFrame:
+    import pandas as pd
+    from tqdm import tqdm
+
     # Validate input parameters
     params_dict = validate_params_dict(forecast_length, input_params_dict)
-    # Generate/Load list of data dicts
-    if data_dict_list is None:
-        data_dict_list = build_model_data_dict_samples(
-            data_dict_n_samples, forecast_length, params_dict
+    output_schema = as_output_schema(output_schema)
+    # Look up the sweep in the cache (only reproducible sweeps are cached)
+    if cache is None:
+        cache = default_cache()
+    cache_key = None
+    if cache is not None and not save and (seed is not None or data_dict_list):
+        cache_key = cache.make_key(
+            kind="param_sweep",
+            forecast_length=forecast_length,
+            params=params_dict,
+            param_ranges=param_ranges_dict,
+            data_dict_n_samples=data_dict_n_samples,
+            data_dict_list=data_dict_list,
+            shock_method=shock_method,
+            seed=seed,
+            resolution=resolution,
+            output_schema=output_schema.to_dict(),
         )
+        sweep_df = cache.get(cache_key)
+        if sweep_df is not None:
+            return sweep_df
+    # Generate/Load list of data dicts
+    if seed is not None:
+        np.random.seed(seed)
+    with memory_stage("data_paths"):
+        if data_dict_list is None:
+            data_dict_list = build_model_data_dict_samples(
+                data_dict_n_samples, forecast_length, params_dict, shock_method
+            )
+        # Aggregate the data paths to the output resolution once
+        sim_start = params_dict["sim_start_datetime"]
+        output_data_dict_list = [
+            aggregate_outputs(data_dict, resolution, sim_start)
+            for data_dict in data_dict_list
+        ]
     # Initialize sweep DataFrame
     sweep_df_list = []
     iter_tuple_list = list(itertools.product(*param_ranges_dict.values()))
     key_list = param_ranges_dict.keys()
     for iter_tuple in tqdm(iter_tuple_list):
         # Build input parameters for sweep iteration
-        iter_input_params_dict = input_params_dict.copy()
-        for i, key in enumerate(key_list):
-            iter_input_params_dict[key] = iter_tuple[i]
-        # Validate input parameters
-        iter_params_dict = validate_params_dict(forecast_length, iter_input_params_dict)
+        iter_input_params_dict = update_params(
+            input_params_dict, dict(zip(key_list, iter_tuple))
+        )
+        # Validate the swept parameters only (the rest were validated above)
+        iter_params_dict = validate_params_dict(
+            forecast_length, iter_input_params_dict, changed_keys=key_list
+        )
         # For each data dict:
         ii = 0
-        for data_dict in data_dict_list:
+        for data_dict, output_data_dict in zip(data_dict_list, output_data_dict_list):
             # Forecast supply stats
-            supply_data_dict = forecast_supply_stats(
-                forecast_length, iter_params_dict, data_dict
-            )
-            # Build output dataframe
-            iter_df = build_output_dataframe(data_dict, supply_data_dict)
-            for i, key in enumerate(key_list):
-                iter_df[key] = iter_tuple[i]
+            with memory_stage("simulate"):
+                supply_data_dict = forecast_supply_stats(
+                    forecast_length, iter_params_dict, data_dict
+                )
+            # Build output dataframe (kept in sweep_df_list until the concat)
+            with memory_stage("dataframe"):
+                supply_data_dict = aggregate_outputs(
+                    supply_data_dict, resolution, sim_start
+                )
+                iter_df = output_schema.apply(
+                    build_output_dataframe(
+                        output_data_dict, supply_data_dict, resolution
+                    )
+                )
+                for i, key in enumerate(key_list):
+                    value = iter_tuple[i]
+                    if np.ndim(value) > 0:
+                        # Sequences (e.g. vesting_tranches) fill an object column
+                        value = pd.Series(
+                            [value] * len(iter_df), index=iter_df.index, dtype=object
+                        )
+                    iter_df[key] = value
+                del supply_data_dict
             # Append iter df to sweep df list
             sweep_df_list.append(iter_df)
             # Save item_df to a file
@@ -56,7 +134,11 @@ def run_param_sweep_sim(
                 item_df_filepath = os.path.join(output_dir, item_df_filename)
                 iter_df.to_csv(item_df_filepath, index=False)
             ii += 1
-    sweep_df = pd.concat(sweep_df_list, ignore_index=True)
+    with memory_stage("concat"):
+        sweep_df = pd.concat(sweep_df_list, ignore_index=True)
+    if cache_key is not None:
+        with memory_stage("cache"):
+            cache.put(cache_key, sweep_df)
     return sweep_df
 
 
@@ -67,14 +149,23 @@ def get_single_derivative(
     seed: int,
     h: float = None,
 ) -> pd.DataFrame:
-    """gets an evaluation of a derivative using finite differences"""
-    params_dict = input_params_dict.copy()
+    """gets an evaluation of a derivative using finite differences
+
+    The difference is taken backwards when a forward step would leave the
+    valid range of the parameter.
+    """
+    params_dict = input_params_dict
     if h is None:
         h = params_dict[with_respect_to] * 0.01
+    _, max_value = param_bounds(with_respect_to)
+    if max_value is not None and params_dict[with_respect_to] + h > max_value:
+        h = -h
     np.random.seed(seed)
     df0 = run_single_sim(forecast_length, params_dict)
     np.random.seed(seed)
-    params_dict[with_respect_to] += h
+    params_dict = update_params(
+        params_dict, {with_respect_to: params_dict[with_respect_to] + h}
+    )
     df1 = run_single_sim(forecast_length, params_dict)
     single_derivative = (df1 - df0) / h
     return single_derivative
@@ -86,38 +177,200 @@ def estimate_sensitivity(
     input_params_dict: dict,
     h: float = None,
     N=100,
+    tol: float = None,
+    metric: str = "circ_supply",
+    batch_size: int = 10,
+    cache: ResultCache = None,
 ) -> pd.DataFrame:
-    """computes the monte carlo estimate of the sensitivity"""
-    d = get_single_derivative(forecast_length, with_respect_to, input_params_dict, 0, h)
-    print(f"Estimating sensitivity wrt {with_respect_to}")
-    for i in range(1, N + 1):
-        d += get_single_derivative(
+    """computes the monte carlo estimate of the sensitivity
+
+    If tol is given, seeds are added in batches of batch_size until the standard
+    error of the sensitivity of `metric` on the last day falls below tol, with N
+    as the maximum number of seeds.
+    Results are read from and written to `cache` (or the default cache, if one
+    is configured).
+    """
+    if cache is None:
+        cache = default_cache()
+    if cache is not None:
+        cache_key = cache.make_key(
+            kind="sensitivity",
+            forecast_length=forecast_length,
+            params=validate_params_dict(forecast_length, input_params_dict),
+            with_respect_to=with_respect_to,
+            h=h,
+            N=N,
+            seeds=(0, N) if tol is None else (0, N - 1),
+            tol=tol,
+            metric=metric if tol is not None else None,
+            batch_size=batch_size if tol is not None else None,
+        )
+        d = cache.get(cache_key)
+        if d is not None:
+            return d
+    if tol is not None:
+        d = _estimate_sensitivity_adaptive(
+            forecast_length,
+            with_respect_to,
+            input_params_dict,
+            h,
+            N,
+            tol,
+            metric,
+            batch_size,
+        )
+    else:
+        d = get_single_derivative(
+            forecast_length, with_respect_to, input_params_dict, 0, h
+        )
+        print(f"Estimating sensitivity wrt {with_respect_to}")
+        for i in range(1, N + 1):
+            d += get_single_derivative(
+                forecast_length, with_respect_to, input_params_dict, i, h
+            )
+        d = d / N
+    if cache is not None:
+        cache.put(cache_key, d)
+    return d
+
+
+def _estimate_sensitivity_adaptive(
+    forecast_length: int,
+    with_respect_to: str,
+    input_params_dict: dict,
+    h: float,
+    N: int,
+    tol: float,
+    metric: str,
+    batch_size: int,
+) -> pd.DataFrame:
+    d = None
+    metric_derivative_list = []
+    for i in range(N):
+        single_derivative = get_single_derivative(
             forecast_length, with_respect_to, input_params_dict, i, h
         )
-    return d / N
+        d = single_derivative if d is None else d + single_derivative
+        metric_derivative_list.append(single_derivative[metric].values[-1])
+        n = i + 1
+        if n % batch_size == 0 and n > 1:
+            std_error = np.std(metric_derivative_list, ddof=1) / np.sqrt(n)
+            if std_error < tol:
+                break
+    return d / len(metric_derivative_list)
 
 
-def run_single_sim(forecast_length: int, input_params_dict: dict) -> pd.DataFrame:
+def run_single_sim(
+    forecast_length: int,
+    input_params_dict: dict,
+    resolution: str = "daily",
+    output_schema: OutputSchema = None,
+) -> pd.DataFrame:
+    """
+    Runs a single simulation. With a resolution other than 'daily' (see
+    resolution.RESOLUTIONS), the outputs have one row per period instead of
+    one per day, with the flows summed and the stocks read at period end (see
+    `aggregate_outputs`). The output_schema ('full' by default, 'compact' or
+    an OutputSchema) sets the dtypes and the columns of the outputs.
+    """
     # Validate input parameters
     params_dict = validate_params_dict(forecast_length, input_params_dict)
     # Build Data dict
-    data_dict = build_model_data_dict(forecast_length, params_dict)
+    with memory_stage("data_paths"):
+        data_dict = build_model_data_dict(forecast_length, params_dict)
     # Forecast supply stats
-    supply_data_dict = forecast_supply_stats(forecast_length, params_dict, data_dict)
-    # Build output dataframe
-    df = build_output_dataframe(data_dict, supply_data_dict)
-    return df
+    with memory_stage("simulate"):
+        supply_data_dict = forecast_supply_stats(
+            forecast_length, params_dict, data_dict
+        )
+    with memory_stage("dataframe"):
+        # Aggregate to the output resolution
+        sim_start = params_dict["sim_start_datetime"]
+        data_dict = aggregate_outputs(data_dict, resolution, sim_start)
+        supply_data_dict = aggregate_outputs(supply_data_dict, resolution, sim_start)
+        # Build output dataframe
+        df = build_output_dataframe(data_dict, supply_data_dict, resolution)
+        return as_output_schema(output_schema).apply(df)
+
 
+def run_long_horizon_sim(
+    forecast_length: int,
+    input_params_dict: dict,
+    n_samples: int = 1,
+    chunk_length: int = 365,
+    dtype=np.float32,
+    columns: List[str] = None,
+    shock_method: str = "iid",
+    resolution: str = "daily",
+) -> dict:
+    """
+    Runs n_samples simulations over a long horizon (e.g. decades) with
+    `forecast_supply_stats_chunked`, storing the outputs in dtype (see its
+    documentation for the float32 error bound). The data paths are drawn
+    chunk by chunk too (see `build_model_data_dict_chunk`), so only the
+    stored columns span the whole horizon. Returns {column: array of shape
+    (n_samples, forecast_length)} for the supply outputs and data paths, or
+    (n_samples, n_periods) at a resolution other than 'daily' (see
+    `aggregate_outputs`).
+    """
+    params_dict = validate_params_dict(forecast_length, input_params_dict)
+    data_state_dict = init_data_state_batch(params_dict, n_samples)
+
+    def build_data_chunk(start: int, stop: int) -> dict:
+        return build_model_data_dict_chunk(
+            start, stop - start, params_dict, data_state_dict, shock_method
+        )
+
+    if columns is None:
+        columns = SUPPLY_OUTPUT_COLUMNS + list(DATA_MODEL_BUILDERS)
+    output_dict = forecast_supply_stats_chunked(
+        forecast_length,
+        params_dict,
+        build_data_chunk,
+        chunk_length,
+        dtype,
+        columns,
+    )
+    return aggregate_outputs(output_dict, resolution, params_dict["sim_start_datetime"])
+
+
+def build_output_dataframe(
+    data_dict: dict, supply_data_dict: dict, resolution: str = "daily"
+) -> pd.DataFrame:
+    import pandas as pd
 
-def build_output_dataframe(data_dict: dict, supply_data_dict: dict) -> pd.DataFrame:
     data_df = pd.DataFrame(data_dict)
     supply_data_df = pd.DataFrame(supply_data_dict)
     df = pd.concat([supply_data_df, data_df], axis=1)
     df["day_inflation"] = df["circ_supply"].pct_change(periods=1)
-    df["year_inflation"] = df["circ_supply"].pct_change(periods=365)
+    df["year_inflation"] = df["circ_supply"].pct_change(
+        periods=PERIODS_PER_YEAR[resolution]
+    )
     return df
 
 
+def build_output_arrays_batch(batch_data_dict: dict, supply_data_dict: dict) -> dict:
+    """
+    Batched version of `build_output_dataframe`, returning {column: array of
+    shape (n_samples, forecast_length)} with the same columns.
+    """
+    circ_supply = supply_data_dict["circ_supply"]
+    n_samples, forecast_length = circ_supply.shape
+    output_dict = {
+        key: np.broadcast_to(value, (n_samples, forecast_length))
+        for key, value in supply_data_dict.items()
+    }
+    output_dict.update(batch_data_dict)
+    for key, periods in [("day_inflation", 1), ("year_inflation", 365)]:
+        inflation = np.full((n_samples, forecast_length), np.nan)
+        if periods < forecast_length:
+            inflation[:, periods:] = (
+                circ_supply[:, periods:] / circ_supply[:, :-periods] - 1
+            )
+        output_dict[key] = inflation
+    return output_dict
+
+
 if __name__ == "__main__":
     import timeit
 
@@ -0,0 +1,93 @@
+import copy
+import numpy as np
+
+from .supply import forecast_supply_stats_chunk, init_supply_state_batch
+
+# Daily data consumed by every step
+SIMULATOR_DATA_KEYS = ["n_txs", "token_price", "service_fees", "n_validators"]
+
+
+class SupplySimulator:
+    """
+    Step-wise version of `forecast_supply_stats`, for online and incremental
+    use. The simulator holds the supply state of `forecast_supply_stats_chunk`
+    for a single sample (with the staking state of the staking_engine_model,
+    aggregate or per wallet) and advances it on each new stretch of data, so
+    each new day of data costs O(1) instead of rerunning the horizon, and the
+    daily outputs are the same as those of `forecast_supply_stats` on the
+    same data.
+
+    A live forecast can be kept by stepping the simulator on the actual daily
+    data and advancing a `copy` of it on forecast data.
+    """
+
+    def __init__(self, params_dict: dict, forecast_length: int = None):
+        """
+        params_dict: The simulation parameters.
+        forecast_length: The horizon whose extra burns are vested on day 0,
+            as in `forecast_supply_stats` (all of them if None).
+        """
+        self.params_dict = params_dict
+        self.forecast_length = forecast_length
+        self.supply_state_dict = init_supply_state_batch(params_dict, 1)
+        # Next day to simulate
+        self.day = 0
+
+    @property
+    def staking_state(self):
+        """
+        The staking state after the last simulated day.
+        """
+        return self.supply_state_dict["staking"]
+
+    def step(
+        self,
+        n_txs: float,
+        token_price: float,
+        service_fees: float,
+        n_validators: float,
+    ) -> dict:
+        """
+        Simulates the next day from its data and returns the day values, with
+        the keys of the `forecast_supply_stats` outputs.
+        """
+        data_dict = {
+            "n_txs": [n_txs],
+            "token_price": [token_price],
+            "service_fees": [service_fees],
+            "n_validators": [n_validators],
+        }
+        return {key: values[0] for key, values in self.advance(data_dict).items()}
+
+    def advance(self, data_dict: dict) -> dict:
+        """
+        Simulates as many days as there are in data_dict, which maps the
+        SIMULATOR_DATA_KEYS to daily vectors, and returns the daily outputs as
+        vectors.
+        """
+        n_days = len(data_dict["token_price"])
+        if n_days == 0:
+            return {}
+        chunk_data_dict = {
+            key: np.asarray(data_dict[key], dtype=float)[None, :]
+            for key in SIMULATOR_DATA_KEYS
+        }
+        output_dict = forecast_supply_stats_chunk(
+            self.day,
+            n_days,
+            self.forecast_length,
+            self.params_dict,
+            chunk_data_dict,
+            self.supply_state_dict,
+        )
+        self.day += n_days
+        return {
+            key: values if key == "iteration" else values[0]
+            for key, values in output_dict.items()
+        }
+
+    def copy(self) -> "SupplySimulator":
+        """
+        Returns an independent copy of the simulator, sharing the parameters.
+        """
+        return copy.deepcopy(self, {id(self.params_dict): self.params_dict})
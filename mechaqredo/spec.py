@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import os
+import importlib.util
+import re
+import math
+import itertools
+import datetime as dt
+import numpy as np
+from multiprocessing import Pool, cpu_count
+from typing import List, TYPE_CHECKING
+
+from .params import (
+    PARAMS_SCHEMA,
+    default_params_dict,
+    update_params,
+    validate_params_dict,
+)
+from .events import EventSchedule
+from .data_models import build_model_data_dict_batch
+from .generate_scenarios import generate_full_scenario
+from .scenario_matrix import (
+    SCENARIO_COMPONENTS,
+    default_scenario_lists,
+    run_scenario_matrix,
+)
+from .supply import forecast_supply_stats_batch
+from .sim import build_output_arrays_batch
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Top-level keys of an experiment spec
+SPEC_KEYS = [
+    "name",
+    "forecast_length",
+    "params",
+    "wallet_balances",
+    "scenario",
+    "sweep",
+    "scenario_matrix",
+    "n_samples",
+    "seed",
+    "shock_method",
+    "batch_size",
+    "output",
+]
+OUTPUT_FORMATS = ["parquet", "csv"]
+# PyYAML reads floats such as 1e-3 (without a dot) as strings
+_FLOAT_PATTERN = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+# Per-worker copy of the shared sweep inputs, set once by the pool initializer
+_WORKER_STATE = {}
+
+
+def load_specs(spec_path: str) -> List[dict]:
+    """
+    Reads the experiment specs of a YAML file (one per YAML document).
+
+    Relative paths in a spec are resolved against the directory of the file
+    and every spec is checked for unknown keys. A spec holds:
+
+    name: The experiment name (defaults to the file name).
+    forecast_length: The number of simulated days.
+    params: Overrides of `default_params_dict`. Nested model dicts are merged,
+        and burn_extra_vec may be given as {"days": [...], "amounts": [...]}.
+    wallet_balances: {"csv": path, "column": "balance"} to read the wallet
+        balances vector from a csv file.
+    scenario: The `generate_full_scenario` choice of every component.
+    sweep: {parameter: list of values or {"linspace": [start, stop, num]}}.
+    scenario_matrix: {component: list of scenarios}, or "all", to run every
+        combination of component scenarios with `run_scenario_matrix`.
+    n_samples: The number of data paths (default 1).
+    seed: The random seed of the data paths.
+    shock_method: How the price and service fee shocks are drawn.
+    batch_size: The number of sweep points (or matrix samples) per task.
+    output: {"path": ..., "format": "parquet" or "csv", "columns": [...]}. The
+        format defaults to the path extension, or to `default_output_format`.
+        The parquet format needs a parquet engine, checked here so that a
+        queue of specs does not fail after running.
+    """
+    import yaml
+
+    with open(spec_path) as f:
+        spec_list = [spec for spec in yaml.safe_load_all(f) if spec is not None]
+    spec_dir = os.path.dirname(os.path.abspath(spec_path))
+    spec_name = os.path.splitext(os.path.basename(spec_path))[0]
+    for i, spec in enumerate(spec_list):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Spec {i} of {spec_path} must be a mapping")
+        unknown_list = [key for key in spec if key not in SPEC_KEYS]
+        if len(unknown_list) > 0:
+            raise ValueError(
+                f"Unknown spec keys {unknown_list} in {spec_path}. "
+                f"Expected any of: {SPEC_KEYS}"
+            )
+        if "forecast_length" not in spec:
+            raise ValueError(f"Missing 'forecast_length' in {spec_path}")
+        if "sweep" in spec and "scenario_matrix" in spec:
+            raise ValueError("A spec runs either a 'sweep' or a 'scenario_matrix'")
+        default_name = spec_name if len(spec_list) == 1 else f"{spec_name}_{i}"
+        spec.setdefault("name", default_name)
+        output_dict = dict(spec.get("output") or {})
+        output_format = output_dict.get("format")
+        if output_format is None:
+            extension = os.path.splitext(output_dict.get("path", ""))[1][1:]
+            output_format = (
+                extension if extension in OUTPUT_FORMATS else default_output_format()
+            )
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Invalid output format. Expected one of: {OUTPUT_FORMATS}"
+            )
+        if output_format == "parquet" and not has_parquet_engine():
+            raise ImportError(
+                f"The parquet output of spec '{spec['name']}' requires pyarrow or "
+                "fastparquet, use 'format: csv' or a .csv path otherwise"
+            )
+        output_path = output_dict.get("path", f"{spec['name']}.{output_format}")
+        output_dict["format"] = output_format
+        output_dict["path"] = os.path.join(spec_dir, output_path)
+        spec["output"] = output_dict
+        if "wallet_balances" in spec:
+            wallet_dict = dict(spec["wallet_balances"])
+            wallet_dict["csv"] = os.path.join(spec_dir, wallet_dict["csv"])
+            spec["wallet_balances"] = wallet_dict
+    return spec_list
+
+
+def build_spec_params(spec: dict) -> dict:
+    """
+    Returns the validated parameters of a spec: the defaults, the params
+    overrides, the wallet balances and the scenario, in that order.
+    """
+    forecast_length = spec["forecast_length"]
+    params_dict = update_params(
+        default_params_dict(forecast_length), _spec_param_values(spec)
+    )
+    if "wallet_balances" in spec:
+        import pandas as pd
+
+        wallet_dict = spec["wallet_balances"]
+        wallet_df = pd.read_csv(wallet_dict["csv"])
+        params_dict = update_params(
+            params_dict,
+            {
+                "wallet_balances_vec": wallet_df[
+                    wallet_dict.get("column", "balance")
+                ].values
+            },
+        )
+    if "scenario" in spec:
+        missing_list = [
+            key for key in SCENARIO_COMPONENTS if key not in spec["scenario"]
+        ]
+        if len(missing_list) > 0:
+            raise ValueError(f"Missing scenario components {missing_list}")
+        params_dict = generate_full_scenario(
+            params_dict, spec["scenario"], forecast_length
+        )
+    return validate_params_dict(forecast_length, params_dict)
+
+
+def run_spec(
+    spec: dict, processes: int = None, params_dict: dict = None
+) -> pd.DataFrame:
+    """
+    Runs an experiment spec (see `load_specs`) and writes its results.
+    params_dict: The parameters of the spec, if already built with
+        `build_spec_params`.
+    """
+    forecast_length = spec["forecast_length"]
+    if params_dict is None:
+        params_dict = build_spec_params(spec)
+    output_dict = spec["output"]
+    if "scenario_matrix" in spec:
+        scenario_lists_dict = spec["scenario_matrix"]
+        if scenario_lists_dict == "all":
+            scenario_lists_dict = default_scenario_lists()
+        df = run_scenario_matrix(
+            forecast_length,
+            params_dict,
+            scenario_lists_dict,
+            n_samples=spec.get("n_samples", 1),
+            seed=spec.get("seed"),
+            shock_method=spec.get("shock_method", "iid"),
+            columns=output_dict.get("columns"),
+            batch_size=spec.get("batch_size", 256),
+            processes=processes,
+        )
+    else:
+        df = run_sweep(
+            forecast_length,
+            params_dict,
+            _sweep_ranges(spec.get("sweep") or {}),
+            n_samples=spec.get("n_samples", 1),
+            seed=spec.get("seed"),
+            shock_method=spec.get("shock_method", "iid"),
+            columns=output_dict.get("columns"),
+            batch_size=spec.get("batch_size"),
+            processes=processes,
+        )
+    write_output(df, output_dict["path"], output_dict["format"])
+    return df
+
+
+def run_sweep(
+    forecast_length: int,
+    params_dict: dict,
+    param_ranges_dict: dict,
+    n_samples: int = 1,
+    seed: int = None,
+    shock_method: str = "iid",
+    columns: List[str] = None,
+    batch_size: int = None,
+    processes: int = None,
+) -> pd.DataFrame:
+    """
+    Parallel counterpart of `run_param_sweep_sim`. The data paths are drawn
+    once from params_dict, every sweep point runs all of them through the
+    batched supply engine, and the sweep points are spread over a pool of
+    workers in batches of batch_size points (defaults to about four batches
+    per worker).
+
+    Returns a dataframe with one row per sweep point, sample and day, holding
+    the swept parameters, "sample" and the output columns.
+    """
+    import pandas as pd
+
+    if seed is not None:
+        np.random.seed(seed)
+    batch_data_dict = build_model_data_dict_batch(
+        n_samples, forecast_length, params_dict, shock_method
+    )
+    key_list = list(param_ranges_dict)
+    iter_tuple_list = list(itertools.product(*param_ranges_dict.values()))
+    if processes is None:
+        processes = cpu_count()
+    if batch_size is None:
+        batch_size = max(1, math.ceil(len(iter_tuple_list) / (4 * processes)))
+    task_list = [
+        iter_tuple_list[start : start + batch_size]
+        for start in range(0, len(iter_tuple_list), batch_size)
+    ]
+    init_args = (forecast_length, params_dict, key_list, batch_data_dict, columns)
+    processes = min(processes, len(task_list))
+    if processes <= 1:
+        _init_worker(*init_args)
+        output_list = list(map(_run_task, task_list))
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=init_args) as pool:
+            output_list = list(pool.imap(_run_task, task_list))
+    # Build the long output dataframe
+    n_rows = n_samples * forecast_length
+    df_dict = {
+        key: np.repeat([iter_tuple[i] for iter_tuple in iter_tuple_list], n_rows)
+        for i, key in enumerate(key_list)
+    }
+    df_dict["sample"] = np.tile(
+        np.repeat(np.arange(n_samples), forecast_length), len(iter_tuple_list)
+    )
+    for col in output_list[0][0]:
+        df_dict[col] = np.concatenate(
+            [
+                output_dict[col].ravel()
+                for batch_output_list in output_list
+                for output_dict in batch_output_list
+            ]
+        )
+    return pd.DataFrame(df_dict)
+
+
+def has_parquet_engine() -> bool:
+    """
+    Returns whether a parquet engine (pyarrow or fastparquet) is installed.
+    """
+    return any(
+        importlib.util.find_spec(engine) is not None
+        for engine in ["pyarrow", "fastparquet"]
+    )
+
+
+def default_output_format() -> str:
+    """
+    Returns "parquet" if a parquet engine is installed, and "csv" otherwise.
+    """
+    return "parquet" if has_parquet_engine() else "csv"
+
+
+def write_output(df: pd.DataFrame, path: str, output_format: str = "parquet"):
+    """
+    Writes the results of a spec in a columnar format.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if output_format == "parquet":
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError as e:
+            raise ImportError(
+                "Parquet output requires pyarrow or fastparquet, "
+                "use 'format: csv' otherwise"
+            ) from e
+    elif output_format == "csv":
+        df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Invalid output format. Expected one of: {OUTPUT_FORMATS}")
+
+
+def _init_worker(
+    forecast_length: int,
+    params_dict: dict,
+    key_list: List[str],
+    batch_data_dict: dict,
+    columns: List[str],
+):
+    _WORKER_STATE["forecast_length"] = forecast_length
+    _WORKER_STATE["params_dict"] = params_dict
+    _WORKER_STATE["key_list"] = key_list
+    _WORKER_STATE["batch_data_dict"] = batch_data_dict
+    _WORKER_STATE["columns"] = columns
+
+
+def _run_task(iter_tuple_list: List[tuple]) -> List[dict]:
+    forecast_length = _WORKER_STATE["forecast_length"]
+    key_list = _WORKER_STATE["key_list"]
+    batch_data_dict = _WORKER_STATE["batch_data_dict"]
+    output_list = []
+    for iter_tuple in iter_tuple_list:
+        iter_params_dict = update_params(
+            _WORKER_STATE["params_dict"], dict(zip(key_list, iter_tuple))
+        )
+        iter_params_dict = validate_params_dict(
+            forecast_length, iter_params_dict, changed_keys=key_list
+        )
+        supply_data_dict = forecast_supply_stats_batch(
+            forecast_length, iter_params_dict, batch_data_dict
+        )
+        output_dict = build_output_arrays_batch(batch_data_dict, supply_data_dict)
+        columns = _WORKER_STATE["columns"]
+        if columns is None:
+            columns = list(output_dict)
+        output_list.append(
+            {col: np.ascontiguousarray(output_dict[col]) for col in columns}
+        )
+    return output_list
+
+
+def _spec_param_values(spec: dict) -> dict:
+    # Build the arrays and event schedules of the params overrides
+    params_dict = _coerce(spec.get("params") or {})
+    for key, value in params_dict.items():
+        field_type = PARAMS_SCHEMA.get(key, {}).get("type")
+        if field_type == "events" and isinstance(value, dict):
+            params_dict[key] = EventSchedule(value["days"], value["amounts"])
+        elif field_type in ("array", "events") and isinstance(value, list):
+            params_dict[key] = np.array(value, dtype=float)
+    return params_dict
+
+
+def _sweep_ranges(sweep_dict: dict) -> dict:
+    # Expand {"linspace": [start, stop, num]} ranges into lists
+    param_ranges_dict = {}
+    for key, values in _coerce(sweep_dict).items():
+        if isinstance(values, dict):
+            if list(values) != ["linspace"]:
+                raise ValueError(
+                    f"Invalid sweep range for '{key}', expected a list or linspace"
+                )
+            start, stop, num = values["linspace"]
+            values = np.linspace(start, stop, int(num)).tolist()
+        param_ranges_dict[key] = list(values)
+    return param_ranges_dict
+
+
+def _coerce(value):
+    # Convert the YAML dates and float strings to the parameter types
+    if isinstance(value, dict):
+        return {key: _coerce(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_coerce(item) for item in value]
+    if isinstance(value, str) and _FLOAT_PATTERN.match(value):
+        return float(value)
+    if isinstance(value, dt.date) and not isinstance(value, dt.datetime):
+        return dt.datetime(value.year, value.month, value.day)
+    return value
@@ -1,5 +1,18 @@
 import numpy as np
 
+from .release_rate import release_rate_curve
+from .wallets import wallet_balance_index
+
+# Outputs of the staking recursion
+STAKING_OUTPUT_KEYS = [
+    "staking_inflows_vec",
+    "staking_outflows_vec",
+    "staking_released_rewards_vec",
+    "total_staking_rewards_vec",
+    "ecosystem_fund_vec",
+    "staking_tvl",
+]
+
 
 def forecast_staking_stats(
     forecast_length: int,
@@ -8,75 +21,260 @@ def forecast_staking_stats(
     service_fee_locked_vec: np.array,
     released_protocol_burn_vec: np.array,
     staking_vesting_rewards_vec: np.array,
+    staking_state: "StakingState" = None,
 ) -> dict:
-    # Get params and data
-    rewards_reinvest_rate = params_dict["rewards_reinvest_rate"]
-    staking_renewal_rate = params_dict["staking_renewal_rate"]
-    staker_reward_share = 1 - params_dict["validator_reward_share"]
-    min_stake_duration = params_dict["min_stake_duration"]
+    # Get data
     new_staker_inflow_vec = forecast_new_staker_inflow_vec(forecast_length, params_dict)
-    # Initialise variables
-    initial_staking_value = compute_initial_staking_value(params_dict)
-    staking_inflows_list = [initial_staking_value]
-    staking_outflows_list = [0.0]
-    staking_tvl_list = [initial_staking_value]
-    ecosystem_fund_list = [
-        params_dict["ecosystem_fund_zero"] + params_dict["ecosystem_refresh_size"]
-    ]
-    staking_released_rewards_list = [0.0]
-    total_staking_rewards_list = [0.0]
-    available_for_outflow_vec = [0.0]
-    # Run for loop
+    # Run the staking state day by day, keeping its history
+    if staking_state is None:
+        staking_state = StakingState(params_dict, record_history=True)
     for i in range(1, forecast_length):
-        # Compute staking inflows
-        stakers_previous_rewards = (
-            staker_reward_share * total_staking_rewards_list[i - 1]
+        staking_state.step(
+            n_val_vec[i],
+            service_fee_locked_vec[i],
+            released_protocol_burn_vec[i],
+            staking_vesting_rewards_vec[i],
+            new_staker_inflow_vec[i],
         )
-        new_staker_inflow = new_staker_inflow_vec[i]
-        staking_inflows = (
-            rewards_reinvest_rate * stakers_previous_rewards + new_staker_inflow
+    return staking_state.history()
+
+
+class StakingState:
+    """
+    Streaming state of the staking recursion, behind `forecast_staking_stats`
+    and, for batches of samples, `forecast_staking_stats_chunk`.
+
+    The state only holds the values of the last simulated day and the staking
+    inflows of the last min_stake_duration days, in a ring buffer indexed by
+    day modulo min_stake_duration, so its memory does not grow with the
+    number of simulated days. The values are floats, or (n_samples,) arrays
+    for a batch, stepped with one data value per sample. The daily values
+    are only kept if record_history is True.
+    """
+
+    def __init__(
+        self, params_dict: dict, record_history: bool = False, n_samples: int = None
+    ):
+        """
+        Initialises the state on day 0.
+
+        params_dict: The simulation parameters.
+        record_history: If True, keeps every daily value for `history`.
+        n_samples: The number of samples of a batch, or None for a single one.
+        """
+        self.params_dict = params_dict
+        self.n_samples = n_samples
+        self.rewards_reinvest_rate = params_dict["rewards_reinvest_rate"]
+        self.staking_renewal_rate = params_dict["staking_renewal_rate"]
+        self.staker_reward_share = 1 - params_dict["validator_reward_share"]
+        self.min_stake_duration = params_dict["min_stake_duration"]
+        self.release_rate = release_rate_curve(params_dict)
+        initial_staking_value = compute_initial_staking_value(params_dict)
+        if n_samples is None:
+            initial_value = float
+        else:
+
+            def initial_value(value: float) -> np.array:
+                return np.full(n_samples, value, dtype=float)
+
+        # Values of the last simulated day
+        self.day = 0
+        self.staking_inflows = initial_value(initial_staking_value)
+        self.staking_outflows = initial_value(0.0)
+        self.staking_tvl = initial_value(initial_staking_value)
+        self.ecosystem_fund = initial_value(
+            params_dict["ecosystem_fund_zero"] + params_dict["ecosystem_refresh_size"]
         )
-        # Compute staking outflows
-        if i >= min_stake_duration:
-            available_for_outflow = (
-                available_for_outflow_vec[-1]
-                + staking_inflows_list[i - min_stake_duration]
-                - staking_outflows_list[-1]
-            )
+        self.staking_released_rewards = initial_value(0.0)
+        self.total_staking_rewards = initial_value(0.0)
+        self.available_for_outflow = initial_value(0.0)
+        # Staking inflows of the last min_stake_duration days
+        if n_samples is None:
+            self.inflow_window = [0.0] * self.min_stake_duration
         else:
-            available_for_outflow = 0.0
-        staking_outflows = (1 - staking_renewal_rate) * available_for_outflow
-        # Update flow lists
-        available_for_outflow_vec.append(available_for_outflow)
-        staking_inflows_list.append(staking_inflows)
-        staking_outflows_list.append(staking_outflows)
-        staking_tvl = staking_tvl_list[-1] + staking_inflows - staking_outflows
-        staking_tvl_list.append(staking_tvl)
+            self.inflow_window = np.zeros((self.min_stake_duration, n_samples))
+        self.inflow_window[0] = self.staking_inflows
+        self.history_dict = None
+        if record_history:
+            self.history_dict = {
+                key: [value] for key, value in self.day_values().items()
+            }
+
+    def step(
+        self,
+        n_val: float,
+        service_fee_locked: float,
+        released_protocol_burn: float,
+        staking_vesting_rewards: float,
+        new_staker_inflow: float = None,
+    ) -> dict:
+        """
+        Advances the state by one day, given the data of that day, and returns
+        the day values. new_staker_inflow defaults to the value of the
+        new_staker_inflow_model.
+        """
+        self.day += 1
+        if new_staker_inflow is None:
+            new_staker_inflow = forecast_new_staker_inflow_vec(
+                1, self.params_dict, self.day
+            )[0]
+        self._step_stakes(new_staker_inflow)
         # Compute reward distribution
-        release_rate = release_rate_function(staking_tvl, n_val_vec[i], params_dict)
-        staking_released_rewards = release_rate * ecosystem_fund_list[i - 1]
-        total_staking_rewards = (
-            staking_released_rewards + staking_vesting_rewards_vec[i]
+        release_rate = self.release_rate(self.staking_tvl, n_val)
+        self.staking_released_rewards = release_rate * self.ecosystem_fund
+        self.total_staking_rewards = (
+            self.staking_released_rewards + staking_vesting_rewards
         )
-        staking_released_rewards_list.append(staking_released_rewards)
-        total_staking_rewards_list.append(total_staking_rewards)
         # Update ecosystem fund value
-        ecosystem_fund = (
-            ecosystem_fund_list[-1]
-            + service_fee_locked_vec[i]
-            - released_protocol_burn_vec[i]
-            - staking_released_rewards
+        self.ecosystem_fund = (
+            self.ecosystem_fund
+            + service_fee_locked
+            - released_protocol_burn
+            - self.staking_released_rewards
+        )
+        if self.history_dict is not None:
+            self._record()
+        return self.day_values()
+
+    def _step_stakes(self, new_staker_inflow: float):
+        # Updates the staking inflows, outflows and TVL of the new day
+        # Compute staking inflows
+        stakers_previous_rewards = self.staker_reward_share * self.total_staking_rewards
+        staking_inflows = (
+            self.rewards_reinvest_rate * stakers_previous_rewards + new_staker_inflow
+        )
+        # Compute staking outflows
+        window_index = self.day % self.min_stake_duration
+        if self.day >= self.min_stake_duration:
+            self.available_for_outflow = (
+                self.available_for_outflow
+                + self.inflow_window[window_index]
+                - self.staking_outflows
+            )
+        self.inflow_window[window_index] = staking_inflows
+        self.staking_inflows = staking_inflows
+        self.staking_outflows = (1 - self.staking_renewal_rate) * (
+            self.available_for_outflow
         )
-        ecosystem_fund_list.append(ecosystem_fund)
-    # Build output dict
+        self.staking_tvl = self.staking_tvl + staking_inflows - self.staking_outflows
+
+    def day_values(self) -> dict:
+        """
+        Returns the values of the last simulated day, with the keys of the
+        `forecast_staking_stats` outputs.
+        """
+        return {
+            "staking_inflows_vec": self.staking_inflows,
+            "staking_outflows_vec": self.staking_outflows,
+            "staking_released_rewards_vec": self.staking_released_rewards,
+            "total_staking_rewards_vec": self.total_staking_rewards,
+            "ecosystem_fund_vec": self.ecosystem_fund,
+            "staking_tvl": self.staking_tvl,
+        }
+
+    def history(self) -> dict:
+        """
+        Returns the recorded daily values since day 0, as the output dict of
+        `forecast_staking_stats`.
+        """
+        if self.history_dict is None:
+            raise ValueError("The staking state does not record its history")
+        return {key: np.array(values) for key, values in self.history_dict.items()}
+
+    def __getstate__(self) -> dict:
+        # The release rate curve may be a closure, so it is rebuilt instead
+        state = dict(self.__dict__)
+        del state["release_rate"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.release_rate = release_rate_curve(self.params_dict)
+
+    def _record(self):
+        for key, value in self.day_values().items():
+            self.history_dict[key].append(value)
+
+
+def forecast_staking_stats_batch(
+    forecast_length: int,
+    params_dict: dict,
+    n_val_mat: np.array,
+    service_fee_locked_mat: np.array,
+    released_protocol_burn_mat: np.array,
+    staking_vesting_rewards_vec: np.array,
+) -> dict:
+    """
+    Runs the staking recursion of `forecast_staking_stats` for a batch of data
+    paths at once. The data inputs are (n_samples, forecast_length) arrays and
+    every output is an (n_samples, forecast_length) array.
+    """
+    staking_state = init_staking_state_batch(params_dict, n_val_mat.shape[0])
+    return forecast_staking_stats_chunk(
+        0,
+        forecast_length,
+        params_dict,
+        staking_state,
+        n_val_mat,
+        service_fee_locked_mat,
+        released_protocol_burn_mat,
+        staking_vesting_rewards_vec,
+    )
+
+
+def init_staking_state_batch(params_dict: dict, n_samples: int) -> StakingState:
+    """
+    Returns the staking state of a batch of samples on day 0.
+    """
+    return StakingState(params_dict, n_samples=n_samples)
+
+
+def forecast_staking_stats_chunk(
+    start: int,
+    chunk_length: int,
+    params_dict: dict,
+    staking_state: StakingState,
+    n_val_mat: np.array,
+    service_fee_locked_mat: np.array,
+    released_protocol_burn_mat: np.array,
+    staking_vesting_rewards_vec: np.array,
+) -> dict:
+    """
+    Advances the staking state of a batch (see `init_staking_state_batch`)
+    over the days [start, start + chunk_length), in place. The data inputs
+    only cover the chunk days, and every output is an (n_samples,
+    chunk_length) array. Running consecutive chunks gives the same results as
+    a single run over the whole horizon. A single sample state (n_samples is
+    None, e.g. of the agents engine) takes (1, chunk_length) data inputs.
+    """
+    new_staker_inflow_vec = forecast_new_staker_inflow_vec(
+        chunk_length, params_dict, start
+    )
+    n_samples = n_val_mat.shape[0]
     staking_stat_dict = {
-        "staking_inflows_vec": np.array(staking_inflows_list),
-        "staking_outflows_vec": np.array(staking_outflows_list),
-        "staking_released_rewards_vec": np.array(staking_released_rewards_list),
-        "total_staking_rewards_vec": np.array(total_staking_rewards_list),
-        "ecosystem_fund_vec": np.array(ecosystem_fund_list),
-        "staking_tvl": np.array(staking_tvl_list),
+        key: np.zeros((n_samples, chunk_length)) for key in STAKING_OUTPUT_KEYS
     }
+    # Data of every sample, or of the only one for a single sample state
+    samples = 0 if staking_state.n_samples is None else slice(None)
+    first_day = start
+    if start == 0:
+        # Day 0 holds the initial state
+        day_dict = staking_state.day_values()
+        for key in STAKING_OUTPUT_KEYS:
+            staking_stat_dict[key][:, 0] = day_dict[key]
+        first_day = 1
+    # Run for loop over days, vectorised over samples
+    for day in range(first_day, start + chunk_length):
+        i = day - start
+        day_dict = staking_state.step(
+            n_val_mat[samples, i],
+            service_fee_locked_mat[samples, i],
+            released_protocol_burn_mat[samples, i],
+            staking_vesting_rewards_vec[i],
+            new_staker_inflow_vec[i],
+        )
+        for key in STAKING_OUTPUT_KEYS:
+            staking_stat_dict[key][:, i] = day_dict[key]
     return staking_stat_dict
 
 
@@ -84,36 +282,25 @@ def compute_initial_staking_value(params_dict: dict) -> float:
     wallet_balances_vec = params_dict["wallet_balances_vec"]
     min_stake_amount = params_dict["min_stake_amount"]
     initial_stake_convertion_rate = params_dict["initial_stake_convertion_rate"]
-    available_wallet_balances_vec = wallet_balances_vec[
-        wallet_balances_vec >= min_stake_amount
-    ]
-    available_stake = sum(available_wallet_balances_vec)
+    # Balance held by the wallets above the threshold, from the sorted snapshot
+    available_stake = wallet_balance_index(wallet_balances_vec).stakeable_amount(
+        min_stake_amount
+    )
     initial_stake = initial_stake_convertion_rate * available_stake
     return initial_stake
 
 
-def release_rate_function(tvl: float, n_val: int, params_dict: dict) -> float:
-    tvl_millions = tvl / 2e6
-    # Get parameters
-    a = params_dict["release_rate_a"]
-    b = params_dict["release_rate_b"]
-    V_target = params_dict["max_validators"]
-    T_target = params_dict["max_TVL"]
-    max_rate = params_dict["release_rate_max"]
-    # Compute rate
-    T_factor = np.minimum(1, tvl_millions / V_target) ** a
-    V_factor = np.minimum(1, n_val / T_target) ** a
-    r = max_rate * (b * T_factor + (1 - b) * V_factor)
-    return r
-
-
-def forecast_new_staker_inflow_vec(forecast_length: int, params_dict: dict) -> np.array:
+def forecast_new_staker_inflow_vec(
+    forecast_length: int, params_dict: dict, start: int = 0
+) -> np.array:
     model = params_dict["new_staker_inflow_model"]["model"]
     init_stake_amt = params_dict["new_staker_inflow_model"]["init_stake_amt"]
     rate = params_dict["new_staker_inflow_model"]["rate"]
     if model == "constant":
         return np.array([init_stake_amt] * forecast_length)
     elif model == "linear":
-        return np.array([rate * t + init_stake_amt for t in range(forecast_length)])
+        return np.array(
+            [rate * t + init_stake_amt for t in range(start, start + forecast_length)]
+        )
     else:
         raise ValueError("Model provided is not valid")
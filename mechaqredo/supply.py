@@ -1,12 +1,40 @@
 import numpy as np
+from typing import List
 
 from .vesting import (
-    forecast_vested_vec_from_previous_allocation,
-    forecast_vested_vec_from_new_allocation,
+    forecast_vesting_schedule_from_previous_allocation,
+    forecast_vesting_schedule_from_new_allocation,
+    forecast_vesting_schedule_from_tranches,
     forecast_vested_vec_from_staking,
+    forecast_vested_vec_from_tranches,
 )
-from .staking import forecast_staking_stats
+from .events import as_event_schedule
+from .agents import new_staking_state
+from .staking import forecast_staking_stats, forecast_staking_stats_chunk
 from .locking import forecast_service_fee_locked_vec
+from .memory import memory_stage
+
+# Output columns of the supply forecasts
+SUPPLY_OUTPUT_COLUMNS = [
+    "iteration",
+    "circ_supply",
+    "day_burned",
+    "day_vested",
+    "day_locked",
+    "day_released",
+    "staking_rewards_vested",
+    "staking_rewards_ecosystem",
+    "total_staking_rewards",
+    "validators_rewards",
+    "market_cap",
+    "day_burn_fees",
+    "day_service_fee_locked",
+    "ecosystem_fund",
+    "staking_tvl",
+]
+# Minimum number of days of the windowed vesting schedules (staking rewards
+# and vesting_tranches) compiled at once by the chunks
+VESTING_BLOCK_DAYS = 365
 
 
 def forecast_supply_stats(
@@ -18,28 +46,33 @@ def forecast_supply_stats(
     service_fees_vec = data_dict["service_fees"]
     n_val_vec = data_dict["n_validators"]
     # Forecast burned tokens
-    burn_extra_vec = params_dict["burn_extra_vec"]
+    burn_extra_schedule = as_event_schedule(params_dict["burn_extra_vec"])
     protocol_fee_rate = params_dict["protocol_fee_rate"]
     burn_fees_vec = protocol_fee_rate * n_txs_vec
-    burned_vec = burn_extra_vec + burn_fees_vec
+    burned_vec = burn_extra_schedule.scatter_into(burn_fees_vec.astype(float))
     # Forecast vested tokens
-    vested_vec_from_previous = forecast_vested_vec_from_previous_allocation(
-        forecast_length, params_dict
-    )
-    vested_vec_from_new = forecast_vested_vec_from_new_allocation(
-        forecast_length, params_dict
-    )
-    vested_vec_from_staking = forecast_vested_vec_from_staking(
-        forecast_length, params_dict
-    )
+    with memory_stage("vesting"):
+        vested_vec = np.zeros(forecast_length, dtype="float")
+        forecast_vesting_schedule_from_previous_allocation(params_dict).scatter_into(
+            vested_vec
+        )
+        forecast_vesting_schedule_from_new_allocation(params_dict).scatter_into(
+            vested_vec
+        )
+        forecast_vesting_schedule_from_tranches(
+            params_dict, forecast_length
+        ).scatter_into(vested_vec)
+        vested_vec_from_staking = forecast_vested_vec_from_staking(
+            forecast_length, params_dict
+        )
     vested_ecosystem_fund_zero = (
         params_dict["ecosystem_fund_zero"] + params_dict["ecosystem_refresh_size"]
     )
-    vested_vec = (
-        vested_vec_from_previous + vested_vec_from_new + vested_vec_from_staking
-    )
+    vested_vec += vested_vec_from_staking
     # Need to vest the burn extra and the ecosystem fund
-    vested_vec[0] += vested_ecosystem_fund_zero + burn_extra_vec.sum()
+    vested_vec[0] += vested_ecosystem_fund_zero + burn_extra_schedule.total(
+        forecast_length
+    )
     # Forecast locked tokens from service fees
     service_fee_locked_vec = forecast_service_fee_locked_vec(
         params_dict,
@@ -50,14 +83,16 @@ def forecast_supply_stats(
     protocol_funded_rate = params_dict["protocol_funded_rate"]
     released_protocol_burn_vec = protocol_funded_rate * burned_vec
     # Forecast staking stats
-    staking_stat_dict = forecast_staking_stats(
-        forecast_length,
-        params_dict,
-        n_val_vec,
-        service_fee_locked_vec,
-        released_protocol_burn_vec,
-        vested_vec_from_staking,
-    )
+    with memory_stage("staking"):
+        staking_stat_dict = forecast_staking_stats(
+            forecast_length,
+            params_dict,
+            n_val_vec,
+            service_fee_locked_vec,
+            released_protocol_burn_vec,
+            vested_vec_from_staking,
+            new_staking_state(params_dict, record_history=True),
+        )
     staking_inflows_vec = staking_stat_dict["staking_inflows_vec"]
     staking_outflows_vec = staking_stat_dict["staking_outflows_vec"]
     staking_released_rewards_vec = staking_stat_dict["staking_released_rewards_vec"]
@@ -103,3 +138,288 @@ def forecast_supply_stats(
         "staking_tvl": staking_stat_dict["staking_tvl"],
     }
     return output_dict
+
+
+def forecast_supply_stats_batch(
+    forecast_length: int, params_dict: dict, batch_data_dict: dict
+) -> dict:
+    """
+    Batched version of `forecast_supply_stats` for data paths stacked as
+    (n_samples, forecast_length) arrays. The vesting schedules only depend on
+    the parameters, so they are computed once and shared by the whole batch.
+    Every output is an (n_samples, forecast_length) array, except "iteration".
+    """
+    n_samples = batch_data_dict["token_price"].shape[0]
+    supply_state_dict = init_supply_state_batch(params_dict, n_samples)
+    return forecast_supply_stats_chunk(
+        0,
+        forecast_length,
+        forecast_length,
+        params_dict,
+        batch_data_dict,
+        supply_state_dict,
+    )
+
+
+def forecast_supply_stats_chunked(
+    forecast_length: int,
+    params_dict: dict,
+    data_dict,
+    chunk_length: int = 365,
+    dtype=np.float64,
+    columns: List[str] = None,
+) -> dict:
+    """
+    Long-horizon version of `forecast_supply_stats`, which advances the
+    simulation chunk_length days at a time and only carries the recursion
+    state (staking TVL, ecosystem fund, last rewards and outflows, the
+    min_stake_duration inflow window and the running supply sums) from one
+    chunk to the next. The intermediates therefore scale with the chunk
+    length, and only the output columns span the whole horizon.
+
+    data_dict: The daily data of shape (forecast_length,) or (n_samples,
+        forecast_length). Only one chunk is read at a time, so memory-mapped
+        arrays work. It can also be a function of (start, stop) returning the
+        (n_samples, stop - start) data of the days [start, stop), called in
+        order (e.g. wrapping `build_model_data_dict_chunk`), so that the data
+        paths are never held in full either.
+    dtype: The storage type of the outputs. The computation and the state
+        are always float64, so with np.float32 every stored value is the
+        float64 result rounded once, with a relative error of at most 2**-24
+        (about 6e-8) for magnitudes between 1.2e-38 and 3.4e38. The error does
+        not accumulate over the horizon.
+    columns: The output columns to store, which can include data columns
+        (defaults to all the supply outputs).
+
+    Returns the outputs of `forecast_supply_stats`, with a leading sample axis
+    if the data is batched.
+    """
+    if callable(data_dict):
+        batched = True
+        build_data_chunk = data_dict
+    else:
+        batched = np.ndim(data_dict["token_price"]) == 2
+
+        def build_data_chunk(start: int, stop: int) -> dict:
+            return {key: value[..., start:stop] for key, value in data_dict.items()}
+
+    supply_state_dict = None
+    output_dict = None
+    for start in range(0, forecast_length, chunk_length):
+        stop = min(start + chunk_length, forecast_length)
+        chunk_data_dict = {
+            key: np.atleast_2d(np.asarray(value, dtype=float))
+            for key, value in build_data_chunk(start, stop).items()
+        }
+        if supply_state_dict is None:
+            n_samples = len(chunk_data_dict["token_price"])
+            supply_state_dict = init_supply_state_batch(params_dict, n_samples)
+        chunk_output_dict = forecast_supply_stats_chunk(
+            start,
+            stop - start,
+            forecast_length,
+            params_dict,
+            chunk_data_dict,
+            supply_state_dict,
+        )
+        if output_dict is None:
+            if columns is None:
+                columns = list(chunk_output_dict)
+            output_dict = {
+                col: np.empty(
+                    (n_samples, forecast_length),
+                    dtype=int if col == "iteration" else dtype,
+                )
+                for col in columns
+            }
+        for col in columns:
+            if col in chunk_output_dict:
+                output_dict[col][:, start:stop] = chunk_output_dict[col]
+            else:
+                output_dict[col][:, start:stop] = chunk_data_dict[col]
+    if "iteration" in output_dict:
+        output_dict["iteration"] = output_dict["iteration"][0]
+    if not batched:
+        output_dict = {
+            col: values if col == "iteration" else values[0]
+            for col, values in output_dict.items()
+        }
+    return output_dict
+
+
+def init_supply_state_batch(params_dict: dict, n_samples: int) -> dict:
+    """
+    Returns the state carried between chunks on day 0: the staking state (of
+    the staking_engine_model, which must be 'aggregate' for several samples),
+    the running sums of the burned, vested, locked and released tokens, the
+    vesting and extra burn schedules, compiled once for all the chunks, and
+    the last blocks of the windowed vesting schedules.
+    """
+    burn_extra_schedule = as_event_schedule(params_dict["burn_extra_vec"])
+    vesting_schedule = forecast_vesting_schedule_from_previous_allocation(
+        params_dict
+    ) + forecast_vesting_schedule_from_new_allocation(params_dict)
+    supply_state_dict = {
+        "staking": new_staking_state(params_dict, n_samples=n_samples),
+        "burn_extra_schedule": burn_extra_schedule,
+        "vesting_schedule": vesting_schedule,
+        "staking_vesting_block": (0, np.zeros(0)),
+        "tranches_vesting_block": (0, np.zeros(0)),
+        "cum_burned": np.zeros(n_samples),
+        "cum_vested": 0.0,
+        "cum_locked": np.zeros(n_samples),
+        "cum_released": np.zeros(n_samples),
+    }
+    return supply_state_dict
+
+
+def forecast_supply_stats_chunk(
+    start: int,
+    chunk_length: int,
+    forecast_length: int,
+    params_dict: dict,
+    batch_data_dict: dict,
+    supply_state_dict: dict,
+) -> dict:
+    """
+    Runs `forecast_supply_stats_batch` over the days [start, start +
+    chunk_length) of a forecast_length days horizon, updating
+    supply_state_dict in place. The data inputs only cover the chunk days.
+    """
+    # Get inputs from data dict
+    n_txs_mat = batch_data_dict["n_txs"]
+    token_price_mat = batch_data_dict["token_price"]
+    service_fees_mat = batch_data_dict["service_fees"]
+    n_val_mat = batch_data_dict["n_validators"]
+    n_samples = token_price_mat.shape[0]
+    # Forecast burned tokens
+    burn_extra_schedule = supply_state_dict["burn_extra_schedule"]
+    protocol_fee_rate = params_dict["protocol_fee_rate"]
+    burn_fees_mat = protocol_fee_rate * n_txs_mat
+    burned_mat = burn_extra_schedule.scatter_into(burn_fees_mat.astype(float), start)
+    # Forecast vested tokens (shared by all samples)
+    vested_vec = np.zeros(chunk_length, dtype="float")
+    supply_state_dict["vesting_schedule"].scatter_into(vested_vec, start)
+    if len(params_dict.get("vesting_tranches", [])) > 0:
+        vested_vec += _vesting_chunk(
+            start,
+            chunk_length,
+            params_dict,
+            supply_state_dict,
+            "tranches_vesting_block",
+            forecast_vested_vec_from_tranches,
+        )
+    vested_vec_from_staking = _vesting_chunk(
+        start,
+        chunk_length,
+        params_dict,
+        supply_state_dict,
+        "staking_vesting_block",
+        forecast_vested_vec_from_staking,
+    )
+    vested_ecosystem_fund_zero = (
+        params_dict["ecosystem_fund_zero"] + params_dict["ecosystem_refresh_size"]
+    )
+    vested_vec += vested_vec_from_staking
+    if start == 0:
+        vested_vec[0] += vested_ecosystem_fund_zero + burn_extra_schedule.total(
+            forecast_length
+        )
+    # Forecast locked tokens from service fees
+    service_fee_locked_mat = forecast_service_fee_locked_vec(
+        params_dict,
+        token_price_mat,
+        service_fees_mat,
+    )
+    # Forecast token releases from protocol fees covered by the protocol
+    protocol_funded_rate = params_dict["protocol_funded_rate"]
+    released_protocol_burn_mat = protocol_funded_rate * burned_mat
+    # Forecast staking stats
+    staking_stat_dict = forecast_staking_stats_chunk(
+        start,
+        chunk_length,
+        params_dict,
+        supply_state_dict["staking"],
+        n_val_mat,
+        service_fee_locked_mat,
+        released_protocol_burn_mat,
+        vested_vec_from_staking,
+    )
+    staking_inflows_mat = staking_stat_dict["staking_inflows_vec"]
+    staking_outflows_mat = staking_stat_dict["staking_outflows_vec"]
+    staking_released_rewards_mat = staking_stat_dict["staking_released_rewards_vec"]
+    # Compute total locked tokens
+    locked_mat = service_fee_locked_mat + staking_inflows_mat
+    if start == 0:
+        locked_mat[:, 0] += vested_ecosystem_fund_zero
+    # Compute total released tokens
+    released_mat = (
+        released_protocol_burn_mat + staking_released_rewards_mat + staking_outflows_mat
+    )
+    # Compute circulating supply from the running sums
+    cum_burned_mat = _running_sum(burned_mat, supply_state_dict, "cum_burned")
+    cum_vested_vec = _running_sum(vested_vec, supply_state_dict, "cum_vested")
+    cum_locked_mat = _running_sum(locked_mat, supply_state_dict, "cum_locked")
+    cum_released_mat = _running_sum(released_mat, supply_state_dict, "cum_released")
+    circ_supply = (
+        params_dict["circ_supply_zero"]
+        - cum_burned_mat
+        + cum_vested_vec
+        - cum_locked_mat
+        + cum_released_mat
+    )
+    # Put together output dict
+    total_staking_rewards_mat = staking_stat_dict["total_staking_rewards_vec"]
+    validator_reward_share = params_dict["validator_reward_share"]
+    output_dict = {
+        "iteration": np.arange(start, start + chunk_length, 1),
+        "circ_supply": circ_supply,
+        "day_burned": burned_mat,
+        "day_vested": np.broadcast_to(vested_vec, (n_samples, chunk_length)),
+        "day_locked": locked_mat,
+        "day_released": released_mat,
+        "staking_rewards_vested": np.broadcast_to(
+            vested_vec_from_staking, (n_samples, chunk_length)
+        ),
+        "staking_rewards_ecosystem": total_staking_rewards_mat
+        - vested_vec_from_staking,
+        "total_staking_rewards": total_staking_rewards_mat,
+        "validators_rewards": validator_reward_share * total_staking_rewards_mat,
+        "market_cap": circ_supply * token_price_mat,
+        "day_burn_fees": burn_fees_mat,
+        "day_service_fee_locked": service_fee_locked_mat,
+        "ecosystem_fund": staking_stat_dict["ecosystem_fund_vec"],
+        "staking_tvl": staking_stat_dict["staking_tvl"],
+    }
+    return output_dict
+
+
+def _vesting_chunk(
+    start: int,
+    chunk_length: int,
+    params_dict: dict,
+    supply_state_dict: dict,
+    block_key: str,
+    forecast_vested_vec,
+) -> np.array:
+    # Daily vesting of the chunk days from forecast_vested_vec(length,
+    # params_dict, start), compiled by blocks of at least VESTING_BLOCK_DAYS
+    # days that the following short chunks reuse
+    block_start, block_vec = supply_state_dict[block_key]
+    offset = start - block_start
+    if offset < 0 or offset + chunk_length > len(block_vec):
+        block_start, offset = start, 0
+        block_vec = forecast_vested_vec(
+            max(chunk_length, VESTING_BLOCK_DAYS), params_dict, start
+        )
+        supply_state_dict[block_key] = (block_start, block_vec)
+    return block_vec[offset : offset + chunk_length]
+
+
+def _running_sum(values: np.array, supply_state_dict: dict, key: str) -> np.array:
+    # Cumulative sum along the days, continuing from the previous chunks
+    values = values.astype(float)
+    values[..., 0] += supply_state_dict[key]
+    cum_values = values.cumsum(axis=-1)
+    supply_state_dict[key] = cum_values[..., -1].copy()
+    return cum_values
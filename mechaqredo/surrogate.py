@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import itertools
+import numpy as np
+from typing import List, TYPE_CHECKING
+
+from .sim import run_param_sweep_sim, run_single_sim
+from .params import update_params
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class SurrogateModel:
+    """
+    Reduced-basis polynomial chaos emulator of the daily simulation paths.
+
+    Each target column is averaged over the data samples of every sweep point,
+    compressed with an SVD into a few daily basis paths, and the basis
+    coefficients are regressed on a total-degree Legendre polynomial expansion
+    of the swept parameters (rescaled to [-1, 1] over the trained box).
+    Queries inside the trained box cost a couple of small matrix products;
+    queries outside of it fall back to the full simulator.
+    """
+
+    def __init__(
+        self,
+        param_names: List[str],
+        target_columns: List[str] = ("circ_supply", "ecosystem_fund"),
+        degree: int = 2,
+        energy: float = 0.9999,
+        ridge: float = 1e-10,
+    ):
+        """
+        param_names: The swept parameters used as emulator inputs.
+        target_columns: The output columns to emulate.
+        degree: The total degree of the Legendre polynomial expansion.
+        energy: The fraction of path variance kept by the reduced basis.
+        ridge: Tikhonov regularisation of the coefficient regression.
+        """
+        self.param_names = list(param_names)
+        self.target_columns = list(target_columns)
+        self.degree = degree
+        self.energy = energy
+        self.ridge = ridge
+        self.multi_indices = np.array(
+            [
+                alpha
+                for alpha in itertools.product(
+                    range(degree + 1), repeat=len(self.param_names)
+                )
+                if sum(alpha) <= degree
+            ]
+        )
+        self.lower = None
+        self.upper = None
+        self.forecast_length = None
+        self.basis_dict = {}
+        self.validation_error = None
+        self.base_params_dict = None
+        self.fallback_n_samples = 1
+
+    def fit(
+        self,
+        sweep_df: pd.DataFrame,
+        validation_fraction: float = 0.2,
+        seed: int = 0,
+    ) -> "SurrogateModel":
+        """
+        Fits the emulator on the output of `run_param_sweep_sim`.
+
+        A random `validation_fraction` of the sweep points is held out to
+        measure the emulator error, which is stored in `validation_error` as
+        {column: {"rel_rmse": ..., "max_abs": ...}}. The final emulator is then
+        refitted on all the sweep points.
+        """
+        X, Y_dict = self._build_training_arrays(sweep_df)
+        n_points = X.shape[0]
+        self.lower = X.min(axis=0)
+        self.upper = X.max(axis=0)
+        # Hold out a validation set
+        n_valid = int(round(validation_fraction * n_points))
+        if n_valid > 0:
+            if n_points - n_valid < len(self.multi_indices):
+                raise ValueError(
+                    f"Not enough sweep points ({n_points}) to validate a degree "
+                    f"{self.degree} emulator with {len(self.multi_indices)} terms"
+                )
+            perm = np.random.RandomState(seed).permutation(n_points)
+            valid_idx, train_idx = perm[:n_valid], perm[n_valid:]
+            self.validation_error = {}
+            for col, Y in Y_dict.items():
+                basis = self._fit_basis(X[train_idx], Y[train_idx])
+                Y_pred = self._evaluate_basis(basis, self._features(X[valid_idx]))
+                err = Y_pred - Y[valid_idx]
+                self.validation_error[col] = {
+                    "rel_rmse": float(
+                        np.sqrt((err**2).mean()) / np.sqrt((Y[valid_idx] ** 2).mean())
+                    ),
+                    "max_abs": float(np.abs(err).max()),
+                }
+        # Refit on all the points
+        self.basis_dict = {col: self._fit_basis(X, Y) for col, Y in Y_dict.items()}
+        return self
+
+    def in_domain(self, params_dict: dict) -> bool:
+        """
+        Checks whether a query only touches the swept parameters and stays
+        inside the trained box.
+        """
+        if not set(params_dict).issubset(self.param_names):
+            return False
+        x = self._query_vector(params_dict)
+        return bool(np.all(x >= self.lower) and np.all(x <= self.upper))
+
+    def predict(self, params_dict: dict) -> dict:
+        """
+        Evaluates the emulator for the given swept parameter values (missing
+        parameters default to the centre of the trained box) and returns
+        {column: daily path}.
+        """
+        x = self._query_vector(params_dict)
+        phi = self._features(x[None, :])
+        return {
+            col: self._evaluate_basis(basis, phi)[0]
+            for col, basis in self.basis_dict.items()
+        }
+
+    def query(self, params_dict: dict) -> dict:
+        """
+        Answers a what-if query with the emulator when it is inside the trained
+        domain, and with the mean of `fallback_n_samples` full simulations
+        otherwise. The fallback needs `set_fallback` to have been called.
+        """
+        if self.in_domain(params_dict):
+            return self.predict(params_dict)
+        if self.base_params_dict is None:
+            raise ValueError(
+                "Query outside the trained domain and no fallback simulator was set"
+            )
+        sim_params_dict = update_params(self.base_params_dict, params_dict)
+        output_dict = {
+            col: np.zeros(self.forecast_length) for col in self.target_columns
+        }
+        for _ in range(self.fallback_n_samples):
+            df = run_single_sim(self.forecast_length, sim_params_dict)
+            for col in self.target_columns:
+                output_dict[col] += df[col].values / self.fallback_n_samples
+        return output_dict
+
+    def set_fallback(
+        self, forecast_length: int, params_dict: dict, n_samples: int = 1
+    ) -> "SurrogateModel":
+        """
+        Sets the base parameters used to run the real simulator for queries
+        outside the trained domain.
+        """
+        self.forecast_length = forecast_length
+        self.base_params_dict = params_dict
+        self.fallback_n_samples = n_samples
+        return self
+
+    def _build_training_arrays(self, sweep_df: pd.DataFrame):
+        # Average the data samples of each sweep point, day by day
+        mean_df = (
+            sweep_df.groupby(self.param_names + ["iteration"])[self.target_columns]
+            .mean()
+            .unstack("iteration")
+        )
+        self.forecast_length = mean_df.columns.get_level_values("iteration").nunique()
+        X = np.array(mean_df.index.tolist(), dtype=float).reshape(
+            len(mean_df), len(self.param_names)
+        )
+        Y_dict = {col: mean_df[col].values for col in self.target_columns}
+        return X, Y_dict
+
+    def _features(self, X: np.array) -> np.array:
+        # Rescale to [-1, 1] and evaluate the Legendre polynomials per dimension
+        span = np.where(self.upper > self.lower, self.upper - self.lower, 1.0)
+        Z = 2 * (X - self.lower) / span - 1
+        P = np.ones((self.degree + 1,) + Z.shape)
+        if self.degree > 0:
+            P[1] = Z
+        for n in range(1, self.degree):
+            P[n + 1] = ((2 * n + 1) * Z * P[n] - n * P[n - 1]) / (n + 1)
+        P = P.transpose(0, 2, 1)
+        dims = np.arange(Z.shape[1])
+        return np.prod(P[self.multi_indices, dims], axis=1).T
+
+    def _fit_basis(self, X: np.array, Y: np.array) -> dict:
+        # Reduced basis of the centred daily paths
+        mean_path = Y.mean(axis=0)
+        U, S, Vt = np.linalg.svd(Y - mean_path, full_matrices=False)
+        energy = np.cumsum(S**2) / max((S**2).sum(), np.finfo(float).tiny)
+        n_components = int(np.searchsorted(energy, self.energy) + 1)
+        n_components = min(n_components, len(S))
+        coefs = U[:, :n_components] * S[:n_components]
+        # Regress the basis coefficients on the polynomial features
+        phi = self._features(X)
+        A = phi.T @ phi + self.ridge * np.eye(phi.shape[1])
+        W = np.linalg.solve(A, phi.T @ coefs)
+        return {"mean": mean_path, "W": W, "Vt": Vt[:n_components]}
+
+    def _evaluate_basis(self, basis: dict, phi: np.array) -> np.array:
+        return basis["mean"] + (phi @ basis["W"]) @ basis["Vt"]
+
+    def _query_vector(self, params_dict: dict) -> np.array:
+        return np.array(
+            [
+                params_dict.get(key, 0.5 * (lo + up))
+                for key, lo, up in zip(self.param_names, self.lower, self.upper)
+            ],
+            dtype=float,
+        )
+
+
+def fit_surrogate(
+    forecast_length: int,
+    input_params_dict: dict,
+    param_ranges_dict: dict,
+    data_dict_n_samples: int = 1,
+    target_columns: List[str] = ("circ_supply", "ecosystem_fund"),
+    degree: int = 2,
+    validation_fraction: float = 0.2,
+    data_dict_list: List[dict] = None,
+) -> SurrogateModel:
+    """
+    Runs a parameter sweep and fits a surrogate model on its outputs. The
+    input parameters are kept as the fallback simulator.
+    """
+    sweep_df = run_param_sweep_sim(
+        forecast_length,
+        input_params_dict,
+        param_ranges_dict,
+        data_dict_n_samples,
+        data_dict_list,
+    )
+    surrogate = SurrogateModel(list(param_ranges_dict), target_columns, degree)
+    surrogate.fit(sweep_df, validation_fraction)
+    surrogate.set_fallback(forecast_length, input_params_dict, data_dict_n_samples)
+    return surrogate
@@ -3,7 +3,7 @@ import pandas as pd
 import numpy as np
 from mechaqredo.params import default_params_dict
 from mechaqredo.sim import run_param_sweep_sim
-from generate_scenarios import generate_full_scenario
+from mechaqredo.generate_scenarios import generate_full_scenario
 
 # Function to check and create the "data" folder if it doesn't exist
 def create_data_folder(data_folder:str='data'):
@@ -86,6 +86,6 @@ sweep_df = run_param_sweep_sim(
     data_dict_n_samples,
     save=True,
     output_dir=DATA_FOLDER,
-    scenario='very_bad'
+    file_name='very_bad'
 )
 sweep_df.to_csv(DATA_FOLDER+'/agg_very_bad.csv')
@@ -8,6 +8,7 @@ Created on Wed Jun  7 21:57:54 2023
 """
 
 import numpy as np
+from .paths import standard_normal_shocks, gbm_paths, ou_paths
 
 
 class ServiceFees:
@@ -104,6 +105,36 @@ class ServiceFees:
         """
         return self.fees_list[-1]
 
+    def simulate_paths(
+        self, forecast_length: int, n_paths: int, shock_method: str = "iid"
+    ) -> np.array:
+        """
+        Simulate a batch of service fee paths, i.e. the values of forecast_length
+        calls to update() on a fresh model, without updating the fees list.
+
+        forecast_length: The number of values per path.
+        n_paths: The number of paths.
+        shock_method: How the normal shocks are drawn (see paths.standard_normal_shocks).
+        """
+        if self.model == "constant":
+            return np.full((n_paths, forecast_length), self.A0, dtype=float)
+        elif self.model == "linear":
+            path = self.A0 + self.a * np.arange(forecast_length)
+            return np.tile(path, (n_paths, 1))
+        elif self.model == "gbm":
+            shocks = standard_normal_shocks(n_paths, forecast_length - 1, shock_method)
+            return gbm_paths(self.A0, self.drift, self.sigma, self.dt, shocks)
+        elif self.model == "ou":
+            shocks = standard_normal_shocks(n_paths, forecast_length - 1, shock_method)
+            return ou_paths(
+                self.A0, self.drift, self.theta, self.sigma, self.dt, shocks
+            )
+        elif self.model == "defined_path":
+            if len(self.defined_path) < forecast_length:
+                raise ValueError("defined_path is shorter than the forecast length")
+            shocks = standard_normal_shocks(n_paths, forecast_length, shock_method)
+            return self.defined_path[:forecast_length] + self.sigma * shocks
+
 
 class NumTransactions:
     """
@@ -1,5 +1,17 @@
 import numpy as np
 import datetime as dt
+from typing import List
+
+from .events import EventSchedule
+
+VESTING_TRANCHE_TYPES = ["cliff", "linear", "stepped", "exponential"]
+# Fields every tranche type requires (see `compile_vesting_schedule`)
+VESTING_TRANCHE_FIELDS = {
+    "cliff": ["day", "amount"],
+    "linear": ["end", "amount"],
+    "stepped": ["end", "period_days", "amount"],
+    "exponential": ["decay_rate", "amount"],
+}
 
 
 def forecast_vested_vec_from_previous_allocation(
@@ -12,16 +24,17 @@ def forecast_vested_vec_from_previous_allocation(
     return vested_vec
 
 
-def forecast_vested_vec_from_staking(forecast_length: int, params_dict: dict):
-    fund_size = params_dict["staking_rewards_fund_size"]
-    vesting_decay_rate = params_dict["staking_rewards_vesting_decay_rate"]
-    cum_vesting_list = [
-        fund_size * (1 - np.exp(-vesting_decay_rate * day))
-        for day in range(forecast_length)
-    ]
-    cum_vesting_vec = np.array([0.0] + cum_vesting_list)
-    vested_vec = np.diff(cum_vesting_vec)
-    return vested_vec
+def forecast_vested_vec_from_staking(
+    forecast_length: int, params_dict: dict, start: int = 0
+):
+    staking_tranche = {
+        "type": "exponential",
+        "amount": params_dict["staking_rewards_fund_size"],
+        "decay_rate": params_dict["staking_rewards_vesting_decay_rate"],
+    }
+    return compile_vesting_schedule(
+        [staking_tranche], forecast_length=forecast_length, start=start
+    ).to_dense(forecast_length, start)
 
 
 def forecast_vested_vec_from_new_allocation(
@@ -34,15 +47,64 @@ def forecast_vested_vec_from_new_allocation(
     return vested_vec
 
 
+def forecast_vesting_schedule_from_previous_allocation(
+    params_dict: dict,
+) -> EventSchedule:
+    sim_start = params_dict["sim_start_datetime"]
+    return build_linear_vesting_schedule(
+        sim_start, params_dict["previous_funds_vesting_spec"]
+    )
+
+
+def forecast_vesting_schedule_from_new_allocation(params_dict: dict) -> EventSchedule:
+    sim_start = params_dict["sim_start_datetime"]
+    return build_linear_vesting_schedule(
+        sim_start, params_dict["new_funds_vesting_spec"]
+    )
+
+
+def forecast_vesting_schedule_from_tranches(
+    params_dict: dict, forecast_length: int = None, start: int = 0
+) -> EventSchedule:
+    """
+    Compiles the vesting_tranches params (none by default) over the days
+    [start, start + forecast_length), or all of them if forecast_length is
+    None, which exponential tranches do not allow.
+    """
+    sim_start = params_dict["sim_start_datetime"]
+    return compile_vesting_schedule(
+        list(params_dict.get("vesting_tranches", [])),
+        sim_start,
+        forecast_length,
+        start,
+    )
+
+
+def forecast_vested_vec_from_tranches(
+    forecast_length: int, params_dict: dict, start: int = 0
+) -> np.array:
+    return forecast_vesting_schedule_from_tranches(
+        params_dict, forecast_length, start
+    ).to_dense(forecast_length, start)
+
+
 def build_linear_vesting_vec(
     sim_start: dt.datetime, forecast_length: int, fund_params_dict: dict
 ) -> np.array:
-    known_vest_vec = np.zeros(forecast_length, dtype=float)
-    for fund_name in fund_params_dict:
-        fund_spec_dict = fund_params_dict[fund_name]
-        fund_vesting_vec = linear_vest(forecast_length, sim_start, fund_spec_dict)
-        known_vest_vec += fund_vesting_vec
-    return known_vest_vec
+    vesting_schedule = build_linear_vesting_schedule(sim_start, fund_params_dict)
+    return vesting_schedule.to_dense(forecast_length)
+
+
+def build_linear_vesting_schedule(
+    sim_start: dt.datetime, fund_params_dict: dict
+) -> EventSchedule:
+    # Compile the tranches of all the funds into a single schedule
+    tranche_list = [
+        tranche
+        for fund_name in fund_params_dict
+        for tranche in fund_spec_tranches(fund_params_dict[fund_name])
+    ]
+    return compile_vesting_schedule(tranche_list, sim_start)
 
 
 def linear_vest(
@@ -50,15 +112,151 @@ def linear_vest(
     sim_start: dt.datetime,
     fund_spec_dict: dict,
 ) -> np.array:
-    vest_period_days = fund_spec_dict["vest_period_days"]
-    vest_end_date = fund_spec_dict["vest_end_date"]
-    vest_amount = fund_spec_dict["vest_amount"]
-    vest_zero = fund_spec_dict["vest_zero"]
-    vest_vec = np.zeros(forecast_length, dtype=float)
-    vest_vec[0] = vest_zero
-    if vest_amount is not None:
-        vesting_days = (vest_end_date - sim_start).days
-        for i in range(vesting_days, 0, -vest_period_days):
-            if i < forecast_length:
-                vest_vec[i] = vest_amount
-    return vest_vec
+    return linear_vest_schedule(sim_start, fund_spec_dict).to_dense(forecast_length)
+
+
+def linear_vest_schedule(
+    sim_start: dt.datetime,
+    fund_spec_dict: dict,
+) -> EventSchedule:
+    return compile_vesting_schedule(fund_spec_tranches(fund_spec_dict), sim_start)
+
+
+def fund_spec_tranches(fund_spec_dict: dict) -> List[dict]:
+    """
+    Returns the vesting tranches of a fund spec: vest_zero on day 0, then
+    vest_amount every vest_period_days, counting backwards from vest_end_date.
+    """
+    tranche_list = [{"type": "cliff", "day": 0, "amount": fund_spec_dict["vest_zero"]}]
+    if fund_spec_dict["vest_amount"] is not None:
+        tranche_list.append(
+            {
+                "type": "stepped",
+                "amount": fund_spec_dict["vest_amount"],
+                "period_days": fund_spec_dict["vest_period_days"],
+                "end": fund_spec_dict["vest_end_date"],
+            }
+        )
+    return tranche_list
+
+
+def compile_vesting_schedule(
+    tranche_list: List[dict],
+    sim_start: dt.datetime = None,
+    forecast_length: int = None,
+    start: int = 0,
+) -> EventSchedule:
+    """
+    Compiles vesting tranches into a single EventSchedule holding the events
+    of the days [start, start + forecast_length), or all of them if
+    forecast_length is None. The tranches of every type are expanded at once
+    with array operations, whatever their number.
+
+    tranche_list: Dicts with a "type" among VESTING_TRANCHE_TYPES:
+        'cliff': amount vests on day.
+        'linear': amount vests in equal daily parts over the days (start, end].
+        'stepped': amount vests every period_days over (start, end], counting
+            backwards from end.
+        'exponential': amount * (1 - exp(-decay_rate * (t - start))) has
+            vested by day t. This tranche never ends, so it needs a
+            forecast_length.
+        Days are day numbers or datetimes (converted with sim_start). The
+        tranche start defaults to day 0, and is unrelated to the start of the
+        compiled window.
+    """
+    stop = None if forecast_length is None else start + forecast_length
+    typed_tranche_dict = {tranche_type: [] for tranche_type in VESTING_TRANCHE_TYPES}
+    for tranche in tranche_list:
+        if tranche["type"] not in typed_tranche_dict:
+            raise ValueError(
+                f"Invalid tranche type. Expected one of: {VESTING_TRANCHE_TYPES}"
+            )
+        typed_tranche_dict[tranche["type"]].append(tranche)
+    days_list = []
+    amounts_list = []
+    # Cliffs
+    cliff_list = typed_tranche_dict["cliff"]
+    if len(cliff_list) > 0:
+        days = np.array([_vesting_day(tr["day"], sim_start) for tr in cliff_list])
+        amounts = np.array([tr["amount"] for tr in cliff_list], dtype=float)
+        in_window = days >= start
+        if stop is not None:
+            in_window &= days < stop
+        days_list.append(days[in_window])
+        amounts_list.append(amounts[in_window])
+    # Linear and stepped tranches, as (first day, last day, period, amount per step)
+    step_spec_list = []
+    for tranche in typed_tranche_dict["linear"]:
+        first_day = _vesting_day(tranche.get("start", 0), sim_start)
+        end = _vesting_day(tranche["end"], sim_start)
+        step_spec_list.append(
+            (first_day, end, 1, tranche["amount"] / max(end - first_day, 1))
+        )
+    for tranche in typed_tranche_dict["stepped"]:
+        step_spec_list.append(
+            (
+                _vesting_day(tranche.get("start", 0), sim_start),
+                _vesting_day(tranche["end"], sim_start),
+                tranche["period_days"],
+                tranche["amount"],
+            )
+        )
+    if len(step_spec_list) > 0:
+        days, amounts = _expand_steps(
+            np.array(step_spec_list, dtype=float), start, stop
+        )
+        days_list.append(days)
+        amounts_list.append(amounts)
+    # Exponential tranches, dense over the window
+    exponential_list = typed_tranche_dict["exponential"]
+    if len(exponential_list) > 0:
+        if stop is None:
+            raise ValueError("Exponential tranches need a forecast_length")
+        days, amounts = _expand_exponentials(exponential_list, sim_start, start, stop)
+        days_list.append(days)
+        amounts_list.append(amounts)
+    return EventSchedule(
+        np.concatenate([np.zeros(0, dtype=np.int64)] + days_list),
+        np.concatenate([np.zeros(0)] + amounts_list),
+    )
+
+
+def _vesting_day(value, sim_start: dt.datetime) -> int:
+    # Day number of a tranche date
+    if isinstance(value, dt.datetime):
+        if sim_start is None:
+            raise ValueError("Tranche dates need the simulation start date")
+        return (value - sim_start).days
+    return int(value)
+
+
+def _expand_steps(step_spec_mat: np.array, start: int, stop: int) -> tuple:
+    # Days end - j * period > first_day, for all the steps j falling in the window
+    first_day, end, period, amount = step_spec_mat.T
+    n_steps = np.maximum(np.ceil((end - first_day) / period), 0)
+    j_max = np.minimum(n_steps, np.floor((end - start) / period) + 1)
+    j_min = np.zeros(len(end))
+    if stop is not None:
+        j_min = np.maximum(np.floor((end - stop) / period) + 1, 0)
+    counts = np.maximum(j_max - j_min, 0).astype(np.int64)
+    tranche_index = np.repeat(np.arange(len(end)), counts)
+    offsets = np.cumsum(counts) - counts
+    j = j_min[tranche_index] + np.arange(counts.sum()) - offsets[tranche_index]
+    days = end[tranche_index] - j * period[tranche_index]
+    return days.astype(np.int64), amount[tranche_index]
+
+
+def _expand_exponentials(
+    exponential_list: List[dict], sim_start: dt.datetime, start: int, stop: int
+) -> tuple:
+    # Daily increments of the cumulative vesting over the window
+    first_day = np.array(
+        [_vesting_day(tr.get("start", 0), sim_start) for tr in exponential_list]
+    )[:, None]
+    amount = np.array([tr["amount"] for tr in exponential_list], dtype=float)[:, None]
+    rate = np.array([tr["decay_rate"] for tr in exponential_list], dtype=float)[:, None]
+    days = np.arange(start - 1, stop)
+    cum_vesting_mat = np.where(
+        days >= first_day, amount * (1 - np.exp(-rate * (days - first_day))), 0.0
+    )
+    return days[1:], np.diff(cum_vesting_mat, axis=1).sum(axis=0)
@@ -0,0 +1,70 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# Number of wallet balance indices kept by `wallet_balance_index`
+WALLET_BALANCE_INDEX_CACHE_SIZE = 8
+
+
+class WalletBalanceIndex:
+    """
+    Index of a wallet balances snapshot answering "how much is held by the
+    wallets with at least x tokens" with a binary search: the balances are
+    sorted once and the amounts held above every rank are precomputed.
+    """
+
+    def __init__(self, wallet_balances_vec: np.array):
+        """
+        wallet_balances_vec: The balance of every wallet. NaN balances are
+            left out, as they never reach a minimum stake amount.
+        """
+        balances_vec = np.asarray(wallet_balances_vec, dtype=float)
+        self.sorted_balances_vec = np.sort(balances_vec[~np.isnan(balances_vec)])
+        # amount_above_vec[k] is the sum of sorted_balances_vec[k:], summed from
+        # the largest balance down
+        amount_above_vec = np.zeros(len(self.sorted_balances_vec) + 1)
+        np.cumsum(self.sorted_balances_vec[::-1], out=amount_above_vec[-2::-1])
+        self.amount_above_vec = amount_above_vec
+
+    def __len__(self) -> int:
+        return len(self.sorted_balances_vec)
+
+    def stakeable_amount(self, min_stake_amount):
+        """
+        Returns the total balance of the wallets holding at least
+        min_stake_amount tokens (vectorized over min_stake_amount).
+        """
+        rank = np.searchsorted(self.sorted_balances_vec, min_stake_amount)
+        return self.amount_above_vec[rank]
+
+    def n_wallets(self, min_stake_amount):
+        """
+        Returns the number of wallets holding at least min_stake_amount tokens
+        (vectorized over min_stake_amount).
+        """
+        rank = np.searchsorted(self.sorted_balances_vec, min_stake_amount)
+        return len(self) - rank
+
+
+# Indices of the last snapshots used, by content digest
+_WALLET_BALANCE_INDICES = OrderedDict()
+
+
+def wallet_balance_index(wallet_balances_vec: np.array) -> WalletBalanceIndex:
+    """
+    Returns the WalletBalanceIndex of a balances snapshot. The indices of the
+    last WALLET_BALANCE_INDEX_CACHE_SIZE snapshots are kept by content, so a
+    sweep over min_stake_amount sorts the snapshot once, and a snapshot
+    modified in place gets a new index.
+    """
+    balances_vec = np.ascontiguousarray(wallet_balances_vec, dtype=float)
+    key = hashlib.blake2b(balances_vec, digest_size=16).digest()
+    index = _WALLET_BALANCE_INDICES.get(key)
+    if index is not None:
+        _WALLET_BALANCE_INDICES.move_to_end(key)
+        return index
+    index = WalletBalanceIndex(balances_vec)
+    _WALLET_BALANCE_INDICES[key] = index
+    while len(_WALLET_BALANCE_INDICES) > WALLET_BALANCE_INDEX_CACHE_SIZE:
+        _WALLET_BALANCE_INDICES.popitem(last=False)
+    return index
@@ -7,14 +7,14 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 from tqdm import tqdm
-from multiprocessing import Pool
 import warnings
 matplotlib.use('Agg')
 warnings.filterwarnings('ignore')
 code_dir = os.path.realpath(os.path.join(os.getcwd(), ".."))
 sys.path.append(code_dir)
 from mechaqredo.params import default_params_dict
-from mechaqredo.sim import estimate_sensitivity,estimate_one_by_one
+from mechaqredo.sensitivity import run_sensitivity_grid
+from mechaqredo.cache import ResultCache
 from mechaqredo.generate_scenarios import generate_full_scenario
 outfolder = os.path.realpath("../data/sensitivities")
 matplotlib.use('Agg')
@@ -34,7 +34,7 @@ list_of_params=['protocol_funded_rate',
   'validator_reward_share',
   'staking_rewards_vesting_decay_rate',
   'release_rate_a',
-  'max_rate']
+  'release_rate_max']
 
 cols=['circ_supply',
       'staking_rewards_vested',
@@ -44,18 +44,16 @@ cols=['circ_supply',
        'market_cap',
        'staking_tvl',
        'year_inflation',
-       'apy', 
-       'tvl_rate',
        'ecosystem_fund']
 
 
-def compute_estimate(p, i,tr):
-    params=default_params_dict(SIMULATION_LENGHT)
-    params = generate_full_scenario(
-    params_dict=params, scenarios_dict=sd, forecast_length=SIMULATION_LENGHT)
-    params[p]=tr[i]
-
-    return estimate_one_by_one(SIMULATION_LENGHT, with_respect_to=p, input_params_dict=params, N=1000)
+def get_grid(p):
+    if p=='initial_stake_convertion_rate':
+        return 0.1*np.linspace(0,1,Ntr)
+    # elif p=='max_rate':
+    #     return 0.2*np.linspace(0,1,Ntr)
+    else:
+        return np.linspace(0,1,Ntr)
 
 def main(debug=False):
     code_dir = os.path.realpath(os.path.join(os.getcwd(), ".."))
@@ -66,38 +64,22 @@ def main(debug=False):
     except:
         print('out folder exists')
 
-    for p in tqdm(list_of_params):
-
-        if p=='initial_stake_convertion_rate':
-            tr=0.1*np.linspace(0,1,Ntr)
-        # elif p=='max_rate':
-        #     tr=0.2*np.linspace(0,1,Ntr)
-
-        
-        else:
-            tr=np.linspace(0,1,Ntr)
+    # the scenario is built once and shared by every task of the pool
+    params=default_params_dict(SIMULATION_LENGHT)
+    params = generate_full_scenario(
+    params_dict=params, scenarios_dict=sd, forecast_length=SIMULATION_LENGHT)
+    grids = {p: get_grid(p) for p in list_of_params}
+    # estimates are cached on disk, so re-plotting does not rerun them
+    cache = ResultCache(os.path.realpath("../data/cache"))
+    estimates = run_sensitivity_grid(SIMULATION_LENGHT, params, grids, N=1000,
+                                     derivative=False, columns=cols, cache=cache,
+                                     processes=1 if debug else None)
 
+    for p in tqdm(list_of_params):
+        tr=grids[p]
         time=np.arange(SIMULATION_LENGHT)
-        derivatives=np.zeros((len(tr),len(time)))
- 
-    
-        # import pdb
-        # pdb.set_trace()
-    
-        if debug==False:
-            with Pool() as pool:
-                df_list = pool.starmap(compute_estimate, [(p,i,tr) for i in range(Ntr)])
-        
-        else:
-            df_list=[]
-            for i in range(Ntr):
-                df_list.append(compute_estimate(p,i,tr))
-                
-                
-        
-        
         for c in cols:
-            derivatives = np.array([df_list[i][c].values for i in range(Ntr)])
+            derivatives = estimates[p][c]
             TR,TIME=np.meshgrid(tr,time)
 
             plt.figure(figsize=(16,9))